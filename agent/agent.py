@@ -1,15 +1,16 @@
 from .prompt import new_user_template, job_template, job_extract_template
 from .schema import user_parser, job_parser, job_extract_parser
-from .llm import GeminiLLM
+from .llm import gemini_llm
 
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
 from langchain_core.prompts import PromptTemplate
 
 load_dotenv()
-gemini_llm: GeminiLLM = GeminiLLM()
 
-llm_llama = gemini_llm.init_model("gemini-1.5-flash")
+# Model behind user_chain and job_chain, used for token budgeting
+CHAIN_MODEL = "gemini-1.5-flash"
+llm_llama = gemini_llm.get_client(CHAIN_MODEL)
 # llm_llama = ChatGroq(
 #     model="llama3-70b-8192",
 #     # model="mixtral-8x7b-32768",
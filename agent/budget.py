@@ -0,0 +1,224 @@
+from typing import Dict, List
+
+from log import logger
+from metrics import metrics
+from .llm import LLM, Token, gemini_llm, groq_llm
+
+TRUNCATION_MARKER = "\n[...truncated...]"
+
+
+class TokenBudget:
+    def __init__(
+        self,
+        providers: List[LLM],
+        default_max_input_tokens: int = 6000,
+        output_reserve: int = 1024,
+    ):
+        """
+        Count tokens locally and keep prompts inside a per-model input budget
+
+        Args:
+            providers: Providers whose models' input budgets are registered
+            default_max_input_tokens: Budget for models with no configured limit
+            output_reserve: Tokens kept free for the model's response
+        """
+        self.default_max_input_tokens = default_max_input_tokens
+        self.output_reserve = output_reserve
+        self.limits: Dict[str, int] = {}
+        for provider in providers:
+            for model in provider.model_data:
+                self.limits[model["model_name"]] = model.get(
+                    "max_input_tokens", provider.max_input_tokens
+                )
+        self._counters = {}
+        self._overheads = {}
+        self.usage: Dict[str, Dict[str, int]] = {}
+
+    def _get_counter(self, model_name: str):
+        if model_name not in self._counters:
+            counter = None
+            if model_name.startswith("gemini"):
+                try:
+                    counter = Token(model_name).count_token
+                except Exception as e:
+                    logger.warning(f"Vertex tokenizer unavailable for {model_name}: {e}")
+            else:
+                try:
+                    import tiktoken
+
+                    encoding = tiktoken.get_encoding("cl100k_base")
+                    counter = lambda text: len(encoding.encode(text, disallowed_special=()))
+                except Exception as e:
+                    logger.warning(f"tiktoken unavailable for {model_name}: {e}")
+            # Fall back to the usual ~4 characters per token estimate
+            self._counters[model_name] = counter or (lambda text: (len(text) + 3) // 4)
+        return self._counters[model_name]
+
+    def count(self, text: str, model_name: str) -> int:
+        if not text:
+            return 0
+        return self._get_counter(model_name)(text)
+
+    def max_input_tokens(self, model_name: str) -> int:
+        limit = self.limits.get(model_name, self.default_max_input_tokens)
+        return max(0, limit - self.output_reserve)
+
+    def truncate(self, text: str, max_tokens: int, model_name: str) -> str:
+        """Cut text down to at most max_tokens tokens"""
+        tokens = self.count(text, model_name)
+        if tokens <= max_tokens:
+            return text
+        if max_tokens <= 0:
+            return ""
+
+        # Scale by the observed chars-per-token ratio, then shrink until it fits
+        room = max(0, max_tokens - self.count(TRUNCATION_MARKER, model_name))
+        cut = int(len(text) * room / tokens)
+        truncated = text[:cut] + TRUNCATION_MARKER
+        while cut > 0 and self.count(truncated, model_name) > max_tokens:
+            cut = int(cut * 0.95)
+            truncated = text[:cut] + TRUNCATION_MARKER
+        return truncated
+
+    def _prompt_overhead(self, prompt, model_name: str) -> int:
+        if prompt is None:
+            return 0
+        key = (id(prompt), model_name)
+        if key not in self._overheads:
+            if isinstance(prompt, str):
+                self._overheads[key] = self.count(prompt, model_name)
+                return self._overheads[key]
+            try:
+                empty = {name: "" for name in prompt.input_variables}
+                self._overheads[key] = self.count(prompt.format(**empty), model_name)
+            except Exception:
+                self._overheads[key] = 0
+        return self._overheads[key]
+
+    def available(self, model_name: str, prompt=None) -> int:
+        """Tokens left for the input fields once the prompt itself is counted"""
+        return max(0, self.max_input_tokens(model_name) - self._prompt_overhead(prompt, model_name))
+
+    def fit(
+        self,
+        inputs: Dict,
+        fields: List[str],
+        model_name: str,
+        prompt=None,
+    ) -> tuple[Dict, int]:
+        """
+        Truncate the given input fields so the prompt fits the model's budget
+
+        Small fields are kept intact and the remaining budget is split evenly
+        across the larger ones.
+
+        Args:
+            inputs: Chain inputs
+            fields: Names of the free-text fields that may be truncated
+            model_name: Model the prompt will be sent to
+            prompt: Optional PromptTemplate or system prompt, counted against the budget
+
+        Returns:
+            The fitted inputs and the number of prompt tokens they use
+        """
+        overhead = self._prompt_overhead(prompt, model_name)
+        fitted = dict(inputs)
+        sizes = {
+            name: self.count(str(fitted.get(name) or ""), model_name)
+            for name in fields
+        }
+        available = self.available(model_name, prompt)
+        total = sum(sizes.values())
+        if total > available:
+            # Give the small fields their full size and split the rest evenly
+            remaining = available
+            ordered = sorted(fields, key=lambda name: sizes[name])
+            for i, name in enumerate(ordered):
+                share = max(0, remaining // (len(ordered) - i))
+                if sizes[name] > share:
+                    fitted[name] = self.truncate(str(fitted[name]), share, model_name)
+                    sizes[name] = self.count(fitted[name], model_name)
+                    logger.info(f"Truncated {name} to {sizes[name]} tokens for {model_name}")
+                remaining -= sizes[name]
+        return fitted, overhead + sum(sizes.values())
+
+    def pack(
+        self,
+        texts: List[str],
+        model_name: str,
+        max_tokens: int = None,
+        separator: str = "\n\n",
+        prompt=None,
+    ) -> List[str]:
+        """
+        Greedily join texts into as few chunks as fit the budget
+
+        Texts that are too large on their own are truncated into a chunk of their own.
+
+        Args:
+            texts: Texts to pack, in order
+            model_name: Model the chunks will be sent to
+            max_tokens: Tokens per chunk (default: what fit() leaves for the prompt)
+            separator: Joins the texts of a chunk
+            prompt: PromptTemplate or system prompt each chunk is sent with,
+                counted against the budget like in fit()
+        """
+        limit = max_tokens if max_tokens is not None else self.available(model_name, prompt)
+        separator_tokens = self.count(separator, model_name)
+        chunks, current, current_tokens = [], [], 0
+        for text in texts:
+            tokens = self.count(text, model_name)
+            if tokens > limit:
+                text = self.truncate(text, limit, model_name)
+                tokens = self.count(text, model_name)
+            if current and current_tokens + separator_tokens + tokens > limit:
+                chunks.append(separator.join(current))
+                current, current_tokens = [], 0
+            if current:
+                current_tokens += separator_tokens
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            chunks.append(separator.join(current))
+        return chunks
+
+    def record(self, model_name: str, prompt_tokens: int, completion_tokens: int = 0):
+        usage = self.usage.setdefault(
+            model_name, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        )
+        usage["calls"] += 1
+        usage["prompt_tokens"] += prompt_tokens
+        usage["completion_tokens"] += completion_tokens
+
+    def count_result(self, result, model_name: str) -> int:
+        """Estimate the tokens of a parsed LLM response"""
+        if hasattr(result, "model_dump_json"):
+            result = result.model_dump_json()
+        return self.count(str(result), model_name)
+
+    async def ainvoke(
+        self,
+        chain,
+        inputs: Dict,
+        fields: List[str],
+        model_name: str,
+        prompt=None,
+    ):
+        """Fit inputs to the budget, invoke a chain and record its token usage"""
+        fitted, prompt_tokens = self.fit(inputs, fields, model_name, prompt)
+        with metrics.span("llm", model_name):
+            result = await chain.ainvoke(fitted)
+        self.record(model_name, prompt_tokens, self.count_result(result, model_name))
+        return result
+
+    def usage_stats(self) -> Dict:
+        return {
+            model_name: {
+                **usage,
+                "max_input_tokens": self.max_input_tokens(model_name),
+            }
+            for model_name, usage in self.usage.items()
+        }
+
+
+token_budget = TokenBudget([gemini_llm, groq_llm])
@@ -0,0 +1,336 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from log import logger
+from config import state_path
+from metrics import metrics
+from .llm import LLM
+
+load_dotenv()
+
+# live: real providers, fake: synthetic responses, record/replay: cassettes on disk
+LLM_MODE = os.getenv("LLM_MODE", "live").lower()
+LLM_CASSETTE_DIR = os.getenv("LLM_CASSETTE_DIR") or state_path("llm_cassettes")
+
+_SCHEMA_BLOCK = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+
+
+class FakeRateLimitError(Exception):
+    """Injected 429 from the fake provider"""
+
+    status_code = 429
+
+
+class FakeProviderError(Exception):
+    """Injected server error from the fake provider"""
+
+    status_code = 500
+
+
+class FaultProfile:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        latency_sigma: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: int = None,
+    ):
+        """
+        Latency distribution and failure injection for fake LLM calls
+
+        Args:
+            latency: Median latency in seconds
+            latency_sigma: Log-normal sigma of the latency (0 for a fixed latency)
+            error_rate: Probability of a 500-style failure
+            rate_limit_rate: Probability of a 429 failure
+            seed: Seed for reproducible runs
+        """
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+
+    @classmethod
+    def from_env(cls):
+        seed = os.getenv("FAKE_LLM_SEED")
+        return cls(
+            latency=float(os.getenv("FAKE_LLM_LATENCY", "0")),
+            latency_sigma=float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0")),
+            seed=int(seed) if seed else None,
+        )
+
+    def sample_latency(self) -> float:
+        if self.latency <= 0:
+            return 0.0
+        if self.latency_sigma <= 0:
+            return self.latency
+        return self.random.lognormvariate(0, self.latency_sigma) * self.latency
+
+    def _maybe_fail(self):
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            raise FakeRateLimitError("429 Too Many Requests (injected)")
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise FakeProviderError("500 Internal Server Error (injected)")
+
+    async def apply(self):
+        await asyncio.sleep(self.sample_latency())
+        self._maybe_fail()
+
+    def apply_sync(self):
+        time.sleep(self.sample_latency())
+        self._maybe_fail()
+
+
+fault_profile = FaultProfile.from_env()
+
+
+def fake_from_schema(schema: Dict, defs: Dict = None, name: str = "value") -> Any:
+    """Build a value that validates against a JSON schema"""
+    defs = defs if defs is not None else schema.get("$defs", schema.get("definitions", {}))
+    if "$ref" in schema:
+        return fake_from_schema(defs[schema["$ref"].split("/")[-1]], defs, name)
+    for key in ("anyOf", "oneOf", "allOf"):
+        if key in schema:
+            options = [s for s in schema[key] if s.get("type") != "null"] or schema[key]
+            return fake_from_schema(options[0], defs, name)
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "default" in schema:
+        return schema["default"]
+
+    schema_type = schema.get("type", "object" if "properties" in schema else "string")
+    if schema_type == "object":
+        return {
+            key: fake_from_schema(value, defs, key)
+            for key, value in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        item = schema.get("items", {})
+        return [fake_from_schema(item, defs, f"{name} {i}") for i in range(1, 3)]
+    if schema_type == "integer":
+        return 5
+    if schema_type == "number":
+        return 1.0
+    if schema_type == "boolean":
+        return False
+    if schema_type == "null":
+        return None
+    return f"Sample {name.replace('_', ' ')}"
+
+
+def schema_from_prompt(text: str) -> Optional[Dict]:
+    """Find the JSON schema embedded in a parser's format instructions"""
+    for block in reversed(_SCHEMA_BLOCK.findall(text)):
+        try:
+            schema = json.loads(block)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(schema, dict) and "properties" in schema:
+            return schema
+    return None
+
+
+def _messages_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(str(message.content) for message in messages)
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model answering with schema-valid JSON, with injected latency and errors"""
+
+    model_name: str = "fake"
+    profile: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        schema = schema_from_prompt(_messages_text(messages))
+        content = json.dumps(fake_from_schema(schema)) if schema else "OK"
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        (self.profile or fault_profile).apply_sync()
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await (self.profile or fault_profile).apply()
+        return self._respond(messages)
+
+
+class Cassette:
+    def __init__(self, directory: str = LLM_CASSETTE_DIR):
+        """
+        Recorded LLM responses stored as one JSON file per request
+
+        Args:
+            directory: Directory holding the recorded responses
+        """
+        self.directory = directory
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Any:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)["response"]
+        except FileNotFoundError:
+            raise KeyError(f"No recorded LLM response for {key} in {self.directory}")
+
+    def put(self, key: str, response: Any, **info):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"response": response, **info}, f, indent=2)
+        os.replace(tmp_path, self._path(key))
+
+
+cassette = Cassette()
+
+
+class RecordReplayChatModel(BaseChatModel):
+    """Chat model that records a real model's responses or replays them from disk"""
+
+    model_name: str
+    mode: str = "replay"
+    inner: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return f"{self.mode}-chat"
+
+    def _key(self, messages: List[BaseMessage]) -> str:
+        return Cassette.key(self.model_name, _messages_text(messages))
+
+    def _result(self, content: str) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key = self._key(messages)
+        if self.mode == "replay":
+            return self._result(cassette.get(key))
+        response = self.inner.invoke(messages)
+        cassette.put(key, response.content, model_name=self.model_name)
+        return self._result(response.content)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key = self._key(messages)
+        if self.mode == "replay":
+            return self._result(cassette.get(key))
+        response = await self.inner.ainvoke(messages)
+        cassette.put(key, response.content, model_name=self.model_name)
+        return self._result(response.content)
+
+
+def build_client(provider: LLM, model_name: str):
+    """Create the chat model for a provider's model according to LLM_MODE"""
+    if LLM_MODE == "fake":
+        return FakeChatModel(model_name=model_name)
+    if LLM_MODE == "replay":
+        return RecordReplayChatModel(model_name=model_name, mode="replay")
+    if LLM_MODE == "record":
+        return RecordReplayChatModel(
+            model_name=model_name, mode="record", inner=provider.init_model(model_name)
+        )
+    return provider.init_model(model_name)
+
+
+async def run_structured(
+    name: str,
+    prompt: str,
+    result_type,
+    call: Callable[[], Awaitable[Any]],
+):
+    """
+    Run a structured-output LLM call (e.g. a pydantic_ai agent) honouring LLM_MODE
+
+    Args:
+        name: Name of the call, part of the cassette key
+        prompt: User prompt, part of the cassette key
+        result_type: Pydantic model of the result
+        call: Coroutine factory doing the real call and returning a result_type
+    """
+    with metrics.span("llm", name):
+        return await _run_structured(name, prompt, result_type, call)
+
+
+async def _run_structured(name: str, prompt: str, result_type, call):
+    if LLM_MODE == "fake":
+        await fault_profile.apply()
+        return result_type(**fake_from_schema(result_type.model_json_schema()))
+
+    key = Cassette.key(name, prompt)
+    if LLM_MODE == "replay":
+        return result_type.model_validate(cassette.get(key))
+
+    result = await call()
+    if LLM_MODE == "record":
+        cassette.put(key, result.model_dump(), model_name=name)
+    return result
+
+
+class FakeLLM(LLM):
+    provider = "fake"
+
+    def __init__(self, profiles: Dict[str, FaultProfile] = None):
+        """
+        Offline provider whose models answer with schema-valid JSON
+
+        Args:
+            profiles: Optional fault profile per model name
+        """
+        super().__init__()
+        self.profiles = profiles or {}
+
+    @property
+    def get_model_data(self):
+        return [
+            {
+                "model_name": "fake-fast",
+                "request_usage": 0,
+                "is_used": False,
+                "max_request": 100000,
+                "max_rpm": 10000,
+            },
+            {
+                "model_name": "fake-slow",
+                "request_usage": 0,
+                "is_used": False,
+                "max_request": 100000,
+                "max_rpm": 10000,
+            },
+        ]
+
+    def init_model(self, model_name: str):
+        return FakeChatModel(model_name=model_name, profile=self.profiles.get(model_name))
+
+    def get_client(self, model_name: str):
+        # Always fake, whatever LLM_MODE says
+        if model_name not in self._clients:
+            self._clients[model_name] = self.init_model(model_name)
+        return self._clients[model_name]
+
+
+if LLM_MODE != "live":
+    logger.info(f"LLM_MODE={LLM_MODE}, cassettes in {LLM_CASSETTE_DIR}")
@@ -8,21 +8,39 @@ from vertexai.preview import tokenization
 
 
 class LLM:
-    def init_model(self, model_name: str):
+    provider: str = None
+    # Default prompt budget; a model entry may override it with "max_input_tokens"
+    max_input_tokens: int = 6000
+
+    def __init__(self):
+        self.model_data = self.get_model_data
+        self._clients = {}
+
+    @property
+    def get_model_data(self):
         """Not Implemented Error"""
         raise NotImplementedError
 
-    async def get_llm(self, prompt: str):
+    def init_model(self, model_name: str):
         """Not Implemented Error"""
         raise NotImplementedError
 
+    def get_client(self, model_name: str):
+        """Return the cached client for a model, creating it on first use"""
+        if model_name not in self._clients:
+            # Imported here as agent.fake builds on this module
+            from .fake import build_client
+
+            self._clients[model_name] = build_client(self, model_name)
+        return self._clients[model_name]
+
     async def get_llm(self, prompt: str = None):
         for model in self.model_data:
             model["request_usage"] += 1
             if model["request_usage"] > model["max_request"]:
                 model["is_used"] = True
             if model["is_used"] == False:
-                return self.init_model(model["model_name"])
+                return self.get_client(model["model_name"])
         self.reset_model_data()
         raise Exception("No available models")
 
@@ -33,89 +51,102 @@ class LLM:
 
 
 class GroqLLM(LLM):
-    def __init__(self):
-        self.model_data = self.get_model_data
+    provider = "groq"
 
     @property
     def get_model_data(self):
         return [
             {
                 "model_name": "mixtral-8x7b-32768",
-                "request_used": 0,
+                "request_usage": 0,
                 "is_used": False,
                 "max_request": 14400,
+                "max_rpm": 30,
+                "max_input_tokens": 24000,
             },
             {
                 "model_name": "gemma-7b-it",
-                "request_used": 0,
+                "request_usage": 0,
                 "is_used": False,
                 "max_request": 14400,
+                "max_rpm": 30,
             },
             {
                 "model_name": "gemma2-9b-it",
-                "request_used": 0,
+                "request_usage": 0,
                 "is_used": False,
                 "max_request": 14400,
+                "max_rpm": 30,
             },
             {
                 "model_name": "llama-3.1-70b-versatile",
-                "request_used": 0,
+                "request_usage": 0,
                 "is_used": False,
                 "max_request": 14400,
+                "max_rpm": 30,
             },
             {
-                "model_name": "lama-3.1-8b-instant",
-                "request_used": 0,
+                "model_name": "llama-3.1-8b-instant",
+                "request_usage": 0,
                 "is_used": False,
                 "max_request": 14400,
+                "max_rpm": 30,
             },
             {
                 "model_name": "llama-3.2-11b-text-preview",
-                "request_used": 0,
+                "request_usage": 0,
                 "is_used": False,
                 "max_request": 7000,
+                "max_rpm": 30,
             },
             {
-                "model_name": "lama-3.2-3b-preview",
-                "request_used": 0,
+                "model_name": "llama-3.2-3b-preview",
+                "request_usage": 0,
                 "is_used": False,
                 "max_request": 7000,
+                "max_rpm": 30,
             },
             {
                 "model_name": "llama-3.2-90b-text-preview",
-                "request_used": 0,
+                "request_usage": 0,
                 "is_used": False,
                 "max_request": 7000,
+                "max_rpm": 30,
             },
             {
                 "model_name": "llama-guard-3-8b",
-                "request_used": 0,
+                "request_usage": 0,
                 "is_used": False,
                 "max_request": 14400,
+                "max_rpm": 30,
             },
             {
                 "model_name": "llama-3.2-1b-preview",
-                "request_used": 0,
+                "request_usage": 0,
                 "is_used": False,
                 "max_request": 14400,
+                "max_rpm": 30,
             },
             {
                 "model_name": "llama3-groq-70b-8192-tool-use-preview",
-                "request_used": 0,
+                "request_usage": 0,
                 "is_used": False,
                 "max_request": 14400,
+                "max_rpm": 30,
             },
             {
                 "model_name": "llama3-8b-8192",
-                "request_used": 0,
+                "request_usage": 0,
                 "is_used": False,
                 "max_request": 14400,
+                "max_rpm": 30,
             },
             {
                 "model_name": "llama3-groq-8b-8192-tool-use-preview",
-                "request_used": 0,
+                "request_usage": 0,
                 "is_used": False,
                 "max_request": 14400,
+                "max_rpm": 30,
             },
         ]  # Need to call the property as a method
 
@@ -132,10 +163,8 @@ class GroqLLM(LLM):
 
 
 class GeminiLLM(LLM):
-    def __init__(self):
-        self.model_data = self.get_model_data  # Need to call the property as a method
-        # self.model = genai.GenerativeModel(model_name)
-        # self.token = Token(model_name)
+    provider = "gemini"
+    max_input_tokens = 30000
 
     @property
     def get_model_data(self):
@@ -145,6 +174,7 @@ class GeminiLLM(LLM):
                 "request_usage": 0,
                 "is_used": False,
                 "max_request": 1500,
+                "max_rpm": 15,
             },
             # {
             #     "gemini-1.5-pro": {
@@ -158,12 +188,14 @@ class GeminiLLM(LLM):
                 "request_usage": 0,
                 "is_used": False,
                 "max_request": 1500,
+                "max_rpm": 15,
             },
             {
                 "model_name": "gemini-1.0-pro",
                 "request_usage": 0,
                 "is_used": False,
                 "max_request": 1500,
+                "max_rpm": 15,
             },
         ]
 
@@ -180,6 +212,12 @@ class GeminiLLM(LLM):
         return llm
 
 
+
+# Shared providers, so every call site reuses the same cached clients
+gemini_llm = GeminiLLM()
+groq_llm = GroqLLM()
+
+
 class Token:
     def __init__(self, model_name: str):
         self.tokenizer = tokenization.get_tokenizer_for_model(model_name)
@@ -0,0 +1,127 @@
+import re
+from typing import Dict, List
+
+import numpy as np
+
+from log import logger
+from similarity import normalize, top_k as top_k_similar, top_k_indices
+from vector_database import VectorDatabase, vector_db
+
+_WORD = re.compile(r"[a-z0-9+#.]+")
+
+
+class JobMatcher:
+    def __init__(self, vector_db: VectorDatabase, top_k: int = 5, keyword_weight: float = 0.2):
+        """
+        Rank a user's candidate jobs against their resume
+
+        Args:
+            vector_db: Vector database whose embedding service (and cache) is used
+            top_k: Number of jobs kept per user
+            keyword_weight: Share of the score given to skill/keyword overlap
+        """
+        self.vector_db = vector_db
+        self.top_k = top_k
+        self.keyword_weight = keyword_weight
+
+    @staticmethod
+    def _terms(job: Dict) -> List[str]:
+        terms = []
+        for field in ("required_skills", "keywords"):
+            value = job.get(field) or []
+            terms.extend(value.split(",") if isinstance(value, str) else value)
+        return [t.strip().lower() for t in terms if t and t.strip()]
+
+    def keyword_overlap(self, resume_text: str, jobs: List[Dict]) -> np.ndarray:
+        """Fraction of each job's skills and keywords that appear in the resume"""
+        resume = resume_text.lower()
+        resume_words = set(_WORD.findall(resume))
+        overlaps = []
+        for job in jobs:
+            terms = self._terms(job)
+            if not terms:
+                overlaps.append(0.0)
+                continue
+            hits = sum(
+                term in resume_words or (" " in term and term in resume) for term in terms
+            )
+            overlaps.append(hits / len(terms))
+        return np.asarray(overlaps, dtype=np.float32)
+
+    async def _embed(self, resume_texts: List[str], job_texts: List[str]):
+        service = self.vector_db.embedding_service
+        resume_vectors = await service.query_embeddings(resume_texts)
+        job_vectors = [d["embedding"] for d in await service.batch_embed_documents(job_texts)]
+        return normalize(resume_vectors), normalize(job_vectors)
+
+    async def rank(self, resume_text: str, jobs: List[Dict], job_texts: List[str], top_k: int = None) -> List[Dict]:
+        """
+        Score jobs against the resume and return the best ones, each with a match_score
+
+        Args:
+            resume_text: The user's resume
+            jobs: Extracted job dicts
+            job_texts: Text embedded for each job, aligned with jobs
+            top_k: Number of jobs to keep (default: self.top_k)
+        """
+        return (await self.rank_many([resume_text], jobs, job_texts, top_k))[0]
+
+    async def rank_many(
+        self, resume_texts: List[str], jobs: List[Dict], job_texts: List[str], top_k: int = None
+    ) -> List[List[Dict]]:
+        """
+        Rank the same candidate jobs for one or more resumes
+
+        All resumes and jobs are embedded in one call each and scored with one
+        matrix multiply per chunk of resumes.
+
+        Args:
+            resume_texts: One resume per user
+            jobs: Extracted job dicts shared by all users
+            job_texts: Text embedded for each job, aligned with jobs
+            top_k: Number of jobs kept per user (default: self.top_k)
+
+        Returns:
+            Ranked jobs for each resume, aligned with resume_texts
+        """
+        top_k = top_k or self.top_k
+        if not jobs:
+            return [[] for _ in resume_texts]
+        # Users without a resume keep the scraped order
+        with_resume = [i for i, text in enumerate(resume_texts) if text]
+        results = [jobs[:top_k] for _ in resume_texts]
+        if not with_resume:
+            return results
+
+        keyword = np.stack(
+            [self.keyword_overlap(resume_texts[i], jobs) for i in with_resume]
+        )
+        try:
+            resume_vectors, job_vectors = await self._embed(
+                [resume_texts[i] for i in with_resume], job_texts
+            )
+            weight = self.keyword_weight
+            indices, scores = top_k_similar(
+                resume_vectors,
+                job_vectors,
+                top_k,
+                normalized=True,
+                adjust=lambda rows, semantic: (1 - weight) * semantic + weight * keyword[rows],
+            )
+        except Exception as e:
+            # Still better than a random pick when embeddings are unavailable
+            logger.error(f"Semantic matching failed, ranking by keywords only: {e}")
+            indices = top_k_indices(keyword, top_k)
+            scores = np.take_along_axis(keyword, indices, axis=1)
+
+        for row, i in enumerate(with_resume):
+            ranked = []
+            for index, score in zip(indices[row], scores[row]):
+                job = dict(jobs[index])
+                job["match_score"] = round(float(score), 4)
+                ranked.append(job)
+            results[i] = ranked
+        return results
+
+
+job_matcher = JobMatcher(vector_db)
@@ -0,0 +1,278 @@
+import time
+import asyncio
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+from log import logger
+from metrics import metrics
+from .llm import LLM, gemini_llm, groq_llm
+from .budget import token_budget
+
+
+class NoAvailableModel(Exception):
+    """Raised when every model is out of quota or cooling down"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"No available models, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class ModelStats:
+    def __init__(
+        self,
+        provider: LLM,
+        model_name: str,
+        max_rpm: int,
+        max_rpd: int,
+        weight: float = 1.0,
+        initial_latency: float = 2.0,
+    ):
+        """
+        Live health, latency and quota state for a single model
+
+        Args:
+            provider: Provider that builds the client for this model
+            model_name: Name of the model
+            max_rpm: Maximum requests per minute
+            max_rpd: Maximum requests per day
+            weight: Preference weight, higher weights are picked first
+            initial_latency: Latency assumed before the first call completes
+        """
+        self.provider = provider
+        self.model_name = model_name
+        self.max_rpm = max_rpm
+        self.max_rpd = max_rpd
+        self.weight = weight
+
+        self.latency = initial_latency
+        self.error_rate = 0.0
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+
+        self.calls = 0
+        self.errors = 0
+        self.minute_window = deque()
+        self.day = self._today()
+        self.day_calls = 0
+
+    @staticmethod
+    def _today():
+        return datetime.now(timezone.utc).date()
+
+    def _roll_windows(self, now: float):
+        while self.minute_window and now - self.minute_window[0] >= 60:
+            self.minute_window.popleft()
+        if self._today() != self.day:
+            self.day = self._today()
+            self.day_calls = 0
+
+    def has_quota(self, now: float) -> bool:
+        self._roll_windows(now)
+        return (
+            len(self.minute_window) < self.max_rpm and self.day_calls < self.max_rpd
+        )
+
+    def is_healthy(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def retry_after(self, now: float) -> float:
+        """Seconds until this model can accept another request"""
+        self._roll_windows(now)
+        waits = [max(0.0, self.cooldown_until - now)]
+        if len(self.minute_window) >= self.max_rpm:
+            waits.append(60 - (now - self.minute_window[0]))
+        if self.day_calls >= self.max_rpd:
+            midnight = datetime.now(timezone.utc).replace(
+                hour=0, minute=0, second=0, microsecond=0
+            )
+            elapsed = (datetime.now(timezone.utc) - midnight).total_seconds()
+            waits.append(24 * 60 * 60 - elapsed)
+        return max(waits)
+
+    @property
+    def score(self) -> float:
+        """Lower is better: expected latency, penalised by errors, scaled by weight"""
+        return self.latency * (1 + 4 * self.error_rate) / self.weight
+
+    def to_dict(self, now: float) -> Dict:
+        self._roll_windows(now)
+        return {
+            "provider": self.provider.provider,
+            "model_name": self.model_name,
+            "weight": self.weight,
+            "latency": round(self.latency, 3),
+            "error_rate": round(self.error_rate, 3),
+            "calls": self.calls,
+            "errors": self.errors,
+            "rpm_used": len(self.minute_window),
+            "max_rpm": self.max_rpm,
+            "rpd_used": self.day_calls,
+            "max_rpd": self.max_rpd,
+            "cooldown": round(max(0.0, self.cooldown_until - now), 1),
+        }
+
+
+class LLMRouter:
+    def __init__(
+        self,
+        providers: List[LLM],
+        weights: Dict[str, float] = None,
+        alpha: float = 0.2,
+        max_error_rate: float = 0.5,
+        error_cooldown: float = 30.0,
+        rate_limit_cooldown: float = 60.0,
+    ):
+        """
+        Route LLM calls to the fastest healthy model with spare quota
+
+        Args:
+            providers: Providers whose models are routed across
+            weights: Preference weight per provider name (default: 1.0)
+            alpha: Smoothing factor for the latency and error rate EWMAs
+            max_error_rate: Error rate above which a model is put on cooldown
+            error_cooldown: Base seconds a model rests after consecutive errors
+            rate_limit_cooldown: Seconds a model rests after a 429
+        """
+        weights = weights or {}
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.error_cooldown = error_cooldown
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self.models: Dict[str, ModelStats] = {}
+        for provider in providers:
+            for model in provider.model_data:
+                self.models[model["model_name"]] = ModelStats(
+                    provider=provider,
+                    model_name=model["model_name"],
+                    max_rpm=model["max_rpm"],
+                    max_rpd=model["max_request"],
+                    weight=weights.get(provider.provider, 1.0),
+                )
+        self._lock = asyncio.Lock()
+
+    def pick(self, exclude: tuple = ()) -> ModelStats:
+        """Pick the best model and reserve one request of its quota"""
+        now = time.monotonic()
+        candidates = [
+            stats
+            for name, stats in self.models.items()
+            if name not in exclude
+            and stats.is_healthy(now)
+            and stats.has_quota(now)
+        ]
+        if not candidates:
+            raise NoAvailableModel(self.retry_after(exclude))
+
+        stats = min(candidates, key=lambda s: s.score)
+        stats.minute_window.append(now)
+        stats.day_calls += 1
+        stats.calls += 1
+        return stats
+
+    def retry_after(self, exclude: tuple = ()) -> float:
+        """Seconds until the first model becomes available again"""
+        now = time.monotonic()
+        waits = [
+            stats.retry_after(now)
+            for name, stats in self.models.items()
+            if name not in exclude
+        ]
+        return min(waits) if waits else 0.0
+
+    def record_success(self, model_name: str, latency: float):
+        stats = self.models[model_name]
+        stats.latency = (1 - self.alpha) * stats.latency + self.alpha * latency
+        stats.error_rate = (1 - self.alpha) * stats.error_rate
+        stats.consecutive_errors = 0
+
+    def record_error(self, model_name: str, error: Exception):
+        stats = self.models[model_name]
+        stats.errors += 1
+        stats.consecutive_errors += 1
+        stats.error_rate = (1 - self.alpha) * stats.error_rate + self.alpha
+
+        now = time.monotonic()
+        if self._is_rate_limit(error):
+            stats.cooldown_until = now + self.rate_limit_cooldown
+        elif stats.error_rate >= self.max_error_rate:
+            # Back off exponentially while a model keeps failing
+            backoff = self.error_cooldown * 2 ** max(0, stats.consecutive_errors - 1)
+            stats.cooldown_until = now + min(backoff, 60 * 60)
+
+        logger.warning(f"LLM {model_name} failed ({stats.consecutive_errors} in a row): {error}")
+
+    @staticmethod
+    def _is_rate_limit(error: Exception) -> bool:
+        message = str(error).lower()
+        return (
+            getattr(error, "status_code", None) == 429
+            or "429" in message
+            or "rate limit" in message
+            or "resource exhausted" in message
+            or "quota" in message
+        )
+
+    async def ainvoke(
+        self,
+        build_chain: Callable,
+        inputs: Dict,
+        max_attempts: int = 3,
+        budget_fields: List[str] = None,
+        prompt=None,
+    ):
+        """
+        Invoke a chain on the best model, falling back to the next one on error
+
+        Args:
+            build_chain: Callable taking a chat model and returning a runnable
+            inputs: Inputs passed to the runnable
+            max_attempts: Maximum number of models to try
+            budget_fields: Input fields truncated to fit the picked model's budget
+            prompt: PromptTemplate of the chain, used to count its own tokens
+        """
+        tried = ()
+        last_error = None
+        for _ in range(max_attempts):
+            async with self._lock:
+                try:
+                    stats = self.pick(exclude=tried)
+                except NoAvailableModel:
+                    if last_error is not None:
+                        raise last_error
+                    raise
+            tried += (stats.model_name,)
+
+            chain = build_chain(stats.provider.get_client(stats.model_name))
+            fitted, prompt_tokens = token_budget.fit(
+                inputs, budget_fields or [], stats.model_name, prompt
+            )
+            start = time.perf_counter()
+            try:
+                with metrics.span("llm", stats.model_name):
+                    result = await chain.ainvoke(fitted)
+            except Exception as e:
+                self.record_error(stats.model_name, e)
+                last_error = e
+                continue
+
+            self.record_success(stats.model_name, time.perf_counter() - start)
+            token_budget.record(
+                stats.model_name,
+                prompt_tokens,
+                token_budget.count_result(result, stats.model_name),
+            )
+            return result
+
+        raise last_error
+
+    def state(self) -> List[Dict]:
+        """Snapshot of every model's health, latency and quota, best first"""
+        now = time.monotonic()
+        return [
+            stats.to_dict(now)
+            for stats in sorted(self.models.values(), key=lambda s: s.score)
+        ]
+
+
+llm_router = LLMRouter([gemini_llm, groq_llm], weights={"gemini": 1.5, "groq": 1.0})
@@ -3,12 +3,14 @@ from asyncio import to_thread, sleep
 from pydantic import ValidationError
 
 from log import logger
-from .llm import GeminiLLM
 from config import Config
-from .agent import job_extract_prompt
+from .router import llm_router, NoAvailableModel
+from .budget import token_budget
+from .agent import job_extract_prompt, job_info_prompt, CHAIN_MODEL
 from .schema import job_extract_parser
 from .agent import job_chain, to_dict
 from vector_database import vector_db
+from .matcher import job_matcher
 from queue_util.manager_queue import queue_manager
 from schemas.model import ScrapeModel, DBModel, Job, EmailModel
 
@@ -17,9 +19,10 @@ from asyncio_throttle import Throttler
 
 
 class ScraperAgent:
-    def __init__(self) -> None:
-        self.gemini_llm = GeminiLLM()
+    def __init__(self, write_db: bool = False) -> None:
         self.scrape_batch = 10
+        # Extracted jobs are only persisted to the jobs collection when enabled
+        self.write_db = write_db
         # Allow a maximum of 4500 calls per day => ~3 calls per minute
         self.llm_throttler = Throttler(rate_limit=3, period=60)
         # Allow a maximum of 15 calls per minute
@@ -37,7 +40,13 @@ class ScraperAgent:
             jobs = []
             
             # Get job data
-            job = await job_chain.ainvoke({"resume_text": resume_text})
+            job = await token_budget.ainvoke(
+                job_chain,
+                {"resume_text": resume_text},
+                fields=["resume_text"],
+                model_name=CHAIN_MODEL,
+                prompt=job_info_prompt,
+            )
             job_task = await self.to_dict(job)
             task = ScrapeModel(data=job_task["jobschema"])
             task_id = task.id
@@ -64,7 +73,7 @@ class ScraperAgent:
                 # Process remaining jobs
                 if job_batch:
                     # print(job_batch)
-                    await self._extract_job_batch(job_batch)
+                    await self._extract_job_batch(job_batch, resume_text)
 
             # return   # Return number of jobs processed
 
@@ -73,8 +82,8 @@ class ScraperAgent:
             raise
 
 
-    async def _extract_job_batch(self, job_batch: list[tuple[Job, str]]):
-        """Process a batch of jobs at once"""
+    async def _extract_job_batch(self, job_batch: list[tuple[Job, str]], resume_text: str = ""):
+        """Process a batch of jobs at once and email the best matches for the resume"""
         try:
             db_batch = []
             email_batch = []
@@ -82,14 +91,16 @@ class ScraperAgent:
             for job_data, email in job_batch:
                 async with self.job_throttler:
                     job_url = job_data.job_url
-                    print(job_url)
+                    logger.debug(f"Extracting job {job_url}")
                     job_text = self._get_job_text(job_data)
-                    job_extract = await self.get_llm()
                 try:
-                    job_extract = await job_extract.ainvoke({"job_text": job_text})
+                    job_extract = await self.extract_job(job_text)
                 except ValidationError as e:
                     logger.error(f"Validation error for job: {e}")
                     continue
+                except Exception as e:
+                    logger.error(f"Error extracting job {job_url}: {e}")
+                    continue
 
                 job_extract = await self.to_dict(job_extract)
                 job_result = job_extract["jobextractschema"]
@@ -108,20 +119,27 @@ class ScraperAgent:
                 db_batch.append(db_data.to_dict)
 
                 # Prepare vector entry
-                vector_data = self._get_vector_data(job_result)
+                vector_data = self._get_vector_data(job_result, job_url)
                 vector_batch.append(vector_data)
             # Batch operations outside the throttled section
             # Process batches
-            # if db_batch:
-            #     for db in db_batch:
-            #         await queue_manager.enqueue(db)
+            if db_batch and self.write_db:
+                for db in db_batch:
+                    await queue_manager.enqueue(db)
 
             if email_batch:
+                # Embeddings are cached, so the upsert below reuses them
+                email_batch = await job_matcher.rank(
+                    resume_text, email_batch, [text for text, _ in vector_batch]
+                )
                 email_data = EmailModel(data=email_batch, operation_type="scrape")
                 await queue_manager.enqueue(email_data.to_dict)
 
-            # if vector_batch:
-            #     await vector_db.upsert(data=vector_batch, namespace="job")
+            if vector_batch:
+                try:
+                    await vector_db.upsert(data=vector_batch, namespace="job")
+                except Exception as e:
+                    logger.error(f"Error upserting job vectors: {e}")
 
             logger.info(f"Processed batch of {len(job_batch)} jobs")
             
@@ -129,7 +147,7 @@ class ScraperAgent:
         except Exception as e:
             logger.error(f"Error in _extract_job_batch: {e}")
 
-    def _get_vector_data(self, job_result: dict):
+    def _get_vector_data(self, job_result: dict, job_url: str = None):
         data = f"""
             Job Title: {job_result["job_title"]}
             Job Description: {job_result["job_description"]}
@@ -146,20 +164,26 @@ class ScraperAgent:
             "salary_range": job_result["salary_range"],
             "keywords": ", ".join(job_result["keywords"]),
         }
+        if job_url:
+            metadata["job_url"] = job_url
 
         return data, metadata
 
-    async def get_llm(self):
+    async def extract_job(self, job_text: str):
         try:
             # Use throttler to limit LLM API calls
             async with self.llm_throttler:
-                llm = await self.gemini_llm.get_llm()
-                return job_extract_prompt | llm | job_extract_parser
-        except Exception as e:
-            logger.error(f"Error in get_llm: {e}")
-            # Wait for 20 hours if quota is exceeded, then retry
-            await sleep(20 * 60 * 60)
-            return await self.get_llm()
+                return await llm_router.ainvoke(
+                    lambda llm: job_extract_prompt | llm | job_extract_parser,
+                    {"job_text": job_text},
+                    budget_fields=["job_text"],
+                    prompt=job_extract_prompt,
+                )
+        except NoAvailableModel as e:
+            logger.error(f"Error in extract_job: {e}")
+            # Wait until a model has quota again, then retry
+            await sleep(e.retry_after)
+            return await self.extract_job(job_text)
 
     def _format_db_data(self, job_data):
         return {
@@ -13,6 +13,7 @@ from appwrite.id import ID
 from concurrent.futures import ThreadPoolExecutor
 import logging
 from datetime import datetime
+from metrics import TracedClient
 
 load_dotenv()
 
@@ -39,9 +40,9 @@ class AppwriteClient:
         self.client.set_key(api_key)
         self.client.set_endpoint(endpoint)
 
-        self.database = Databases(self.client)
-        self.storage = Storage(self.client)
-        self.users = Users(self.client)
+        self.database = TracedClient(Databases(self.client), "appwrite")
+        self.storage = TracedClient(Storage(self.client), "appwrite")
+        self.users = TracedClient(Users(self.client), "appwrite")
         self.database_id = database_id
         self.initialize_collection(["jobs", "users", "cv_metadata", "scholarships", "internships"])
 
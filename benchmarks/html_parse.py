@@ -0,0 +1,81 @@
+"""
+Benchmark of HTML to markdown conversion.
+
+Converts the items of a synthetic listing page with to_markdown, from the
+already parsed tree, and, as a baseline, with md(str(tag)), which serialises
+and re-parses every item. Before timing, checks that both give the same
+markdown for every <a>, <li> and <div> of the page.
+
+    python -m benchmarks.html_parse --items 200 --rounds 20
+"""
+
+import time
+import argparse
+
+from markdownify import markdownify as md
+
+from utils.html_parse import parse_html, to_markdown
+
+
+def make_page(items: int) -> str:
+    cards = "".join(
+        f"""<li><h2>Scholarship {i}</h2><time>2026-01-{i % 28 + 1:02d}</time>
+        <a href="https://example.com/scholarships/{i}">Read more</a>
+        <p>Funded by <b>Foundation {i}</b>, open to <i>all</i> countries.</p>
+        <ol start="2"><li>Apply online</li><li>Send <a href="mailto:a{i}@example.com">documents</a></li></ol>
+        <ul><li>Tuition</li><li>Stipend</li></ul></li>"""
+        for i in range(items)
+    )
+    return f"""<html lang="en"><head><title>Listing</title></head><body><main>
+    <ul>{cards}</ul><div class="post clearfix"><p>Intro <a href="https://example.com">home</a></p>
+    <table><tr><th>Deadline</th></tr><tr><td>March</td></tr></table></div></main></body></html>"""
+
+
+def check_parity(soup) -> int:
+    tags = soup.find_all(["a", "li", "div"])
+    for tag in tags:
+        expected, actual = md(str(tag)), to_markdown(tag)
+        if expected != actual:
+            raise AssertionError(f"to_markdown differs from md(str(tag)) for <{tag.name}>: {actual!r} != {expected!r}")
+    return len(tags)
+
+
+def run(args) -> dict:
+    soup = parse_html(make_page(args.items))
+    checked = check_parity(soup)
+    items = soup.find("main").find("ul").find_all("li", recursive=False)
+    cases = {
+        "to_markdown": lambda: [to_markdown(li) for li in items],
+        "md_str": lambda: [md(str(li)) for li in items],
+    }
+    report = {"checked_tags": checked}
+    for name, fn in cases.items():
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            fn()
+        report[name] = round(time.perf_counter() - start, 4)
+    return report
+
+
+def print_report(report: dict):
+    print(f"to_markdown matches md(str(tag)) on {report['checked_tags']} tags")
+    print(f"{'case':<14}{'total s':>10}")
+    print("-" * 24)
+    for name in ("to_markdown", "md_str"):
+        print(f"{name:<14}{report[name]:>10}")
+    print(f"to_markdown is {report['md_str'] / report['to_markdown']:.1f}x faster")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=200, help="listing items on the page")
+    parser.add_argument("--rounds", type=int, default=20)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    print_report(run(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+End-to-end benchmark of the daily job pipeline (main.run_job_checks).
+
+Runs one iteration of user fetch -> resume fetch -> query generation ->
+scrape -> extraction -> ranking -> DB write -> email render -> SMTP send against local
+stand-ins, and reports throughput, per-stage p50/p99 latency and peak RSS.
+
+    python -m benchmarks.pipeline --users 20 --jobs 10 --llm-latency 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import resource
+import statistics
+from functools import wraps
+
+from .standins import (
+    Latency,
+    FakePinecone,
+    make_appwrite_client,
+    make_cohere,
+    make_scrape_jobs,
+    make_smtp,
+    make_async_smtp,
+)
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+
+    def record(self, stage: str, seconds: float):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage: str, fn):
+        """Wrap a sync or async callable so each call is timed under stage"""
+        if asyncio.iscoroutinefunction(fn):
+
+            @wraps(fn)
+            async def timed_async(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+
+            return timed_async
+
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+
+        return timed
+
+    @staticmethod
+    def percentile(values, pct: float) -> float:
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def summary(self):
+        return {
+            stage: {
+                "count": len(values),
+                "total_s": round(sum(values), 4),
+                "mean_ms": round(statistics.fmean(values) * 1000, 3),
+                "p50_ms": round(self.percentile(values, 50) * 1000, 3),
+                "p99_ms": round(self.percentile(values, 99) * 1000, 3),
+            }
+            for stage, values in self.samples.items()
+        }
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def install_standins(args, timer: StageTimer, outbox: list, embed_calls: list):
+    """Point every external dependency at a local stand-in before the app is imported"""
+    os.environ["LLM_MODE"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = str(args.llm_latency)
+    os.environ["FAKE_LLM_LATENCY_SIGMA"] = str(args.llm_latency_sigma)
+    os.environ["FAKE_LLM_ERROR_RATE"] = str(args.llm_error_rate)
+    os.environ["FAKE_LLM_SEED"] = str(args.seed)
+    os.environ.setdefault("FROM_EMAIL", "bench@example.com")
+    os.environ.setdefault("SMTP_PASSWORD", "bench")
+    os.environ.setdefault("COHERE_API_KEY", "bench")
+    os.environ.setdefault("PINECONE_API_KEY", "bench")
+    os.environ.setdefault("LLAMA_CLOUD_API_KEY", "bench")
+    # Keep caches and the quota ledger out of the working tree
+    state_dir = tempfile.mkdtemp(prefix="joblm-bench-")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(state_dir, "embeddings.sqlite3")
+    os.environ["EMBED_QUOTA_PATH"] = os.path.join(state_dir, "quota.sqlite3")
+    os.environ["EMAIL_LEDGER_PATH"] = os.path.join(state_dir, "email_ledger.sqlite3")
+    os.environ["EMAIL_SENDS_PER_MINUTE"] = str(10**6)
+    os.environ["EMBED_CALLS_PER_MINUTE"] = str(10**6)
+    os.environ["EMBED_CALLS_PER_MONTH"] = str(10**9)
+
+    appwrite_latency = Latency(args.appwrite_latency, args.appwrite_latency / 4, args.seed)
+
+    import smtplib
+    import aiosmtplib
+    import cohere
+    import app_write
+    import pinecone.grpc
+
+    app_write.AppwriteClient = make_appwrite_client(args.users, appwrite_latency)
+    pinecone.grpc.PineconeGRPC = FakePinecone
+    cohere.AsyncClient = make_cohere(
+        Latency(args.embed_latency, args.embed_latency / 4, args.seed), embed_calls
+    )
+    smtp = make_smtp(
+        Latency(args.smtp_connect_latency, 0, args.seed),
+        Latency(args.smtp_latency, args.smtp_latency / 4, args.seed),
+        outbox,
+    )
+    smtp.send_message = timer.wrap("smtp_send", smtp.send_message)
+    smtplib.SMTP_SSL = smtp
+    async_smtp = make_async_smtp(
+        Latency(args.smtp_connect_latency, 0, args.seed),
+        Latency(args.smtp_latency, args.smtp_latency / 4, args.seed),
+        outbox,
+    )
+    async_smtp.send_message = timer.wrap("smtp_send", async_smtp.send_message)
+    aiosmtplib.SMTP = async_smtp
+
+    import queue_util.scraper_queue as scraper_queue
+
+    scrape_jobs = make_scrape_jobs(
+        args.jobs, Latency(args.scrape_latency, args.scrape_latency / 4, args.seed)
+    )
+    scraper_queue.scrape_jobs = timer.wrap("scrape", scrape_jobs)
+
+
+def instrument_app(main, timer: StageTimer, args):
+    """Time the pipeline stages of an imported app"""
+    from asyncio_throttle import Throttler
+    import utils.email_utils as email_utils
+    from scrape.service import scrape_service
+    from agent.matcher import job_matcher
+
+    main.get_all_users = timer.wrap("user_fetch", main.get_all_users)
+    main.get_user_resume = timer.wrap("resume_fetch", main.get_user_resume)
+
+    agent = main.scraper_agent
+    agent.write_db = args.db_writes
+    if not args.throttled:
+        agent.llm_throttler = Throttler(rate_limit=10**6, period=1)
+        agent.job_throttler = Throttler(rate_limit=10**6, period=1)
+    agent.process_job_info = timer.wrap("user_total", agent.process_job_info)
+    agent.extract_job = timer.wrap("extraction", agent.extract_job)
+
+    job_matcher.rank = timer.wrap("ranking", job_matcher.rank)
+    scrape_service.bulk_write = timer.wrap("db_write", scrape_service.bulk_write)
+    email_utils.create_job_html_template = timer.wrap(
+        "email_render", email_utils.create_job_html_template
+    )
+
+
+async def run(args) -> dict:
+    timer = StageTimer()
+    outbox = []
+    embed_calls = []
+    install_standins(args, timer, outbox, embed_calls)
+
+    import main
+    from queue_util.manager_queue import queue_manager
+
+    instrument_app(main, timer, args)
+    queues = asyncio.create_task(queue_manager.run_all())
+
+    start = time.perf_counter()
+    await main.process_users()
+    await queue_manager.db_queue.queue.join()
+    await queue_manager.email_queue.queue.join()
+    elapsed = time.perf_counter() - start
+
+    queues.cancel()
+    await asyncio.gather(queues, return_exceptions=True)
+
+    jobs = len(timer.samples.get("extraction", []))
+    return {
+        "params": vars(args),
+        "elapsed_s": round(elapsed, 3),
+        "throughput": {
+            "users_per_s": round(args.users / elapsed, 3),
+            "jobs_per_s": round(jobs / elapsed, 3),
+            "emails_per_s": round(len(outbox) / elapsed, 3),
+        },
+        "emails_sent": len(outbox),
+        "embed_calls": len(embed_calls),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stages": timer.summary(),
+    }
+
+
+def print_report(report: dict):
+    print(f"\nElapsed: {report['elapsed_s']}s  Peak RSS: {report['peak_rss_mb']} MB")
+    print("Throughput: " + ", ".join(f"{k}={v}" for k, v in report["throughput"].items()))
+    print(f"Emails sent: {report['emails_sent']}  Embed calls: {report['embed_calls']}\n")
+    header = f"{'stage':<14}{'count':>8}{'total s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for stage, stats in report["stages"].items():
+        print(
+            f"{stage:<14}{stats['count']:>8}{stats['total_s']:>10}"
+            f"{stats['p50_ms']:>10}{stats['p99_ms']:>10}"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--jobs", type=int, default=10, help="jobs scraped per user")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency-sigma", type=float, default=0.3)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--embed-latency", type=float, default=0.1)
+    parser.add_argument("--appwrite-latency", type=float, default=0.02)
+    parser.add_argument("--scrape-latency", type=float, default=0.2)
+    parser.add_argument("--smtp-connect-latency", type=float, default=0.15)
+    parser.add_argument("--smtp-latency", type=float, default=0.03)
+    parser.add_argument("--db-writes", action="store_true", help="persist extracted jobs")
+    parser.add_argument("--throttled", action="store_true", help="keep production LLM throttles")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Local stand-ins for the external services used by the job pipeline.
+
+Each stand-in mimics the shape of the real client closely enough for the
+pipeline code to run unchanged, and sleeps for a configurable latency so
+that network-bound stages still show up in the measurements.
+"""
+
+import time
+import random
+import asyncio
+import hashlib
+import itertools
+from datetime import date
+
+
+class Latency:
+    def __init__(self, mean: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        """
+        Fixed latency with optional uniform jitter
+
+        Args:
+            mean: Mean latency in seconds
+            jitter: Maximum deviation from the mean in seconds
+            seed: Seed for reproducible runs
+        """
+        self.mean = mean
+        self.jitter = jitter
+        self.random = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.mean <= 0:
+            return 0.0
+        return max(0.0, self.mean + self.random.uniform(-self.jitter, self.jitter))
+
+    def wait(self):
+        time.sleep(self.sample())
+
+
+RESUME_TEMPLATE = """
+# Candidate {i}
+Senior software engineer with {years} years of experience building backend
+services in Python, FastAPI and PostgreSQL. Led a team of {team} engineers,
+migrated monoliths to event-driven microservices on AWS and mentored juniors.
+
+## Skills
+Python, Django, FastAPI, PostgreSQL, Redis, Docker, Kubernetes, AWS, CI/CD
+
+## Experience
+- Tech Corp ({years} years): designed data pipelines processing 2TB per day
+- Startup Inc: built the payments platform from scratch
+"""
+
+
+def make_resume(i: int) -> str:
+    return RESUME_TEMPLATE.format(i=i, years=3 + i % 10, team=2 + i % 6) * 3
+
+
+class FakeUsers:
+    def __init__(self, n_users: int, latency: Latency):
+        self.n_users = n_users
+        self.latency = latency
+
+    def list(self, queries=None):
+        self.latency.wait()
+        return {
+            "total": self.n_users,
+            "users": [
+                {"$id": f"user-{i}", "email": f"user{i}@example.com"}
+                for i in range(self.n_users)
+            ],
+        }
+
+
+class FakeDatabases:
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.documents = {}
+        self._ids = itertools.count()
+
+    def list_collections(self, database_id=None):
+        return {"collections": []}
+
+    def list_documents(self, database_id=None, collection_id=None, queries=None):
+        self.latency.wait()
+        if collection_id == "cv_metadata":
+            # queries[0] is Query.equal("user_id", ...) rendered as a string
+            user = str(queries[0]) if queries else "user-0"
+            i = int("".join(c for c in user.split("user-")[-1] if c.isdigit()) or 0)
+            return {"total": 1, "documents": [{"text": make_resume(i)}]}
+        documents = list(self.documents.get(collection_id, {}).values())
+        return {"total": len(documents), "documents": documents}
+
+    def create_document(self, database_id=None, collection_id=None, document_id=None, data=None, permissions=None):
+        self.latency.wait()
+        document_id = document_id or f"doc-{next(self._ids)}"
+        document = {"$id": document_id, **(data or {})}
+        self.documents.setdefault(collection_id, {})[document_id] = document
+        return document
+
+
+def make_appwrite_client(n_users: int, latency: Latency):
+    """Build an AppwriteClient replacement bound to a synthetic user base"""
+
+    class FakeAppwriteClient:
+        def __init__(self, *args, **kwargs):
+            self.users = FakeUsers(n_users, latency)
+            self.database = FakeDatabases(latency)
+            self.storage = None
+            self.database_id = "bench"
+
+        def initialize_collection(self, collection_ids):
+            pass
+
+        def get_unique_id(self):
+            return f"id-{next(self.database._ids)}"
+
+        def create_document(self, collection_id, data, document_id=None, permissions=None):
+            return self.database.create_document(
+                collection_id=collection_id, document_id=document_id, data=data
+            )
+
+        async def list_documents(self, collection_id, queries=None):
+            return self.database.list_documents(collection_id=collection_id, queries=queries)
+
+    return FakeAppwriteClient
+
+
+JOB_FIELDS = [
+    "site", "job_url", "title", "company", "location", "date_posted", "job_type",
+    "salary_source", "interval", "min_amount", "max_amount", "is_remote",
+    "listing_type", "job_level", "job_function", "job_url_direct", "emails",
+    "description", "currency", "company_logo", "company_addresses",
+    "company_num_employees", "company_revenue", "company_description",
+    "company_industry", "company_url", "company_url_direct",
+]
+
+JOB_DESCRIPTION = (
+    "We are hiring a backend engineer to design, build and operate Python "
+    "services. You will own APIs, data pipelines and on-call rotations. "
+    "Requirements: 4+ years Python, SQL, cloud experience, strong communication. "
+) * 8
+
+
+def make_scrape_jobs(jobs_per_user: int, latency: Latency):
+    """Build a jobspy.scrape_jobs replacement returning synthetic listings"""
+    import pandas as pd
+
+    counter = itertools.count()
+
+    def scrape_jobs(**kwargs):
+        latency.wait()
+        rows = []
+        for _ in range(jobs_per_user):
+            n = next(counter)
+            row = {field: "" for field in JOB_FIELDS}
+            row.update(
+                site="indeed",
+                job_url=f"https://jobs.example.com/view/{n}",
+                title=f"{kwargs.get('search_term', 'Engineer')} #{n}",
+                company=f"Company {n % 50}",
+                location="Remote",
+                date_posted=date.today(),
+                description=JOB_DESCRIPTION,
+            )
+            rows.append(row)
+        return pd.DataFrame(rows, columns=JOB_FIELDS)
+
+    return scrape_jobs
+
+
+def make_smtp(connect_latency: Latency, send_latency: Latency, outbox: list):
+    """Build an smtplib.SMTP_SSL replacement that records sent messages"""
+
+    class FakeSMTP:
+        def __init__(self, host=None, port=None, *args, **kwargs):
+            connect_latency.wait()
+
+        def login(self, user, password):
+            return (235, b"Authentication successful")
+
+        def noop(self):
+            return (250, b"OK")
+
+        def send_message(self, message, *args, **kwargs):
+            send_latency.wait()
+            outbox.append(message)
+            return {}
+
+        def quit(self):
+            return (221, b"Bye")
+
+        def close(self):
+            pass
+
+    return FakeSMTP
+
+
+def make_async_smtp(connect_latency: Latency, send_latency: Latency, outbox: list):
+    """Build an aiosmtplib.SMTP replacement that records sent messages"""
+
+    class FakeAsyncSMTP:
+        def __init__(self, *args, **kwargs):
+            self.is_connected = False
+
+        async def connect(self):
+            await asyncio.sleep(connect_latency.sample())
+            self.is_connected = True
+
+        async def login(self, user, password):
+            return (235, "Authentication successful")
+
+        async def noop(self):
+            return (250, "OK")
+
+        async def send_message(self, message, *args, **kwargs):
+            await asyncio.sleep(send_latency.sample())
+            outbox.append(message)
+            return ({}, "OK")
+
+        async def quit(self):
+            self.is_connected = False
+
+        def close(self):
+            self.is_connected = False
+
+    return FakeAsyncSMTP
+
+
+def make_cohere(latency: Latency, calls: list):
+    """Build a cohere.AsyncClient replacement returning deterministic embeddings"""
+    import numpy as np
+
+    class FakeEmbedResponse:
+        def __init__(self, embeddings):
+            self.embeddings = embeddings
+
+    class FakeCohere:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        async def embed(self, texts=None, model=None, input_type=None, **kwargs):
+            await asyncio.sleep(latency.sample())
+            calls.append(len(texts))
+            dimension = 384 if model and "light" in model else 1024
+            embeddings = []
+            for text in texts:
+                seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+                embeddings.append(
+                    np.random.default_rng(seed).standard_normal(dimension, dtype=np.float32).tolist()
+                )
+            return FakeEmbedResponse(embeddings)
+
+    return FakeCohere
+
+
+class FakeIndex:
+    def __init__(self):
+        self.vectors = {}
+
+    def upsert(self, vectors, namespace=None, **kwargs):
+        for vector in vectors:
+            self.vectors[(namespace, vector["id"])] = vector
+        return {"upserted_count": len(vectors)}
+
+    def query(self, vector=None, top_k=3, namespace=None, **kwargs):
+        return {"matches": [], "namespace": namespace}
+
+    def fetch(self, ids, namespace=None):
+        return {"vectors": {i: self.vectors[(namespace, i)] for i in ids if (namespace, i) in self.vectors}}
+
+    def describe_index_stats(self):
+        return {"total_vector_count": len(self.vectors)}
+
+
+class FakePinecone:
+    def __init__(self, *args, **kwargs):
+        self.index = FakeIndex()
+
+    def has_index(self, name):
+        return True
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def Index(self, name):
+        return self.index
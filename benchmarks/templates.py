@@ -0,0 +1,116 @@
+"""
+Benchmark of email template rendering.
+
+Renders many job digests and scholarship digests with the prepared templates
+and, as a baseline, with templates rebuilt (and CSS re-inlined) for every
+email, which is what per-email templating costs without the template cache.
+
+    python -m benchmarks.templates --emails 2000 --jobs 5 --inline
+"""
+
+import time
+import argparse
+import statistics
+
+from utils import email_utils
+from scholar import mailer
+from utils.templates import HtmlTemplate, compile_template
+
+
+def make_jobs(count: int):
+    return [
+        {
+            "job_title": f"Software Engineer {i}",
+            "company_info": f"Company {i} builds developer tools",
+            "location": "Lagos, Nigeria",
+            "salary_range": "$60,000 - $80,000",
+            "job_description": "Build and maintain backend services. " * 8,
+            "responsibilities": [f"Responsibility {n}" for n in range(5)],
+            "required_skills": ["Python", "SQL", "AsyncIO", "Docker"],
+            "qualifications": ["BSc Computer Science", "3+ years experience"],
+            "job_url": f"https://example.com/jobs/{i}",
+            "match_score": 1 - i / 100,
+        }
+        for i in range(count)
+    ]
+
+
+def make_scholarships(count: int):
+    return [
+        {
+            "title": f"Fully Funded Scholarship {i}",
+            "content": "Eligibility, benefits and deadlines of the programme. " * 10,
+            "application_link": f"https://example.com/apply/{i}",
+            "link": f"https://example.com/scholarships/{i}",
+        }
+        for i in range(count)
+    ]
+
+
+def timed(fn, emails: int):
+    durations = []
+    for i in range(emails):
+        start = time.perf_counter()
+        fn(i)
+        durations.append(time.perf_counter() - start)
+    return {
+        "total_s": round(sum(durations), 4),
+        "per_email_us": round(statistics.mean(durations) * 1e6, 1),
+        "emails_per_s": round(emails / sum(durations)),
+    }
+
+
+def run(args) -> dict:
+    jobs = make_jobs(args.jobs)
+    scholarships = make_scholarships(args.scholarships)
+    job_args = (email_utils.JOB_EMAIL_DOCUMENT, email_utils.JOB_EMAIL_ITEM, email_utils.JOB_EMAIL_CSS, args.inline)
+    digest_args = (mailer.DIGEST_DOCUMENT, mailer.DIGEST_ITEM, mailer.DIGEST_CSS, args.inline)
+
+    def digest_cards(i):
+        return [mailer._card(s, "scholarship") for s in scholarships]
+
+    cases = {
+        "job_compiled": lambda i: compile_template(*job_args).render(
+            jobs, count=len(jobs), to_email=f"user{i}@example.com"
+        ),
+        "job_rebuilt": lambda i: HtmlTemplate(*job_args).render(
+            jobs, count=len(jobs), to_email=f"user{i}@example.com"
+        ),
+        "digest_compiled": lambda i: compile_template(*digest_args).render(
+            digest_cards(i), type="scholarship", type_upper="SCHOLARSHIP"
+        ),
+        "digest_rebuilt": lambda i: HtmlTemplate(*digest_args).render(
+            digest_cards(i), type="scholarship", type_upper="SCHOLARSHIP"
+        ),
+    }
+    for fn in cases.values():
+        fn(0)  # compile and warm the caches outside the measurements
+    return {name: timed(fn, args.emails) for name, fn in cases.items()}
+
+
+def print_report(report: dict):
+    header = f"{'case':<18}{'total s':>10}{'us/email':>12}{'emails/s':>12}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in report.items():
+        print(f"{name:<18}{stats['total_s']:>10}{stats['per_email_us']:>12}{stats['emails_per_s']:>12}")
+    for kind in ("job", "digest"):
+        speedup = report[f"{kind}_rebuilt"]["total_s"] / report[f"{kind}_compiled"]["total_s"]
+        print(f"{kind}: prepared templates are {speedup:.1f}x faster")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--emails", type=int, default=2000)
+    parser.add_argument("--jobs", type=int, default=5, help="jobs per job digest")
+    parser.add_argument("--scholarships", type=int, default=10, help="items per scholarship digest")
+    parser.add_argument("--inline", action="store_true", help="inline CSS into style attributes")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    print_report(run(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,27 @@
+import os
 from typing import List
 
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Caches, ledgers and indexes kept between runs, one file or directory each
+STATE_DIR = os.getenv("STATE_DIR", ".state")
+
+
+def state_path(name: str) -> str:
+    """
+    Location of a state store under STATE_DIR
+
+    Stores created before STATE_DIR existed sit in the working directory as
+    .<name>, they keep being used there so no cache, quota or ledger is lost.
+    """
+    path = os.path.join(STATE_DIR, name)
+    legacy = f".{name}"
+    if not os.path.exists(path) and os.path.exists(legacy):
+        return legacy
+    return path
+
 
 class Config:
     job_collection = "jobs"
@@ -1,89 +1,105 @@
-from typing import Any
+from typing import AsyncIterator, Optional
 from bs4 import BeautifulSoup
-from markdownify import markdownify as md
 from langchain_community.document_loaders import AsyncHtmlLoader
 from langchain_core.documents import Document
 import asyncio
 import httpx
 from log import logger
-
-
-def _build_metadata(soup: Any, url: str) -> dict:
-    """Build metadata from BeautifulSoup output."""
-    metadata = {"source": url}
-    if title := soup.find("title"):
-        metadata["title"] = title.get_text()
-    if description := soup.find("meta", attrs={"name": "description"}):
-        metadata["description"] = description.get("content", "No description found.")
-    if html := soup.find("html"):
-        metadata["language"] = html.get("lang", "No language found.")
-    return metadata
+from metrics import metrics
+from utils.http_client import http_clients
+from utils.html_parse import page_cache, to_markdown
 
 
 class AsyncHtmlLoaderWithOuterDivs(AsyncHtmlLoader):
     """Load HTML and extract the first two outer div elements inside <main>."""
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, max_concurrency: int = 16, max_per_host: int = 4, **kwargs):
+        """
+        Args:
+            max_concurrency: Pages fetched at once in total
+            max_per_host: Pages fetched at once from the same host
+        """
         super().__init__(*args, **kwargs)
         self.max_retries = 3
-        self.retry_delay = 5  # seconds
+        self.retry_delay = 5  # seconds, before the first retry of each request
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self._slots = None
+        self._host_slots = {}
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = httpx.URL(url).host
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_slots[host]
 
     async def _fetch_with_retry(self, url: str) -> str:
         """Fetch HTML content with retry logic for rate limiting."""
+        # Backoff is per request, a slow page doesn't delay the others
+        retry_delay = self.retry_delay
         for attempt in range(self.max_retries):
             try:
                 logger.info(f"Fetching URL: {url} (Attempt {attempt + 1}/{self.max_retries})")
-                async with httpx.AsyncClient(
-                    timeout=60.0,
-                    follow_redirects=True,
-                    verify=True,
-                    http2=True,
-                    transport=httpx.AsyncHTTPTransport(
-                        retries=2,  # Number of retries
-                        verify=True,
-                    )
-                ) as client:
-                    response = await client.get(url)
-                    response.raise_for_status()
-                    logger.info(f"Successfully fetched URL: {url}")
-                    return response.text
+                client = http_clients.get(url)
+                # Host slot first, so tasks queued on a busy host don't hold global slots
+                async with self._host_slot(url), self._slots:
+                    with metrics.span("scrape", httpx.URL(url).host):
+                        response = await client.get(url)
+                response.raise_for_status()
+                logger.info(f"Successfully fetched URL: {url}")
+                return response.text
             except httpx.HTTPStatusError as e:
                 if e.response.status_code == 429:  # Too Many Requests
-                    logger.warning(f"Rate limited on attempt {attempt + 1}. Waiting {self.retry_delay} seconds...")
-                    await asyncio.sleep(self.retry_delay)
-                    self.retry_delay *= 2  # Exponential backoff
+                    logger.warning(f"Rate limited on attempt {attempt + 1}. Waiting {retry_delay} seconds...")
+                    await asyncio.sleep(retry_delay)
+                    retry_delay *= 2  # Exponential backoff
                     continue
                 logger.error(f"HTTP error occurred while fetching {url}: {e}")
                 if attempt < self.max_retries - 1:
-                    await asyncio.sleep(self.retry_delay)
-                    self.retry_delay *= 2  # Exponential backoff
+                    await asyncio.sleep(retry_delay)
+                    retry_delay *= 2  # Exponential backoff
                     continue
                 raise
             except Exception as e:
                 logger.error(f"Error occurred while fetching {url}: {e}")
                 if attempt < self.max_retries - 1:
-                    await asyncio.sleep(self.retry_delay)
-                    self.retry_delay *= 2  # Exponential backoff
+                    await asyncio.sleep(retry_delay)
+                    retry_delay *= 2  # Exponential backoff
                     continue
                 raise
+        raise RuntimeError(f"Still rate limited after {self.max_retries} attempts: {url}")
+
+    async def _load(self, url: str) -> Optional[Document]:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        try:
+            html_content = await self._fetch_with_retry(url)
+            # Parsing is CPU bound, keep it off the event loop
+            return await asyncio.to_thread(self._to_document, url, html_content)
+        except Exception as e:
+            logger.error(f"Error loading document from {url}: {e}")
+            return None
+
+    async def astream(self) -> AsyncIterator[Document]:
+        """Fetch all pages concurrently, yielding documents as they complete"""
+        tasks = [asyncio.ensure_future(self._load(url)) for url in self.web_paths]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                document = await next_done
+                if document is not None:
+                    yield document
+        finally:
+            # The consumer may stop early
+            for task in tasks:
+                task.cancel()
 
     async def aload(self) -> list[Document]:
-        """Load documents asynchronously with retry logic."""
-        documents = []
-        for url in self.web_paths:
-            try:
-                html_content = await self._fetch_with_retry(url)
-                document = self._to_document(url, html_content)
-                documents.append(document)
-            except Exception as e:
-                logger.error(f"Error loading document from {url}: {e}")
-                continue
-        return documents
+        """Load documents concurrently with retry logic, in web_paths order."""
+        documents = await asyncio.gather(*(self._load(url) for url in self.web_paths))
+        return [document for document in documents if document is not None]
 
-    def _extract_outer_divs(self, html_content: str) -> str:
+    def _extract_outer_divs(self, soup: BeautifulSoup) -> str:
         """Extract the first two outer <div> elements inside the <main> tag."""
-        soup = BeautifulSoup(html_content, "html.parser")
-
         # Find the <main> tag
         main_tag = soup.find("main")
 
@@ -93,15 +109,15 @@ class AsyncHtmlLoaderWithOuterDivs(AsyncHtmlLoader):
             # Convert these divs to Markdown
             markdown = ""
             for div in outer_divs:
-                markdown += md(str(div)) + "\n"
+                markdown += to_markdown(div) + "\n"
             return markdown
         return ""
 
     def _to_document(self, url: str, text: str) -> Document:
         """Override to process HTML and extract outer divs."""
-        # Use the new extraction method for the first two outer divs
-        extracted_content = self._extract_outer_divs(text)
+        # Parse once, content and metadata come from the same tree
+        page = page_cache.parse(url, text)
+        extracted_content = self._extract_outer_divs(page.soup)
 
         # Build the document with the extracted Markdown content
-        metadata = _build_metadata(BeautifulSoup(text, "html.parser"), url)
-        return Document(page_content=extracted_content, metadata=metadata)
+        return Document(page_content=extracted_content, metadata=dict(page.metadata))
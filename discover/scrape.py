@@ -1,8 +1,11 @@
 from log import logger
+from metrics import metrics
+from utils.http_client import http_clients
+from utils.html_parse import page_cache
+from utils.http_cache import http_cache
 
 import httpx
 import asyncio
-from bs4 import BeautifulSoup
 from pydantic import BaseModel
 from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
@@ -43,6 +46,8 @@ class DiscoverHubScraper:
             "https://dixcoverhub.com.ng/category/jobs/",
             "https://dixcoverhub.com.ng/category/bootcamps/",
         ]
+        # Listing pages already processed are skipped until they change
+        self.cache_scope = type(self).__name__
         logger.info("DiscoverHubScraper initialized with URLs: %s", self.BASE_URLS)
 
     async def fetch(self, url):
@@ -52,20 +57,16 @@ class DiscoverHubScraper:
         for attempt in range(max_retries):
             try:
                 logger.info(f"Fetching URL: {url} (Attempt {attempt + 1}/{max_retries})")
-                async with httpx.AsyncClient(
-                    timeout=60.0,
-                    follow_redirects=True,
-                    verify=True,
-                    http2=True,
-                    transport=httpx.AsyncHTTPTransport(
-                        retries=2,  # Number of retries
-                        verify=True,
-                    )
-                ) as client:
-                    response = await client.get(url)
+                client = http_clients.get(url)
+                with metrics.span("scrape", httpx.URL(url).host):
+                    response = await client.get(url, headers=http_cache.headers(self.cache_scope, url))
+                if response.status_code != 304:  # Not Modified
                     response.raise_for_status()  # Will raise an error for bad status codes
-                    logger.info(f"Successfully fetched URL: {url}")
-                    return response
+                if http_cache.unchanged(self.cache_scope, url, response):
+                    logger.info(f"Unchanged since the last run, skipping: {url}")
+                    return None
+                logger.info(f"Successfully fetched URL: {url}")
+                return response
             except httpx.HTTPStatusError as e:
                 if e.response.status_code == 429:  # Too Many Requests
                     logger.warning(f"Rate limited on attempt {attempt + 1}. Waiting {retry_delay} seconds...")
@@ -87,9 +88,10 @@ class DiscoverHubScraper:
                 return None
 
     async def fetch_data(self):
+        """(response, url) of each listing page that changed since it was last processed"""
         tasks = [self.fetch(url) for url in self.BASE_URLS]
         results = await asyncio.gather(*tasks)
-        return [result for result in results if result is not None]
+        return [(result, url) for result, url in zip(results, self.BASE_URLS) if result is not None]
 
     async def scrape_job_list(self):
         data = []
@@ -97,10 +99,10 @@ class DiscoverHubScraper:
             logger.info("Starting scraping job listings.")
             responses = await self.fetch_data()
 
-            for id, (response, url) in enumerate(zip(responses, self.BASE_URLS)):
+            for id, (response, url) in enumerate(responses):
                 parts = url.split("/")
                 job_type = parts[-2]
-                soup = BeautifulSoup(response.content, "html.parser")
+                soup = page_cache.parse(url, response.content).soup
 
                 for li in soup.find_all("li"):
                     id += 1
@@ -131,6 +133,9 @@ class DiscoverHubScraper:
             logger.info(f"Scraped {len(data)} job listings.")
         except Exception as e:
             logger.error(f"Error while scraping job list: {e}")
+            # Read the pages again next run
+            for url in self.BASE_URLS:
+                http_cache.discard(self.cache_scope, url)
         return data
 
     async def compile(self, text):
@@ -178,13 +183,30 @@ class DiscoverHubScraper:
                         "job_text": job_detail,
                     }
                 )
+            # Listing pages are skipped from now on, until they change, unless a
+            # detail page failed: then the listing is read again next run
+            incomplete = {
+                response["job_type"] for response, job_detail in zip(responses, job_details) if not job_detail
+            }
+            for url in self.BASE_URLS:
+                if url.split("/")[-2] in incomplete:
+                    logger.warning(f"Some detail pages of {url} failed, reading it again next run")
+                    http_cache.discard(self.cache_scope, url)
+                else:
+                    http_cache.commit(self.cache_scope, url)
             logger.info(f"Parsed {len(jobs)} jobs successfully.")
         except Exception as e:
             logger.error(f"Error while parsing job details: {e}")
+            for url in self.BASE_URLS:
+                http_cache.discard(self.cache_scope, url)
+        finally:
+            # Parsed pages are only shared within a run
+            page_cache.clear()
         return jobs
 
     async def extract_details(self, urls):
         loader = AsyncHtml(urls)
         docs = await loader.aload()
-        all_content = [con.page_content for con in docs]
-        return all_content
+        # Failed pages are left out, match the rest back to their URLs
+        contents = {doc.metadata["source"]: doc.page_content for doc in docs}
+        return [contents.get(url, "") for url in urls]
@@ -1,12 +1,23 @@
 from enum import Enum
+import asyncio
+import sqlite3
+import threading
 import cohere
-from typing import List, Dict
+from typing import Callable, List, Dict
 import os
 from dotenv import load_dotenv
 from asyncio_throttle import Throttler
 import logging
-from datetime import datetime, timedelta
-from tenacity import retry, stop_after_attempt, wait_exponential
+from datetime import datetime, timedelta, timezone
+from tenacity import (
+    retry,
+    retry_if_not_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+from metrics import TracedClient
+from config import state_path
+from embed_cache import EmbeddingCache, embedding_cache
 
 load_dotenv()
 
@@ -19,42 +30,183 @@ class EmbeddingModels(str, Enum):
     COHERE_MULTILINGUAL_V3 = "embed-multilingual-v3.0"  # 1024 dimensions
 
 
-class RateLimiter:
-    def __init__(self, calls_per_minute: int = 50, calls_per_month: int = 1000):
-        # Minute rate limiter: 50 calls per minute = 1 call per 1.2 seconds
-        self.minute_throttler = Throttler(rate_limit=calls_per_minute, period=60)
+# Cohere accepts at most 96 texts per embed call
+MAX_TEXTS_PER_CALL = 96
+
+EMBED_QUOTA_PATH = os.getenv("EMBED_QUOTA_PATH") or state_path("embedding_quota.sqlite3")
+EMBED_CALLS_PER_MINUTE = int(os.getenv("EMBED_CALLS_PER_MINUTE", "50"))
+EMBED_CALLS_PER_MONTH = int(os.getenv("EMBED_CALLS_PER_MONTH", "1000"))
+
+
+class QuotaExceeded(Exception):
+    """Raised when a call would go over the monthly embedding quota"""
 
-        # Monthly rate limiter
-        self.month_throttler = Throttler(
-            rate_limit=calls_per_month, period=60 * 60 * 24 * 30
+    def __init__(self, used: int, limit: int, requested: int = 1):
+        super().__init__(
+            f"Monthly API call limit reached ({used}/{limit} used, {requested} requested)"
         )
+        self.used = used
+        self.limit = limit
+        self.requested = requested
+
+
+class QuotaLedger:
+    def __init__(self, path: str = EMBED_QUOTA_PATH, busy_timeout: float = 2.0):
+        """
+        Monthly API call counts persisted in SQLite and shared across processes
+
+        Args:
+            path: SQLite database file
+            busy_timeout: Seconds to wait for another process's write lock
+        """
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._conn = None
+        self._lock = threading.Lock()
 
-        # Track API calls
-        self.monthly_calls = 0
-        self.last_reset = datetime.now()
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Autocommit mode so reservations can take an explicit write lock
+            self._conn = sqlite3.connect(
+                self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS quota (
+                    name TEXT NOT NULL,
+                    period TEXT NOT NULL,
+                    calls INTEGER NOT NULL,
+                    PRIMARY KEY (name, period)
+                )
+                """
+            )
+        return self._conn
+
+    @staticmethod
+    def period(now: datetime = None) -> str:
+        return (now or datetime.now(timezone.utc)).strftime("%Y-%m")
+
+    def used(self, name: str) -> int:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT calls FROM quota WHERE name = ? AND period = ?",
+                (name, self.period()),
+            ).fetchone()
+        return row[0] if row else 0
+
+    def reserve(self, name: str, calls: int, limit: int) -> int:
+        """
+        Atomically count calls against this month's quota
 
+        Returns:
+            Calls used this month, including the reserved ones
+
+        Raises:
+            QuotaExceeded: If the reservation would go over limit
+        """
+        period = self.period()
+        with self._lock:
+            conn = self.conn
+            # BEGIN IMMEDIATE serialises reservations across processes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT calls FROM quota WHERE name = ? AND period = ?",
+                    (name, period),
+                ).fetchone()
+                used = row[0] if row else 0
+                if used + calls > limit:
+                    raise QuotaExceeded(used, limit, calls)
+                conn.execute(
+                    "INSERT INTO quota (name, period, calls) VALUES (?, ?, ?) "
+                    "ON CONFLICT (name, period) DO UPDATE SET calls = calls + excluded.calls",
+                    (name, period, calls),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return used + calls
+
+
+def log_quota_warning(used: int, limit: int, threshold: float):
+    logging.getLogger(__name__).warning(
+        f"Embedding quota at {threshold:.0%}: {used}/{limit} calls used, "
+        f"only {limit - used} remaining this month"
+    )
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        calls_per_minute: int = EMBED_CALLS_PER_MINUTE,
+        calls_per_month: int = EMBED_CALLS_PER_MONTH,
+        ledger: QuotaLedger = None,
+        name: str = "cohere",
+        warning_thresholds: tuple = (0.8, 0.9, 0.95),
+        on_warning: Callable[[int, int, float], None] = log_quota_warning,
+    ):
+        """
+        Per-minute throttle plus a persisted monthly quota
+
+        Args:
+            calls_per_minute: Maximum API calls per minute in this process
+            calls_per_month: Maximum API calls per calendar month (UTC) across processes
+            ledger: Ledger the monthly calls are counted in
+            name: Quota name in the ledger
+            warning_thresholds: Fractions of the monthly quota that trigger on_warning
+            on_warning: Called with (used, limit, threshold) when a threshold is crossed
+        """
+        self.minute_throttler = Throttler(rate_limit=calls_per_minute, period=60)
+        self.calls_per_month = calls_per_month
+        self.ledger = ledger or QuotaLedger()
+        self.name = name
+        self.warning_thresholds = sorted(warning_thresholds)
+        self.on_warning = on_warning
         self.logger = logging.getLogger(__name__)
 
-    async def acquire(self):
-        """Acquire both rate limiters"""
-        # Reset monthly counter if needed
-        if datetime.now() - self.last_reset > timedelta(days=30):
-            self.monthly_calls = 0
-            self.last_reset = datetime.now()
+    @property
+    def monthly_calls(self) -> int:
+        return self.ledger.used(self.name)
+
+    @property
+    def remaining_calls(self) -> int:
+        return max(0, self.calls_per_month - self.monthly_calls)
 
-        # Check monthly limit
-        if self.monthly_calls >= 1000:
-            raise Exception("Monthly API call limit reached")
+    @property
+    def last_reset(self) -> datetime:
+        return datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
+    @property
+    def next_reset(self) -> datetime:
+        last_reset = self.last_reset
+        return (last_reset + timedelta(days=32)).replace(day=1)
+
+    def ensure_available(self, calls: int):
+        """Fail early if calls would not fit in what is left of the monthly quota"""
+        used = self.monthly_calls
+        if used + calls > self.calls_per_month:
+            raise QuotaExceeded(used, self.calls_per_month, calls)
+
+    async def acquire(self, calls: int = 1):
+        """Wait for the minute throttle, then count calls against the monthly quota"""
         async with self.minute_throttler:
-            async with self.month_throttler:
-                self.monthly_calls += 1
-                remaining_calls = 1000 - self.monthly_calls
-                if remaining_calls < 100:
-                    self.logger.warning(
-                        f"Only {remaining_calls} API calls remaining this month"
-                    )
-                return True
+            # The ledger may wait on another process's lock, keep that off the event loop
+            used = await asyncio.to_thread(self.ledger.reserve, self.name, calls, self.calls_per_month)
+
+        # Each process that crosses a threshold reports it, so it fires once per month
+        for threshold in self.warning_thresholds:
+            mark = threshold * self.calls_per_month
+            if used - calls < mark <= used and self.on_warning:
+                try:
+                    self.on_warning(used, self.calls_per_month, threshold)
+                except Exception as e:
+                    self.logger.error(f"Quota warning hook failed: {e}")
+        return True
 
 
 class EmbeddingService:
@@ -62,26 +214,105 @@ class EmbeddingService:
         self,
         api_key: str = os.getenv("COHERE_API_KEY"),
         model: str = EmbeddingModels.COHERE_ENGLISH_V3,
-        calls_per_minute: int = 50,
-        calls_per_month: int = 1000,
+        calls_per_minute: int = EMBED_CALLS_PER_MINUTE,
+        calls_per_month: int = EMBED_CALLS_PER_MONTH,
         max_retries: int = 3,
+        max_concurrency: int = 4,
+        cache: EmbeddingCache = embedding_cache,
     ):
-        self.client = cohere.Client(api_key)
+        """
+        Cohere embeddings with rate limiting
+
+        Args:
+            api_key: Cohere API key
+            model: Embedding model name
+            calls_per_minute: Maximum API calls per minute
+            calls_per_month: Maximum API calls per month
+            max_retries: Attempts per API call
+            max_concurrency: Batches embedded concurrently
+            cache: Persistent embedding cache, None to always call the API
+        """
+        self.client = TracedClient(cohere.AsyncClient(api_key), "cohere")
         self.model = model
         self.dimension = 1024 if "light" not in model else 384
         self.rate_limiter = RateLimiter(calls_per_minute, calls_per_month)
         self.logger = logging.getLogger(__name__)
         self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.cache = cache
 
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_not_exception_type(QuotaExceeded),
         reraise=True,
     )
     async def _make_embed_call(self, texts, input_type: str):
         """Helper method to make API calls with retry logic"""
+        # Every attempt reaches the API, so every attempt is counted once
         await self.rate_limiter.acquire()
-        return self.client.embed(texts=texts, model=self.model, input_type=input_type)
+        return await self.client.embed(texts=texts, model=self.model, input_type=input_type)
+
+    async def _embed_batch(
+        self, batch: List[str], input_type: str, current_batch: int, total_batches: int
+    ) -> List[List[float]]:
+        async with self._semaphore:
+            try:
+                self.logger.info(f"Processing {input_type} batch {current_batch}/{total_batches}")
+                response = await self._make_embed_call(batch, input_type)
+                self.logger.info(f"Completed {input_type} batch {current_batch}/{total_batches}")
+                return response.embeddings
+
+            except Exception as e:
+                self.logger.error(f"Error in {input_type} batch {current_batch}: {e}")
+                raise
+
+    async def _embed(
+        self, texts: List[str], input_type: str, batch_size: int
+    ) -> List[List[float]]:
+        """Embed texts, serving cached ones first and sending only unique misses to the API"""
+        if self.cache is None:
+            return await self._embed_uncached(texts, input_type, batch_size)
+
+        embeddings = self.cache.get_many(self.model, input_type, texts)
+        missing = list(dict.fromkeys(t for t, e in zip(texts, embeddings) if e is None))
+        if missing:
+            self.logger.info(
+                f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} to embed"
+            )
+            fresh = await self._embed_uncached(missing, input_type, batch_size)
+            self.cache.put_many(self.model, input_type, missing, fresh)
+            by_text = dict(zip(missing, fresh))
+            embeddings = [e if e is not None else by_text[t] for t, e in zip(texts, embeddings)]
+        return embeddings
+
+    async def _embed_uncached(
+        self, texts: List[str], input_type: str, batch_size: int
+    ) -> List[List[float]]:
+        """Embed texts in batches, up to max_concurrency batches in flight, keeping order"""
+        if not texts:
+            return []
+        # Use as few counted calls as possible, spread evenly so no call is a straggler
+        calls = -(-len(texts) // min(batch_size, MAX_TEXTS_PER_CALL))
+        await asyncio.to_thread(self.rate_limiter.ensure_available, calls)
+        size = -(-len(texts) // calls)
+        batches = [texts[i : i + size] for i in range(0, len(texts), size)]
+        tasks = [
+            asyncio.create_task(
+                self._embed_batch(batch, input_type, i + 1, len(batches))
+            )
+            for i, batch in enumerate(batches)
+        ]
+        try:
+            results = await asyncio.gather(*tasks)
+        except Exception:
+            # Don't keep spending quota on batches whose results will be dropped
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return [embedding for embeddings in results for embedding in embeddings]
 
     async def batch_embed_documents(
         self, documents: List[str], batch_size: int = 96
@@ -93,36 +324,11 @@ class EmbeddingService:
             documents: List of texts to embed
             batch_size: Maximum number of texts per API call
         """
-        embedded_documents = []
-        total_batches = (len(documents) + batch_size - 1) // batch_size
-
-        for i in range(0, len(documents), batch_size):
-            batch = documents[i : i + batch_size]
-            current_batch = (i // batch_size) + 1
-
-            try:
-                # Acquire rate limiter
-                await self.rate_limiter.acquire()
-
-                self.logger.info(f"Processing batch {current_batch}/{total_batches}")
-                response = await self._make_embed_call(batch, "search_document")
-
-                for j, embedding in enumerate(response.embeddings):
-                    embedded_documents.append(
-                        {
-                            "text": batch[j],
-                            "embedding": embedding,
-                        }
-                    )
-
-                self.logger.info(f"Completed batch {current_batch}/{total_batches}")
-
-            except Exception as e:
-                self.logger.error(f"Error in batch {current_batch}: {e}")
-                # Optionally retry or handle specific errors
-                raise
-
-        return embedded_documents
+        embeddings = await self._embed(documents, "search_document", batch_size)
+        return [
+            {"text": text, "embedding": embedding}
+            for text, embedding in zip(documents, embeddings)
+        ]
 
     async def query_embeddings(self, query: str | List[str], batch_size: int = 96):
         """
@@ -133,31 +339,7 @@ class EmbeddingService:
             batch_size: Maximum number of texts per API call
         """
         queries = [query] if isinstance(query, str) else query
-        all_embeddings = []
-        total_batches = (len(queries) + batch_size - 1) // batch_size
-
-        for i in range(0, len(queries), batch_size):
-            batch = queries[i : i + batch_size]
-            current_batch = (i // batch_size) + 1
-
-            try:
-                # Acquire rate limiter
-                await self.rate_limiter.acquire()
-
-                self.logger.info(
-                    f"Processing query batch {current_batch}/{total_batches}"
-                )
-                response = await self._make_embed_call(batch, "search_query")
-                all_embeddings.extend(response.embeddings)
-
-                self.logger.info(
-                    f"Completed query batch {current_batch}/{total_batches}"
-                )
-
-            except Exception as e:
-                self.logger.error(f"Error in query batch {current_batch}: {e}")
-                raise
-
+        all_embeddings = await self._embed(queries, "search_query", batch_size)
         return all_embeddings[0] if isinstance(query, str) else all_embeddings
 
     @property
@@ -169,9 +351,9 @@ class EmbeddingService:
         """Get current API usage statistics"""
         return {
             "monthly_calls": self.rate_limiter.monthly_calls,
-            "remaining_calls": 1000 - self.rate_limiter.monthly_calls,
+            "calls_per_month": self.rate_limiter.calls_per_month,
+            "remaining_calls": self.rate_limiter.remaining_calls,
             "last_reset": self.rate_limiter.last_reset.isoformat(),
-            "next_reset": (
-                self.rate_limiter.last_reset + timedelta(days=30)
-            ).isoformat(),
+            "next_reset": self.rate_limiter.next_reset.isoformat(),
+            "cache": self.cache.stats() if self.cache else None,
         }
@@ -9,6 +9,12 @@ from dotenv import load_dotenv
 from log import logger  # Import the configured logger
 from queue_util.manager_queue import queue_manager
 from agent.scraper import ScraperAgent
+from agent.router import llm_router
+from agent.budget import token_budget
+from metrics import metrics
+from vector_database import vector_db
+from utils.smtp_pool import smtp_pool, async_smtp_pool
+from utils.http_client import http_clients
 from schemas.model import UserModel
 from services import get_all_users, get_user_resume
 
@@ -16,7 +22,7 @@ from services import get_all_users, get_user_resume
 import httpx
 from uvicorn import run
 from fastapi import FastAPI, UploadFile, File, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
 from app_write import AppwriteClient
 # from scholar.run import send, check_new_scholarships
 from scholar.run import start_checking_new_offer
@@ -36,6 +42,24 @@ def home():
     logger.info("Home endpoint accessed.")
     return "refreshed successfully"
  
+@app.get("/llm/state")
+def llm_state():
+    return llm_router.state()
+
+@app.get("/llm/usage")
+def llm_usage():
+    return token_budget.usage_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@app.get("/metrics/spans")
+def recent_spans(task_id: str = None, limit: int = 100):
+    return metrics.spans(task_id=task_id, limit=limit)
+
 @app.get("/success", response_class=HTMLResponse)
 async def serve_success_page():
     with open("success.html", "r") as f:
@@ -88,19 +112,10 @@ async def ping_server():
     
     for attempt in range(max_retries):
         try:
-            async with httpx.AsyncClient(
-                timeout=30.0,
-                follow_redirects=True,
-                verify=True,
-                http2=True,
-                transport=httpx.AsyncHTTPTransport(
-                    retries=2,  # Number of retries
-                    verify=True,
-                )
-            ) as client:
-                res = await client.get(endpoint)
-                logger.info(f"Pinged {endpoint} - Status Code: {res.status_code}")
-                return res
+            client = http_clients.get(endpoint)
+            res = await client.get(endpoint, timeout=30.0)
+            logger.info(f"Pinged {endpoint} - Status Code: {res.status_code}")
+            return res
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 429:  # Too Many Requests
                 logger.warning(f"Rate limited on attempt {attempt + 1}. Waiting {retry_delay} seconds...")
@@ -162,27 +177,30 @@ async def run_scholarship_checks():
             logger.error(f"Error in scholarship checks: {e}")
             await asyncio.sleep(60)  # Wait a minute before retrying
 
+async def process_users():
+    logger.info("Starting resume scraping and job invocation.")
+    users = await get_all_users()
+    logger.info(f"Fetched {len(users)} resumes from user collection.")
+    
+    if users:
+        for user in users:    
+            userId = user["$id"]
+            resume_txt = get_user_resume(userId)
+            if resume_txt:
+                try:
+                    await scraper_agent.process_job_info(resume_txt, user["email"])
+                except Exception as e:
+                    logger.error(f"Error processing job info: {e}")
+                    continue
+            else:
+                logger.error(f"No resume found for user {userId}")
+    
+    logger.info("Completed one iteration of resume processing.")
+
 async def run_job_checks():
     while True:
         try:
-            logger.info("Starting resume scraping and job invocation.")
-            users = await get_all_users()
-            logger.info(f"Fetched {len(users)} resumes from user collection.")
-            
-            if users:
-                for user in users:    
-                    userId = user["$id"]
-                    resume_txt = get_user_resume(userId)
-                    if resume_txt:
-                        try:
-                            await scraper_agent.process_job_info(resume_txt, user["email"])
-                        except Exception as e:
-                            logger.error(f"Error processing job info: {e}")
-                            continue
-                    else:
-                        logger.error(f"No resume found for user {userId}")
-            
-            logger.info("Completed one iteration of resume processing.")
+            await process_users()
             # Run every 19 hours
             await asyncio.sleep(24 * 60 * 60)
         except Exception as e:
@@ -197,6 +215,7 @@ async def lifespan(app: FastAPI):
         # ping_task = asyncio.create_task(periodic_ping())
         queue_task = asyncio.create_task(start_queues())
         start_task = asyncio.create_task(start_tasks())
+        vector_db.start()
 
     except Exception as e:
         logger.error(f"Error during startup: {e}")
@@ -213,6 +232,16 @@ async def lifespan(app: FastAPI):
     start_task.cancel()
     await asyncio.gather(queue_task, start_task, return_exceptions=True)
 
+    # Write out vectors still waiting in the upsert buffer
+    try:
+        await vector_db.close()
+    except Exception as e:
+        logger.error(f"Error flushing vector database on shutdown: {e}")
+
+    smtp_pool.close()
+    await async_smtp_pool.close()
+    await http_clients.aclose()
+
     logger.info("Lifespan tasks cancelled on shutdown.")
 
 
@@ -0,0 +1,284 @@
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, List, Tuple
+
+from log import logger
+
+# Task ID of the queue task currently being processed, used to tag spans
+current_task_id = contextvars.ContextVar("current_task_id", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Tuple[str, ...], key: Tuple, extra: Dict = None) -> str:
+    pairs = list(zip(labelnames, key)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        """
+        A named metric with a fixed set of labels
+
+        Args:
+            name: Prometheus metric name
+            documentation: HELP text
+            labelnames: Names of the labels every sample carries
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        # Metrics are also updated from worker threads (asyncio.to_thread)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._functions = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def track(self, function: Callable[[], float], **labels):
+        """Read the gauge's value from function each time metrics are rendered"""
+        with self._lock:
+            self._functions[self._key(labels)] = function
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, function in functions.items():
+            try:
+                values[key] = function()
+            except Exception as e:
+                logger.warning(f"Failed to read gauge {self.name}{key}: {e}")
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        lines = []
+        for key, (counts, total, count) in sorted(values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, key, {"le": bound})
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = _format_labels(self.labelnames, key, {"le": "+Inf"})
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, max_spans: int = 500):
+        """
+        Process-wide metrics, rendered in the Prometheus text format
+
+        Args:
+            max_spans: Number of recent spans kept for inspection
+        """
+        self.metrics: Dict[str, Metric] = {}
+        self.recent_spans = deque(maxlen=max_spans)
+
+        self.span_seconds = self.histogram(
+            "joblm_span_seconds",
+            "Duration of calls to external services",
+            ("kind", "name"),
+        )
+        self.span_errors = self.counter(
+            "joblm_span_errors_total",
+            "Failed calls to external services",
+            ("kind", "name"),
+        )
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            return self.metrics[metric.name]
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets=buckets))
+
+    @contextmanager
+    def span(self, kind: str, name: str):
+        """
+        Time a call to an external service, tagged with the current task ID
+
+        Args:
+            kind: Kind of service (llm, appwrite, pinecone, scrape, smtp, ...)
+            name: Operation or model name
+        """
+        started_at = time.time()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            if not isinstance(e, asyncio.CancelledError):
+                error = e
+                self.span_errors.inc(kind=kind, name=name)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            self.span_seconds.observe(duration, kind=kind, name=name)
+            self.recent_spans.append(
+                {
+                    "kind": kind,
+                    "name": name,
+                    "task_id": current_task_id.get(),
+                    "started_at": started_at,
+                    "duration": round(duration, 6),
+                    "error": str(error) if error else None,
+                }
+            )
+
+    def traced(self, kind: str, name: str = None):
+        """Decorator timing every call of a sync or async function as a span"""
+
+        def decorator(fn):
+            span_name = name or fn.__name__
+            if asyncio.iscoroutinefunction(fn):
+
+                @wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(kind, span_name):
+                        return await fn(*args, **kwargs)
+
+                return async_wrapper
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(kind, span_name):
+                    return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+    def spans(self, task_id: str = None, limit: int = 100) -> List[Dict]:
+        """Most recent spans first, optionally only those of one task"""
+        spans = [
+            span
+            for span in reversed(self.recent_spans)
+            if task_id is None or span["task_id"] == task_id
+        ]
+        return spans[:limit]
+
+
+class TracedClient:
+    def __init__(self, client, kind: str):
+        """
+        Proxy timing every method call on a third-party client as a span
+
+        Args:
+            client: Client whose methods are traced
+            kind: Span kind of the service
+        """
+        self._client = client
+        self._kind = kind
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        if callable(value) and not attr.startswith("_"):
+            return metrics.traced(self._kind, attr)(value)
+        return value
+
+
+metrics = MetricsRegistry()
+
+queue_depth = metrics.gauge(
+    "joblm_queue_depth", "Tasks waiting in a queue", ("queue",)
+)
+queue_wait_seconds = metrics.histogram(
+    "joblm_queue_wait_seconds", "Time tasks spend waiting in a queue", ("queue",)
+)
+queue_processing_seconds = metrics.histogram(
+    "joblm_queue_processing_seconds", "Time spent processing a task or batch", ("queue",)
+)
+queue_batch_size = metrics.histogram(
+    "joblm_queue_batch_size", "Tasks handled per processing step", ("queue",), buckets=SIZE_BUCKETS
+)
+queue_tasks = metrics.counter(
+    "joblm_queue_tasks_total", "Tasks processed by a queue", ("queue", "status")
+)
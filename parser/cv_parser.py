@@ -35,17 +35,10 @@ from .prompt import (
     education_info_template,
 )
 from langchain_core.prompts import PromptTemplate
-from langchain_groq import ChatGroq
-
-llm = ChatGroq(
-    model="llama-3.2-90b-text-preview",
-    # model="mixtral-8x7b-32768",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    # other params...
-)
+from agent.llm import groq_llm
+
+# Cached per model and swapped for a fake or replayed model when LLM_MODE is set
+llm = groq_llm.get_client("llama-3.2-90b-text-preview")
 
 # set up parser
 parser = LlamaParse(result_type="markdown")  # "markdown" and "text" are available
@@ -4,14 +4,13 @@ from repository import repository
 # from pymongo import InsertOne, UpdateOne, DeleteOne
 from scrape.service import scrape_service
 from log import logger
-from asyncio import Queue
+from metrics import metrics
 
 
 class DBQueue(AsyncQueueAgent):
     def __init__(self, result_queue):
-        super().__init__()
         self.batch = 1000
-        self.queue = Queue(maxsize=self.batch)
+        super().__init__(maxsize=self.batch)
         self.result_queue = result_queue
 
     async def process_tasks(self):
@@ -28,7 +27,8 @@ class DBQueue(AsyncQueueAgent):
 
                 if len(tasks) == self.batch:
                     try:
-                        await self.handle_database_task(tasks)
+                        with self.track(self.batch_id(tasks), len(tasks)):
+                            await self.handle_database_task(tasks)
                         logger.info(f"Processed a batch of {self.batch} tasks.")
                     except Exception as e:
                         logger.error(f"Error processing batch of database tasks: {e}")
@@ -41,10 +41,10 @@ class DBQueue(AsyncQueueAgent):
             # Process any remaining tasks after the loop
             if tasks:
                 try:
-                    await self.handle_database_task(tasks)
+                    with self.track(self.batch_id(tasks), len(tasks)):
+                        await self.handle_database_task(tasks)
                     logger.info(f"Processed remaining batch of {len(tasks)} tasks.")
                 except Exception as e:
-                    print(e)
                     logger.error(f"Error processing remaining database tasks: {e}")
                 finally:
                     for _ in tasks:
@@ -53,6 +53,12 @@ class DBQueue(AsyncQueueAgent):
             # Clear the event after processing the tasks
             self.event.clear()
 
+    @staticmethod
+    def batch_id(tasks) -> str:
+        if len(tasks) == 1:
+            return tasks[0]["id"]
+        return f"{tasks[0]['id']}+{len(tasks) - 1}"
+
     async def handle_database_task(self, tasks):
         logger.info(f"Processing {len(tasks)} database tasks.")
 
@@ -91,11 +97,12 @@ class DBQueue(AsyncQueueAgent):
         for collection in db_tasks.values():
             if collection["operations"]:
                 try:
-                    await asyncio.to_thread(
-                        scrape_service.bulk_write,
-                        collection["name"],
-                        collection["operations"],
-                    )
+                    with metrics.span("appwrite", "bulk_write"):
+                        await asyncio.to_thread(
+                            scrape_service.bulk_write,
+                            collection["name"],
+                            collection["operations"],
+                        )
                     # await repository.bulk_write(
                     #     collection["name"], collection["operations"]
                     # )
@@ -1,8 +1,10 @@
+import time
 import asyncio
 from typing import List
 from .queue_agent import AsyncQueueAgent
-from utils.email_utils import send_job_email
-from agent.agent import user_chain, to_dict
+from utils.bulk_mailer import bulk_mailer, EMAIL_RESUME_INTERVAL
+from agent.agent import user_chain, user_info_prompt, to_dict, CHAIN_MODEL
+from agent.budget import token_budget
 from schemas.model import EmailModel
 from log import logger
 
@@ -11,11 +13,27 @@ class EmailQueue(AsyncQueueAgent):
     def __init__(self, result_queue):
         super().__init__()
         self.result_queue = result_queue
+        self._resumed_at = 0.0
+
+    async def resume(self):
+        """Retry the job emails left unsent by a previous run or a failed send"""
+        self._resumed_at = time.monotonic()
+        try:
+            await bulk_mailer.resume()
+        except Exception as e:
+            logger.error(f"Error resuming unsent emails: {e}")
 
     async def process_tasks(self):
+        # Finish emails a previous run left unsent
+        await self.resume()
+
         while True:
             logger.info("Email Queue is waiting for event...")
-            await self.event.wait()
+            try:
+                # Wake up when idle too, failed sends are retried below
+                await asyncio.wait_for(self.event.wait(), timeout=EMAIL_RESUME_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
             
             while not self.queue.empty():
                 try:
@@ -29,12 +47,13 @@ class EmailQueue(AsyncQueueAgent):
                         
                         logger.info(f"Processing email task: {operation_type}")
                         
-                        if operation_type == "user":
-                            await self.handle_new_user(data)
-                        elif operation_type == "scrape":
-                            await self.handle_scrape(data)
-                        else:
-                            logger.warning(f"Unknown operation type: {operation_type}")
+                        with self.track(email_task.get('id')):
+                            if operation_type == "user":
+                                await self.handle_new_user(data)
+                            elif operation_type == "scrape":
+                                await self.handle_scrape(data)
+                            else:
+                                logger.warning(f"Unknown operation type: {operation_type}")
                     else:
                         logger.error(f"Invalid email task format: {email_task}")
                     
@@ -44,6 +63,8 @@ class EmailQueue(AsyncQueueAgent):
                     self.queue.task_done()
             
             self.event.clear()
+            if time.monotonic() - self._resumed_at >= EMAIL_RESUME_INTERVAL:
+                await self.resume()
 
     async def handle_scrape(self, tasks: List[dict]):
         try:
@@ -59,15 +80,11 @@ class EmailQueue(AsyncQueueAgent):
             if not dt:
                 logger.warning("No data to process")
                 return
-            
-            # Get first (and only) item 
-            email = list(dt.keys())[0]
-            data = dt[email]
-            
-            logger.info(f"Sending job email to: {email}")
-            # print(data["job_list"])
-            await asyncio.to_thread(send_job_email, email, data["job_list"])
-            logger.info(f"Job email sent successfully to: {email}")
+
+            logger.info(f"Sending job emails to {len(dt)} recipients")
+            await bulk_mailer.send_batch(
+                [(email, data["job_list"]) for email, data in dt.items()]
+            )
 
         except Exception as e:
             logger.error(f"Error in handle_scrape: {str(e)}")
@@ -95,7 +112,13 @@ class EmailQueue(AsyncQueueAgent):
 
             # Process user data
             logger.info(f"Invoking user chain for: {user_data['email']}")
-            result = await asyncio.to_thread(user_chain.invoke, user_data)
+            result = await token_budget.ainvoke(
+                user_chain,
+                user_data,
+                fields=["cv_markdown"],
+                model_name=CHAIN_MODEL,
+                prompt=user_info_prompt,
+            )
             result_dict = to_dict(result)
 
             # Send email
@@ -1,4 +1,5 @@
 from .queue_agent import AsyncQueueAgent
+from log import logger
 
 
 class LogQueue(AsyncQueueAgent):
@@ -8,9 +9,10 @@ class LogQueue(AsyncQueueAgent):
 
     async def process_tasks(self):
         while True:
-            print("Log Queue is waiting for event...")
+            logger.info("Log Queue is waiting for event...")
             await self.event.wait()
             while not self.queue.empty():
+                # Log tasks are only drained, there is no handling to time
                 log_task = await self.queue.get()
                 self.queue.task_done()
             self.event.clear()
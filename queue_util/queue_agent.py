@@ -1,10 +1,45 @@
+import time
 import asyncio
+from collections import deque
+from contextlib import contextmanager
+
+from metrics import (
+    current_task_id,
+    queue_depth,
+    queue_wait_seconds,
+    queue_processing_seconds,
+    queue_batch_size,
+    queue_tasks,
+)
+
+
+class InstrumentedQueue(asyncio.Queue):
+    """asyncio.Queue recording how long each task waited before being taken"""
+
+    def __init__(self, name: str, maxsize: int = 0):
+        self.name = name
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self._enqueued_at = deque()
+
+    def _put(self, item):
+        self._enqueued_at.append(time.monotonic())
+        super()._put(item)
+
+    def _get(self):
+        waited = time.monotonic() - self._enqueued_at.popleft()
+        queue_wait_seconds.observe(waited, queue=self.name)
+        return super()._get()
 
 
 class AsyncQueueAgent:
-    def __init__(self):
-        self.queue = asyncio.Queue()
+    def __init__(self, maxsize: int = 0):
+        self.name = type(self).__name__
+        self.queue = InstrumentedQueue(self.name, maxsize)
         self.event = asyncio.Event()
+        queue_depth.track(self.queue.qsize, queue=self.name)
 
     async def enqueue_task(self, task):
         await self.queue.put(task)
@@ -13,6 +48,27 @@ class AsyncQueueAgent:
     async def process_tasks(self):
         raise NotImplementedError("Subclasses must implement process_tasks")
 
+    @contextmanager
+    def track(self, task_id=None, batch_size: int = 1):
+        """
+        Record processing time, batch size and outcome of one task or batch
+
+        Spans opened inside are tagged with task_id.
+        """
+        token = current_task_id.set(task_id)
+        start = time.perf_counter()
+        status = "ok"
+        queue_batch_size.observe(batch_size, queue=self.name)
+        try:
+            yield
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            queue_processing_seconds.observe(time.perf_counter() - start, queue=self.name)
+            queue_tasks.inc(batch_size, queue=self.name, status=status)
+            current_task_id.reset(token)
+
 
 
 
@@ -50,8 +50,8 @@ class ResultQueue(AsyncQueueAgent):
             while not self.queue.empty():
                 result_task = await self.queue.get()
                 try:
-                    logger.info(f"Processing task {result_task['id']} with data: {result_task['data']}")
-                    self.queue.task_done()
+                    with self.track(result_task['id']):
+                        logger.info(f"Processing task {result_task['id']} with data: {result_task['data']}")
                     tasks_processed += 1
                 except Exception as e:
                     logger.error(f"Error processing task {result_task['id']}: {e}")
@@ -4,6 +4,7 @@ from schemas.model import ScrapeModel, DBModel, EmailModel, ResultModel
 from jobspy import scrape_jobs
 from datetime import datetime
 from log import logger  # Import the configured logger
+from metrics import metrics
 
 
 class ScraperQueue(AsyncQueueAgent):
@@ -24,7 +25,8 @@ class ScraperQueue(AsyncQueueAgent):
                 scraper_task = await self.queue.get()
                 try:
                     logger.info(f"Processing scraping task: {scraper_task['id']}")
-                    await self.handle_scraping_task(scraper_task)
+                    with self.track(scraper_task['id']):
+                        await self.handle_scraping_task(scraper_task)
                     logger.info(f"Scraping task completed: {scraper_task['id']}")
                 except Exception as e:
                     logger.error(
@@ -54,7 +56,8 @@ class ScraperQueue(AsyncQueueAgent):
         # Scrape jobs in a non-blocking way
         jobs = None
         try:
-            jobs = await asyncio.to_thread(scrape_jobs, **task_parameters)
+            with metrics.span("scrape", "jobspy"):
+                jobs = await asyncio.to_thread(scrape_jobs, **task_parameters)
             logger.info(
                 f"Scraping completed with {len(jobs)} jobs found for search term: {task['search_term']}"
             )
@@ -25,7 +25,8 @@ class UserQueue(AsyncQueueAgent):
                 task = await self.queue.get()
                 try:
                     logger.info(f"Event received: {task}")  # Log when task is received
-                    await self.handle_parsing(task["task"]) 
+                    with self.track(task.get("id")):
+                        await self.handle_parsing(task["task"])
                 except Exception as e:
                     logger.error(
                         f"Error processing task {task}: {e}"
@@ -9,8 +9,15 @@ from .schema import Scholarship, ListScholar4Dev
 from dotenv import load_dotenv
 from pprint import pprint
 from log import logger
+from utils.http_client import http_clients
+from agent.budget import token_budget
+from agent.fake import run_structured, LLM_MODE
 load_dotenv()
 
+SCHOLAR_MODEL = "gemini-1.5-flash"
+# Offline modes never reach the model, so don't require its API key at import
+AGENT_MODEL = SCHOLAR_MODEL if LLM_MODE in ("live", "record") else None
+
 
 @dataclass
 class MyDeps:  
@@ -21,7 +28,7 @@ class MyDeps:
 scholarship_agent = Agent(
     retries=3,
     system_prompt=scholar_template,
-    model='gemini-1.5-flash',
+    model=AGENT_MODEL,
     result_type=Scholarship
     
 )
@@ -37,7 +44,7 @@ scholarship_agent = Agent(
 master_list_agent = Agent(
     retries=3,
     system_prompt=list_scholar_4_dev,
-    model="gemini-1.5-flash",
+    model=AGENT_MODEL,
     result_type=ListScholar4Dev,
     deps_type=MyDeps
     )
@@ -64,31 +71,41 @@ def to_dict(obj):
         else:
             return obj
 
+async def run_agent(agent: Agent, prompt: str, deps: MyDeps):
+    """Run a pydantic_ai agent against the live model and return its data"""
+    await asyncio.sleep(5)
+    result = await agent.run(user_prompt=prompt, deps=deps)
+    return result.data
+
+def fit_prompt(prompt: str, system_prompt: str) -> tuple[str, int]:
+    """Truncate a user prompt so it fits the scholarship model's token budget"""
+    fitted, prompt_tokens = token_budget.fit(
+        {"prompt": prompt}, ["prompt"], SCHOLAR_MODEL, system_prompt
+    )
+    return fitted["prompt"], prompt_tokens
+
 async def run_scholarship(prompt: str):
+    prompt, prompt_tokens = fit_prompt(prompt, scholar_template)
     max_retries = 3
     retry_delay = 5  # seconds
     
     for attempt in range(max_retries):
         try:
-            async with httpx.AsyncClient(
-                timeout=60.0,
-                follow_redirects=True,
-                verify=True,
-                http2=True,
-                transport=httpx.AsyncHTTPTransport(
-                    retries=2,  # Number of retries
-                    verify=True,
-                )
-            ) as client:
-                deps = MyDeps(http_client=client)
-                await asyncio.sleep(5)
-                result = await scholarship_agent.run(
-                    user_prompt=prompt,
-                    deps=deps,  
-                )
-
-                formatted_result = to_dict(result.data)
-                return formatted_result
+            deps = MyDeps(http_client=http_clients.get())
+            result = await run_structured(
+                "scholarship",
+                prompt,
+                Scholarship,
+                lambda: run_agent(scholarship_agent, prompt, deps),
+            )
+
+            token_budget.record(
+                SCHOLAR_MODEL,
+                prompt_tokens,
+                token_budget.count_result(result, SCHOLAR_MODEL),
+            )
+            formatted_result = to_dict(result)
+            return formatted_result
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 429:  # Too Many Requests
                 logger.warning(f"Rate limited on attempt {attempt + 1}. Waiting {retry_delay} seconds...")
@@ -111,30 +128,27 @@ async def run_scholarship(prompt: str):
 
 
 async def run_scholarship_list(prompt: str):
+    prompt, prompt_tokens = fit_prompt(prompt, list_scholar_4_dev)
     max_retries = 3
     retry_delay = 5  # seconds
     
     for attempt in range(max_retries):
         try:
-            async with httpx.AsyncClient(
-                timeout=60.0,
-                follow_redirects=True,
-                verify=True,
-                http2=True,
-                transport=httpx.AsyncHTTPTransport(
-                    retries=2,  # Number of retries
-                    verify=True,
-                )
-            ) as client:
-                deps = MyDeps(http_client=client)
-                await asyncio.sleep(5)
-                result = await master_list_agent.run(
-                    user_prompt=prompt,
-                    deps=deps,  
-                )
-
-                formatted_result = to_dict(result.data)
-                return formatted_result
+            deps = MyDeps(http_client=http_clients.get())
+            result = await run_structured(
+                "scholarship_list",
+                prompt,
+                ListScholar4Dev,
+                lambda: run_agent(master_list_agent, prompt, deps),
+            )
+
+            token_budget.record(
+                SCHOLAR_MODEL,
+                prompt_tokens,
+                token_budget.count_result(result, SCHOLAR_MODEL),
+            )
+            formatted_result = to_dict(result)
+            return formatted_result
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 429:  # Too Many Requests
                 logger.warning(f"Rate limited on attempt {attempt + 1}. Waiting {retry_delay} seconds...")
@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+from typing import Dict, Optional, Set
+
+from appwrite.query import Query
+
+from app_write import AppwriteClient
+from log import logger
+
+
+class DedupIndex:
+    def __init__(self, client: AppwriteClient = None, page_size: int = 100):
+        """
+        content_hash values of the saved scholarships, per collection, loaded once per run
+
+        A hash in the index is known for sure. A miss is confirmed with
+        Appwrite, in case another process saved it after the index loaded.
+        If a collection cannot be loaded, every check goes to Appwrite.
+
+        Args:
+            client: Appwrite client (default: created on first use)
+            page_size: Documents fetched per page while loading
+        """
+        self._client = client
+        self.page_size = page_size
+        self.hits = 0
+        self.misses = 0
+        self._hashes: Dict[str, Optional[Set[str]]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    @property
+    def client(self) -> AppwriteClient:
+        if self._client is None:
+            self._client = AppwriteClient()
+        return self._client
+
+    @staticmethod
+    def content_hash(scholarship: dict) -> str:
+        text = f"{scholarship.get('title', '')}{scholarship.get('link', '')}"
+        return hashlib.md5(text.encode()).hexdigest()
+
+    async def _load(self, collection_id: str) -> Optional[Set[str]]:
+        hashes = set()
+        cursor = None
+        try:
+            while True:
+                queries = [Query.select(["$id", "content_hash"]), Query.limit(self.page_size)]
+                if cursor:
+                    queries.append(Query.cursor_after(cursor))
+                result = await self.client.list_documents(collection_id=collection_id, queries=queries)
+                documents = result.get("documents", [])
+                hashes.update(doc["content_hash"] for doc in documents if doc.get("content_hash"))
+                if len(documents) < self.page_size:
+                    break
+                cursor = documents[-1]["$id"]
+        except Exception as e:
+            logger.error(f"Error loading the {collection_id} dedup index, checking each item instead: {e}")
+            return None
+        logger.info(f"Loaded {len(hashes)} {collection_id} hashes into the dedup index")
+        return hashes
+
+    async def _index(self, collection_id: str) -> Optional[Set[str]]:
+        if collection_id not in self._hashes:
+            lock = self._locks.setdefault(collection_id, asyncio.Lock())
+            async with lock:
+                if collection_id not in self._hashes:
+                    self._hashes[collection_id] = await self._load(collection_id)
+        return self._hashes[collection_id]
+
+    async def _saved(self, collection_id: str, content_hash: str) -> bool:
+        result = await self.client.list_documents(
+            collection_id=collection_id,
+            queries=[Query.equal("content_hash", content_hash), Query.limit(1)],
+        )
+        return len(result.get("documents", [])) > 0
+
+    async def is_new(self, collection_id: str, scholarship: dict) -> bool:
+        """Whether no scholarship with the same title and link is saved in the collection"""
+        content_hash = self.content_hash(scholarship)
+        hashes = await self._index(collection_id)
+        if hashes is not None and content_hash in hashes:
+            self.hits += 1
+            return False
+        self.misses += 1
+        if await self._saved(collection_id, content_hash):
+            if hashes is not None:
+                hashes.add(content_hash)
+            return False
+        return True
+
+    def add(self, collection_id: str, content_hash: str):
+        """Record a saved scholarship"""
+        hashes = self._hashes.get(collection_id)
+        if hashes is not None:
+            hashes.add(content_hash)
+
+    def clear(self):
+        """Forget the loaded hashes, the next run loads them again"""
+        self._hashes.clear()
+        self._locks.clear()
+
+
+dedup_index = DedupIndex()
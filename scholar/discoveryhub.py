@@ -19,7 +19,7 @@ class DiscoveryHubScraper(ScholarshipScraper):
                 link = li.find("a")
                 if title and link:
                     # Convert HTML to markdown and clean
-                    content = self.to_md(str(li))
+                    content = self.to_md(li)
                     # First remove unwanted sections
                     content = self.remove_string(content)
                     # Then clean up formatting
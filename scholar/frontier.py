@@ -0,0 +1,141 @@
+import os
+import json
+import math
+import time
+import sqlite3
+import threading
+from typing import List, Set
+
+from dotenv import load_dotenv
+
+from log import logger
+from config import state_path
+
+load_dotenv()
+
+CRAWL_FRONTIER_PATH = os.getenv("CRAWL_FRONTIER_PATH") or state_path("crawl_frontier.sqlite3")
+CRAWL_INCREMENTAL = os.getenv("CRAWL_INCREMENTAL", "true").lower() == "true"
+CRAWL_MIN_PAGES = int(os.getenv("CRAWL_MIN_PAGES", "1"))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "6"))
+
+
+class CrawlFrontier:
+    def __init__(
+        self,
+        path: str = CRAWL_FRONTIER_PATH,
+        min_pages: int = CRAWL_MIN_PAGES,
+        max_pages: int = CRAWL_MAX_PAGES,
+        max_marks: int = 200,
+        history: int = 7,
+    ):
+        """
+        Per-source high-water marks of an incremental crawl, persisted in SQLite
+
+        A source's marks are the keys (link, or title) of the newest items
+        already crawled. A crawl walks the listing newest-first and stops
+        paginating at the first page holding a marked item. The page budget
+        follows how many new items the source produced in its recent runs.
+
+        Args:
+            path: SQLite database file
+            min_pages: Fewest pages a crawl may walk
+            max_pages: Most pages a crawl may walk
+            max_marks: Newest item keys kept per source
+            history: Runs whose new item counts set the page budget
+        """
+        self.path = path
+        self.min_pages = min_pages
+        self.max_pages = max_pages
+        self.max_marks = max_marks
+        self.history = history
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sources (
+                    source TEXT PRIMARY KEY,
+                    marks TEXT NOT NULL,
+                    new_counts TEXT NOT NULL,
+                    page_size REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+        return self._conn
+
+    @staticmethod
+    def item_key(item: dict) -> str:
+        return item.get("link") or item.get("title") or ""
+
+    def _row(self, source: str):
+        with self._lock:
+            return self.conn.execute(
+                "SELECT marks, new_counts, page_size FROM sources WHERE source = ?", (source,)
+            ).fetchone()
+
+    def marks(self, source: str) -> Set[str]:
+        """Keys of the newest items already crawled from source"""
+        row = self._row(source)
+        return set(json.loads(row[0])) if row else set()
+
+    def page_budget(self, source: str, default: int) -> int:
+        """
+        Pages to walk at most for source
+
+        Enough pages to hold the most new items of the recent runs, plus one.
+        A source never crawled before gets the default.
+        """
+        row = self._row(source)
+        if row is None:
+            return default
+        new_counts, page_size = json.loads(row[1]), row[2]
+        if not new_counts or page_size <= 0:
+            return default
+        budget = math.ceil(max(new_counts) / page_size) + 1
+        return max(self.min_pages, min(self.max_pages, budget))
+
+    def record(self, source: str, new_keys: List[str], page_size: float, advance: bool = True):
+        """
+        Record a finished crawl of source
+
+        Args:
+            source: Source crawled
+            new_keys: Keys of the new items found, newest first
+            page_size: Items per listing page seen in this crawl
+            advance: Whether to add new_keys to the marks. Leave them out when
+                some items failed, so the next crawl walks past them again
+        """
+        row = self._row(source)
+        marks, new_counts, old_page_size = (
+            (json.loads(row[0]), json.loads(row[1]), row[2]) if row else ([], [], 0.0)
+        )
+        if advance:
+            marks = list(dict.fromkeys([*new_keys, *marks]))[: self.max_marks]
+        new_counts = [*new_counts, len(new_keys)][-self.history :]
+        page_size = page_size or old_page_size
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sources (source, marks, new_counts, page_size, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (source, json.dumps(marks), json.dumps(new_counts), page_size, time.time()),
+            )
+            self.conn.commit()
+        logger.info(f"Crawl of {source}: {len(new_keys)} new items, recent runs {new_counts}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+crawl_frontier = CrawlFrontier()
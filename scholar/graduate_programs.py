@@ -1,7 +1,8 @@
 from .discoveryhub import DiscoveryHubScraper
 from app_write import AppwriteClient
+from .dedup import dedup_index
+from log import logger
 import hashlib
-from appwrite.query import Query
 
 db = AppwriteClient()
 
@@ -12,21 +13,9 @@ class GraduateScraper(DiscoveryHubScraper):
         self.base_url = "https://dixcoverhub.com.ng/category/graduate-programs/"
 
     async def is_new_scholarship(self, scholarship_text: dict) -> bool:
-        
-        """Check if a scholarship is new by looking up its hash in Appwrite"""
+        """Check if a scholarship is new against the dedup index of saved internships"""
         try:
-            title = scholarship_text.get("title", "")
-            link = scholarship_text.get("link", "")
-            text = f"{title}{link}"
-            content_hash = hashlib.md5(text.encode()).hexdigest()
-            
-            result = await db.list_documents(
-                collection_id="internships",
-                queries=[Query.equal("content_hash", content_hash)]
-            )
-            
-            # If no documents match the hash, the scholarship is new.
-            return len(result.get("documents", [])) == 0
+            return await dedup_index.is_new("internships", scholarship_text)
         except Exception as e:
             logger.error(f"Error checking scholarship history: {str(e)}")
             return True
@@ -52,9 +41,10 @@ class GraduateScraper(DiscoveryHubScraper):
                 document_id=self.generate_scholarship_id(scholarship_text),
                 data=document_data
             )
-            print(f"Saved scholarship: {title}")
+            dedup_index.add("internships", content_hash)
+            logger.info(f"Saved scholarship: {title}")
         except Exception as e:
-            print(f"Error saving scholarship: {str(e)}")
+            logger.error(f"Error saving scholarship: {str(e)}")
 
 class InternshipScraper(GraduateScraper):
     def __init__(self):
@@ -1,73 +1,63 @@
 from typing import Dict
-import urllib.parse
+from functools import lru_cache
+import os
 import random
 
-def get_share_buttons(title: str, url: str, type="scholarship") -> str:
-    """Generate HTML for social sharing buttons."""
-    # URL encode the title and URL for sharing
-    encoded_title = urllib.parse.quote(title)
-    encoded_url = urllib.parse.quote(url)
-    
-    return f"""
+from utils.templates import Fragment, compile_template
+
+# Also copy stylesheet rules into style attributes, for clients that drop <style>
+INLINE_CSS = os.getenv("EMAIL_INLINE_CSS", "false").lower() == "true"
+
+SHARE_BUTTONS = Fragment("""
     <div class="share-buttons">
         <span class="share-text">Share this {type}:</span>
-        <a href="https://twitter.com/intent/tweet?text={encoded_title}&url={encoded_url}" 
+        <a href="https://twitter.com/intent/tweet?text={title|quote}&url={url|quote}"
            class="share-button twitter" target="_blank" rel="noopener">
             <img src="https://cdn-icons-png.flaticon.com/512/733/733579.png" alt="Twitter" />
         </a>
-        <a href="https://www.facebook.com/sharer/sharer.php?u={encoded_url}" 
+        <a href="https://www.facebook.com/sharer/sharer.php?u={url|quote}"
            class="share-button facebook" target="_blank" rel="noopener">
             <img src="https://cdn-icons-png.flaticon.com/512/733/733547.png" alt="Facebook" />
         </a>
-        <a href="https://www.linkedin.com/shareArticle?mini=true&url={encoded_url}&title={encoded_title}" 
+        <a href="https://www.linkedin.com/shareArticle?mini=true&url={url|quote}&title={title|quote}"
            class="share-button linkedin" target="_blank" rel="noopener">
             <img src="https://cdn-icons-png.flaticon.com/512/733/733561.png" alt="LinkedIn" />
         </a>
-        <a href="https://api.whatsapp.com/send?text={encoded_title}%20{encoded_url}" 
+        <a href="https://api.whatsapp.com/send?text={title|quote}%20{url|quote}"
            class="share-button whatsapp" target="_blank" rel="noopener">
             <img src="https://cdn-icons-png.flaticon.com/512/733/733585.png" alt="WhatsApp" />
         </a>
     </div>
-    """
+    """)
 
-def get_scholarship_template(scholarship: Dict[str, str]) -> str:
-    """Generate HTML email template for a scholarship."""
-    
-    template = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>{scholarship['title']}</title>
-        <style>
-            body {{
+SCHOLARSHIP_CSS = """
+            body {
                 font-family: Arial, sans-serif;
                 line-height: 1.6;
                 color: #333;
                 max-width: 800px;
                 margin: 0 auto;
                 padding: 20px;
-            }}
-            .scholarship-card {{
+            }
+            .scholarship-card {
                 background: #ffffff;
                 border: 1px solid #e0e0e0;
                 border-radius: 8px;
                 padding: 25px;
                 margin-bottom: 20px;
                 box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            }}
-            .scholarship-title {{
+            }
+            .scholarship-title {
                 color: #1a73e8;
                 font-size: 24px;
                 margin-bottom: 15px;
                 font-weight: bold;
-            }}
-            .content {{
+            }
+            .content {
                 margin: 20px 0;
                 white-space: pre-line;
-            }}
-            .button {{
+            }
+            .button {
                 display: inline-block;
                 padding: 12px 24px;
                 margin: 10px 10px 10px 0;
@@ -75,116 +65,90 @@ def get_scholarship_template(scholarship: Dict[str, str]) -> str:
                 text-decoration: none;
                 font-weight: bold;
                 text-align: center;
-            }}
-            .apply-button {{
+            }
+            .apply-button {
                 background-color: #1a73e8;
                 color: white;
-            }}
-            .read-more-button {{
+            }
+            .read-more-button {
                 background-color: #f8f9fa;
                 color: #1a73e8;
                 border: 1px solid #1a73e8;
-            }}
-            .button:hover {{
+            }
+            .button:hover {
                 opacity: 0.9;
-            }}
-            .share-buttons {{
+            }
+            .share-buttons {
                 margin: 20px 0;
                 padding: 15px;
                 background: #f8f9fa;
                 border-radius: 4px;
                 text-align: center;
-            }}
-            .share-text {{
+            }
+            .share-text {
                 display: block;
                 margin-bottom: 10px;
                 color: #666;
                 font-size: 14px;
-            }}
-            .share-button {{
+            }
+            .share-button {
                 display: inline-block;
                 margin: 0 5px;
                 padding: 5px;
-            }}
-            .share-button img {{
+            }
+            .share-button img {
                 width: 24px;
                 height: 24px;
                 vertical-align: middle;
-            }}
-            .footer {{
+            }
+            .footer {
                 margin-top: 20px;
                 padding-top: 20px;
                 border-top: 1px solid #e0e0e0;
                 font-size: 12px;
                 color: #666;
-            }}
-        </style>
+            }"""
+
+SCHOLARSHIP_DOCUMENT = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>{title}</title>
+        {styles}
     </head>
-    <body>
-        <div class="scholarship-card">
-            <h1 class="scholarship-title">{scholarship['title']}</h1>
-            
-            <div class="content">
-                {scholarship['content']}
-            </div>
-            
-            <div class="buttons">
-                <a href="{scholarship['application_link']}" class="button apply-button" target="_blank">
-                    Apply Now
-                </a>
-                <a href="{scholarship['link']}" class="button read-more-button" target="_blank">
-                    Read More
-                </a>
-            </div>
-            
-            {get_share_buttons(scholarship['title'], scholarship['link'])}
-            
-            <div class="footer">
-                <p>This scholarship information was sent to you by SolveByte. If you no longer wish to receive these emails, please unsubscribe.</p>
-            </div>
-        </div>
+    <body>{items}
     </body>
     </html>
     """
-    
-    return template
 
-def get_multiple_scholarships_template(scholarships: list[Dict[str, str]], type="scholarship") -> str:
-
-    """Generate HTML email template for multiple scholarships."""
-    
-    scholarships_html = ""
-    for scholarship in scholarships:
-        scholarships_html += f"""
+SCHOLARSHIP_ITEM = """
         <div class="scholarship-card">
-            <h2 class="scholarship-title">{scholarship['title']}</h2>
-            
+            <h1 class="scholarship-title">{title}</h1>
+
             <div class="content">
-                {scholarship['content']}
+                {content}
             </div>
-            
+
             <div class="buttons">
-                <a href="{scholarship['application_link']}" class="button apply-button" target="_blank">
+                <a href="{application_link}" class="button apply-button" target="_blank">
                     Apply Now
                 </a>
-                <a href="{scholarship['link']}" class="button read-more-button" target="_blank">
+                <a href="{link}" class="button read-more-button" target="_blank">
                     Read More
                 </a>
             </div>
-            
-            {get_share_buttons(scholarship['title'], scholarship['link'], type=type)}
-        </div>
-        """
-    
-    template = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Latest {type.upper()}</title>
-        <style>
-            body {{
+
+            {share_buttons}
+
+            <div class="footer">
+                <p>This scholarship information was sent to you by SolveByte. If you no longer wish to receive these emails, please unsubscribe.</p>
+            </div>
+        </div>"""
+
+DIGEST_CSS = """
+            body {
                 font-family: Arial, sans-serif;
                 line-height: 1.6;
                 color: #333;
@@ -192,26 +156,26 @@ def get_multiple_scholarships_template(scholarships: list[Dict[str, str]], type=
                 margin: 0 auto;
                 padding: 20px;
                 background-color: #f5f5f5;
-            }}
-            .scholarship-card {{
+            }
+            .scholarship-card {
                 background: #ffffff;
                 border: 1px solid #e0e0e0;
                 border-radius: 8px;
                 padding: 25px;
                 margin-bottom: 20px;
                 box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            }}
-            .scholarship-title {{
+            }
+            .scholarship-title {
                 color: #1a73e8;
                 font-size: 20px;
                 margin-bottom: 15px;
                 font-weight: bold;
-            }}
-            .content {{
+            }
+            .content {
                 margin: 20px 0;
                 white-space: pre-line;
-            }}
-            .button {{
+            }
+            .button {
                 display: inline-block;
                 padding: 10px 20px;
                 margin: 10px 10px 10px 0;
@@ -219,65 +183,123 @@ def get_multiple_scholarships_template(scholarships: list[Dict[str, str]], type=
                 text-decoration: none;
                 font-weight: bold;
                 text-align: center;
-            }}
-            .apply-button {{
+            }
+            .apply-button {
                 background-color: #1a73e8;
                 color: white;
-            }}
-            .read-more-button {{
+            }
+            .read-more-button {
                 background-color: #f8f9fa;
                 color: #1a73e8;
                 border: 1px solid #1a73e8;
-            }}
-            .button:hover {{
+            }
+            .button:hover {
                 opacity: 0.9;
-            }}
-            .share-buttons {{
+            }
+            .share-buttons {
                 margin: 20px 0;
                 padding: 15px;
                 background: #f8f9fa;
                 border-radius: 4px;
                 text-align: center;
-            }}
-            .share-text {{
+            }
+            .share-text {
                 display: block;
                 margin-bottom: 10px;
                 color: #666;
                 font-size: 14px;
-            }}
-            .share-button {{
+            }
+            .share-button {
                 display: inline-block;
                 margin: 0 5px;
                 padding: 5px;
-            }}
-            .share-button img {{
+            }
+            .share-button img {
                 width: 24px;
                 height: 24px;
                 vertical-align: middle;
-            }}
-            .footer {{
+            }
+            .footer {
                 margin-top: 20px;
                 padding-top: 20px;
                 border-top: 1px solid #e0e0e0;
                 font-size: 12px;
                 color: #666;
                 text-align: center;
-            }}
-        </style>
+            }"""
+
+DIGEST_DOCUMENT = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Latest {type_upper}</title>
+        {styles}
     </head>
     <body>
-        <h1 style="text-align: center; color: #1a73e8; margin-bottom: 30px;">Latest {type.upper()} Opportunities</h1>
-        
-        {scholarships_html}
-        
+        <h1 style="text-align: center; color: #1a73e8; margin-bottom: 30px;">Latest {type_upper} Opportunities</h1>
+        {items}
         <div class="footer">
             <p>These {type} opportunities were sent to you by SolveByte. If you no longer wish to receive these emails, please unsubscribe.</p>
         </div>
     </body>
     </html>
     """
-    
-    return template
+
+DIGEST_ITEM = """
+        <div class="scholarship-card">
+            <h2 class="scholarship-title">{title}</h2>
+
+            <div class="content">
+                {content}
+            </div>
+
+            <div class="buttons">
+                <a href="{application_link}" class="button apply-button" target="_blank">
+                    Apply Now
+                </a>
+                <a href="{link}" class="button read-more-button" target="_blank">
+                    Read More
+                </a>
+            </div>
+
+            {share_buttons}
+        </div>
+        """
+
+
+@lru_cache(maxsize=1024)
+def get_share_buttons(title: str, url: str, type="scholarship") -> str:
+    """Generate HTML for social sharing buttons."""
+    return SHARE_BUTTONS.render({"type": type, "title": title, "url": url})
+
+
+def _card(scholarship: Dict[str, str], type: str) -> Dict[str, str]:
+    return {
+        "title": scholarship["title"],
+        "content": scholarship["content"],
+        "application_link": scholarship["application_link"],
+        "link": scholarship["link"],
+        "share_buttons": get_share_buttons(scholarship["title"], scholarship["link"], type=type),
+    }
+
+
+def get_scholarship_template(scholarship: Dict[str, str]) -> str:
+    """Generate HTML email template for a scholarship."""
+    template = compile_template(SCHOLARSHIP_DOCUMENT, SCHOLARSHIP_ITEM, SCHOLARSHIP_CSS, INLINE_CSS)
+    return template.render([_card(scholarship, "scholarship")], title=scholarship["title"])
+
+
+def get_multiple_scholarships_template(scholarships: list[Dict[str, str]], type="scholarship") -> str:
+    """Generate HTML email template for multiple scholarships."""
+    template = compile_template(DIGEST_DOCUMENT, DIGEST_ITEM, DIGEST_CSS, INLINE_CSS)
+    return template.render(
+        (_card(scholarship, type) for scholarship in scholarships),
+        type=type,
+        type_upper=type.upper(),
+    )
+
 
 def get_scholarship_subject(count):
     """Generate a random, engaging subject line for scholarship notifications"""
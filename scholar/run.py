@@ -10,7 +10,9 @@ from .mailer import (
     get_scholarship_subject, 
     get_internship_subject
 )
-from utils.email_utils import send_email
+from utils.bulk_mailer import bulk_mailer
+from utils.html_parse import page_cache
+from .dedup import dedup_index
 from app_write import AppwriteClient
 from log import logger
 
@@ -18,10 +20,17 @@ from dotenv import load_dotenv
 from time import sleep
 load_dotenv()
 
-to_bcc = os.getenv("TO_BCC", "").split(",")
+# Digest subscribers, each sent an individual copy (TO_BCC is the old name)
+subscribers = os.getenv("SCHOLARSHIP_SUBSCRIBERS", os.getenv("TO_BCC", "")).split(",")
 # Remove any empty strings and strip whitespace
-to_bcc = [email.strip() for email in to_bcc if email.strip()]
-# print(to_bcc)
+subscribers = [email.strip() for email in subscribers if email.strip()]
+# Address that used to be the visible To of the Bcc digest, optional
+digest_to_email = os.getenv("DIGEST_TO_EMAIL", "").strip()
+
+
+def digest_recipients():
+    """DIGEST_TO_EMAIL, if set, and the subscribers"""
+    return [email for email in (digest_to_email, *subscribers) if email]
 
 
 __all__ = [
@@ -89,14 +98,13 @@ async def check_new_scholarships():
         if len(scholarships) > 10:
             scholarships = scholarships[:10]
         logger.info(f"Found {len(scholarships)} scholarships")
+        recipients = digest_recipients()
+        if not recipients:
+            logger.warning("No digest recipients, set DIGEST_TO_EMAIL or SCHOLARSHIP_SUBSCRIBERS")
+            return
         template = get_multiple_scholarships_template(scholarships)
         subject = get_scholarship_subject(len(scholarships))
-        send_email(
-            to_email="ecorporation903@gmail.com",
-            subject=subject,
-            content=template,
-            recipients=to_bcc
-        )
+        await bulk_mailer.send_digest(recipients, subject, template)
         logger.info(f"Final batch: Email sent with {len(scholarships)} scholarships")
 
 async def check_new_intership():
@@ -116,18 +124,22 @@ async def check_new_intership():
             internships = internships[:10]
 
         logger.info(f"Found {len(internships)} internships")
+        recipients = digest_recipients()
+        if not recipients:
+            logger.warning("No digest recipients, set DIGEST_TO_EMAIL or SCHOLARSHIP_SUBSCRIBERS")
+            return
         template = get_multiple_scholarships_template(internships, type="internship")
         subject = get_internship_subject(len(internships))
-        send_email(
-            to_email="ecorporation903@gmail.com",
-            subject=subject,
-            content=template,
-            recipients=to_bcc
-        )
+        await bulk_mailer.send_digest(recipients, subject, template)
         logger.info(f"Final batch: Email sent with {len(internships)} internships")
 
 async def start_checking_new_offer():
-    await asyncio.gather(
-        check_new_scholarships(),
-        check_new_intership()
-    )
\ No newline at end of file
+    try:
+        await asyncio.gather(
+            check_new_scholarships(),
+            check_new_intership()
+        )
+    finally:
+        # Parsed pages and saved hashes are only shared within a run
+        page_cache.clear()
+        dedup_index.clear()
\ No newline at end of file
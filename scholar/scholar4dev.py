@@ -2,9 +2,12 @@ import pprint
 
 from sqlalchemy.sql.ddl import exc
 from .scraper import ScholarshipScraper
-from .agent import run_scholarship, run_scholarship_list
-from markdownify import markdownify as md
+from .agent import run_scholarship, run_scholarship_list, SCHOLAR_MODEL
+from .prompt import list_scholar_4_dev
+from agent.budget import token_budget
+from log import logger
 from bs4 import BeautifulSoup
+from utils.html_parse import page_cache
 from pprint import pprint
 
 
@@ -18,23 +21,34 @@ class Scholarship4Dev(ScholarshipScraper):
         # if isinstance(html_content, BeautifulSoup):
         main_div = html_content.find_all('div', class_=class_name)
         if main_div:
-            html_content = str(main_div)
-            content = md(html_content)
+            content = self.to_md(main_div)
             return self.clean_content(content)
         return ""
 
+    def to_markdown_chunks(self, html_content: BeautifulSoup, class_name="post clearfix"):
+        """Convert each listing to markdown and pack them into budget-sized chunks"""
+        entries = []
+        for div in html_content.find_all('div', class_=class_name):
+            content = self.clean_content(self.to_md(div))
+            if content:
+                entries.append(content)
+        # Leave room for the system prompt, so fit_prompt never cuts listings off
+        return token_budget.pack(entries, SCHOLAR_MODEL, prompt=list_scholar_4_dev)
+
     async def parse_scholarship_list_llm(self, soup):
-        scholarship = self.to_markdown(soup)
-        if not scholarship:
-            return []
-        try:
-            processed_content = await run_scholarship_list(scholarship)
-            if not processed_content or not isinstance(processed_content, dict):
-                return []
-            return processed_content.get("scholarships", [])
-        except Exception as e:
-            print(f"Error processing scholarship list: {str(e)}")
+        chunks = self.to_markdown_chunks(soup)
+        if not chunks:
             return []
+        scholarships = []
+        for chunk in chunks:
+            try:
+                processed_content = await run_scholarship_list(chunk)
+                if not processed_content or not isinstance(processed_content, dict):
+                    continue
+                scholarships.extend(processed_content.get("scholarships", []))
+            except Exception as e:
+                logger.error(f"Error processing scholarship list: {str(e)}")
+        return scholarships
             
 
     async def parse_scholarship(self, soup):
@@ -50,12 +64,16 @@ class Scholarship4Dev(ScholarshipScraper):
             url = scholarship.get("link", "")
             if not url:
                 continue
+            if self.is_known(scholarship):
+                # Already crawled, the listing is older from here on
+                self.reached_known = True
+                break
             
             client = await self.client
             try:
                 response = await client.get(url)
                 html_content = response.text
-                soup = BeautifulSoup(html_content, 'html.parser')
+                soup = page_cache.parse(url, html_content).soup
                 
                 content = self.to_markdown(soup, class_name="entry clearfix")
                 if not content:
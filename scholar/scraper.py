@@ -1,15 +1,18 @@
 import hashlib
 import asyncio
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 
 from log import logger
+from metrics import metrics
+from utils.http_client import http_clients
 from .agent import run_scholarship
 from app_write import AppwriteClient
-from appwrite.query import Query
 
 import httpx
-from bs4 import BeautifulSoup
-from markdownify import markdownify as md
+from utils.html_parse import page_cache, to_markdown
+from utils.http_cache import http_cache
+from .frontier import crawl_frontier, CRAWL_INCREMENTAL
+from .dedup import dedup_index
 
 from dotenv import load_dotenv
 import os
@@ -18,58 +21,37 @@ load_dotenv()
 
 PROXY_URL = os.getenv("PROXY_URL")
 
+# Returned by get_page for a page unchanged since it was last processed
+PAGE_UNCHANGED = object()
+
 db = AppwriteClient()
 
 class ScholarshipScraper:
     def __init__(self):
         self.base_url = "https://dixcoverhub.com.ng/category/scholarship"
-        self._client = None
         self._semaphore = asyncio.Semaphore(3)  # Limit to 3 concurrent requests
         self._last_request_time = 0
         self.request_interval = 1/3  # 3 requests per second
+        # Listing pages already processed are skipped until they change
+        self.cache_scope = type(self).__name__
+        # Items already crawled, while an incremental crawl runs
+        self._known = set()
+        # Set by parse_scholarship when it stops at an item already crawled
+        self.reached_known = False
 
 
     @property
     async def client(self):
-        """Lazy initialize the httpx client"""
-        if self._client is None:
-            # Update proxy configuration to use the correct format for httpx
-            # The format is {"http://": proxy_url, "https://": proxy_url}
-            if PROXY_URL:
-                proxy_config = {
-                    "http://": PROXY_URL,
-                    "https://": PROXY_URL
-                }
-            else:
-                proxy_config = None
-                
-            self._client = httpx.AsyncClient(
-                timeout=60.0,  # Increased timeout
-                follow_redirects=True,  # Handle redirects automatically
-                verify=True,  # Verify SSL certificates
-                http2=True,  # Enable HTTP/2 support
-                proxies=proxy_config,
-                limits=httpx.Limits(
-                    max_keepalive_connections=5,
-                    max_connections=10,
-                    keepalive_expiry=30.0,
-                ),
-                # Add retry mechanism
-                transport=httpx.AsyncHTTPTransport(
-                    retries=3,  # Number of retries
-                    verify=True,
-                )
-            )
-        return self._client
+        """Shared pooled client for the scholarship site, through the proxy if set"""
+        return http_clients.get(self.base_url, proxy=PROXY_URL or None)
 
     async def __aenter__(self):
         await self.client
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self._client is not None:
-            await self._client.aclose()
-            self._client = None
+        # The client is shared and closed at shutdown
+        pass
 
     async def _throttle(self):
         """Ensure requests are throttled to avoid rate limiting"""
@@ -82,34 +64,27 @@ class ScholarshipScraper:
         self._last_request_time = asyncio.get_event_loop().time()
 
     async def is_new_scholarship(self, scholarship_text: dict) -> bool:
-    
-        """Check if a scholarship is new by looking up its hash in Appwrite"""
+        """Check if a scholarship is new against the dedup index of saved scholarships"""
         try:
-            title = scholarship_text.get("title", "")
-            link = scholarship_text.get("link", "")
-            text = f"{title}{link}"
-            content_hash = hashlib.md5(text.encode()).hexdigest()
-            
-            result = await db.list_documents(
-                collection_id="scholarships",
-                queries=[Query.equal("content_hash", content_hash)]
-            )
-
-            print(result)
-            
-            # If no documents match the hash, the scholarship is new.
-            return len(result.get("documents", [])) == 0
+            return await dedup_index.is_new("scholarships", scholarship_text)
         except Exception as e:
             logger.error(f"Error checking scholarship history: {str(e)}")
             return True
 
-    async def get_page(self, page=1):
-        """Fetch a specific page of scholarships with rate limiting using a proxy"""
+    def page_url(self, page=1):
         # Properly construct the URL using urljoin
         if page == 1:
-            url = self.base_url
-        else:
-            url = urljoin(self.base_url, f"page/{page}/")
+            return self.base_url
+        return urljoin(self.base_url, f"page/{page}/")
+
+    async def get_page(self, page=1):
+        """
+        Fetch a specific page of scholarships with rate limiting using a proxy
+
+        Returns PAGE_UNCHANGED if the page is unchanged since it was last
+        processed, None if it could not be fetched
+        """
+        url = self.page_url(page)
 
         max_retries = 3
         retry_delay = 5  # seconds
@@ -121,8 +96,13 @@ class ScholarshipScraper:
                     logger.info(f"Fetching page {page} via proxy: {url} (Attempt {attempt + 1}/{max_retries})")
 
                     client = await self.client
-                    response = await client.get(url)
-                    response.raise_for_status()
+                    with metrics.span("scrape", urlparse(url).netloc):
+                        response = await client.get(url, headers=http_cache.headers(self.cache_scope, url))
+                    if response.status_code != 304:  # Not Modified
+                        response.raise_for_status()
+                    if http_cache.unchanged(self.cache_scope, url, response):
+                        logger.info(f"Page {page} unchanged since the last run, skipping")
+                        return PAGE_UNCHANGED
                     
                     logger.info(f"Successfully fetched page {page}")
                     return response.text
@@ -172,6 +152,7 @@ class ScholarshipScraper:
                 document_id=self.generate_scholarship_id(scholarship_text),
                 data=document_data
             )
+            dedup_index.add("scholarships", content_hash)
             logger.info(f"Saved scholarship: {title}")
         except Exception as e:
             logger.error(f"Error saving scholarship: {str(e)}")
@@ -192,7 +173,8 @@ class ScholarshipScraper:
         raise NotImplementedError("Subclasses must implement parse_scholarship")
          
     def to_md(self, html_content):
-        return md(html_content)
+        """Markdown of a parsed element (or list of elements), or of an HTML string"""
+        return to_markdown(html_content)
 
     def clean_content(self, content: str) -> str:
         """Clean the scholarship content by removing extra whitespace and formatting"""
@@ -221,34 +203,114 @@ class ScholarshipScraper:
         
         return cleaned_content
 
-    async def check_new_scholarships(self, max_pages=3):
+    def is_known(self, scholarship: dict) -> bool:
+        """Whether an incremental crawl already went past this scholarship"""
+        return crawl_frontier.item_key(scholarship) in self._known
+
+    async def process_scholarships(self, scholarships):
+        """
+        Process and save the scholarships missing from the database
+
+        Returns:
+            The new scholarships, and whether all of them were processed
+        """
+        new_scholarships = []
+        processed = True
+        for scholarship in scholarships:
+            if await self.is_new_scholarship(scholarship):
+                # Process the content
+                try:
+                    processed_content = await self.parse_with_llm(scholarship['content'])
+                except Exception as e:
+                    logger.error(f"Error processing scholarship: {str(e)}")
+                    processed = False
+                    continue
+                
+                # Clean and update the scholarship
+                # cleaned_content = self.clean_content(processed_content["content"])
+                scholarship['content'] = processed_content.get('content', '')
+                scholarship['application_link'] =  processed_content.get('application_link', '')
+                
+                new_scholarships.append(scholarship)
+                await self.save_scholarship(scholarship)
+        return new_scholarships, processed
+
+    async def check_new_scholarships(self, max_pages=3, incremental=CRAWL_INCREMENTAL):
         """Check for new scholarships and return them"""
+        if incremental:
+            return await self.crawl_new_scholarships(max_pages)
+
         new_scholarships = []     
         page_contents = await self.get_page_contents(max_pages)
-        for html_content in page_contents:
-            if not html_content:
+        for page, html_content in enumerate(page_contents, start=1):
+            if html_content is PAGE_UNCHANGED or not html_content:
                 continue
                 
-            soup = BeautifulSoup(html_content, 'html.parser')
+            url = self.page_url(page)
+            soup = page_cache.parse(url, html_content).soup
             
             scholarships = await self.parse_scholarship(soup)
-            if scholarships:
-                # Filter and save new scholarships
-                for scholarship in scholarships:
-                    if await self.is_new_scholarship(scholarship):
-                        # Process the content
-                        try:
-                            processed_content = await self.parse_with_llm(scholarship['content'])
-                        except Exception as e:
-                            logger.error(f"Error processing scholarship: {str(e)}")
-                            continue
-                        
-                        # Clean and update the scholarship
-                        # cleaned_content = self.clean_content(processed_content["content"])
-                        scholarship['content'] = processed_content.get('content', '')
-                        scholarship['application_link'] =  processed_content.get('application_link', '')
-                        
-                        new_scholarships.append(scholarship)
-                        await self.save_scholarship(scholarship)
+            found, processed = await self.process_scholarships(scholarships or [])
+            new_scholarships.extend(found)
+            # Revisit the page next run if an entry failed
+            if processed:
+                http_cache.commit(self.cache_scope, url)
             
         return new_scholarships
+
+    async def crawl_new_scholarships(self, max_pages=3):
+        """
+        Walk the listing newest-first, stopping at the first page with an item already crawled
+
+        Args:
+            max_pages: Page budget of a source never crawled before, the
+                frontier adapts it to the source's recent output afterwards
+        """
+        source = self.base_url
+        self._known = crawl_frontier.marks(source)
+        budget = crawl_frontier.page_budget(source, max_pages)
+        new_scholarships, new_keys, page_sizes, urls = [], [], [], []
+        complete = True
+        try:
+            for page in range(1, budget + 1):
+                html_content = await self.get_page(page)
+                if html_content is PAGE_UNCHANGED:
+                    # Unchanged since it was processed, older pages are too
+                    break
+                if html_content is None:
+                    logger.warning(f"Could not fetch page {page} of {source}, stopping the crawl")
+                    complete = False
+                    break
+
+                url = self.page_url(page)
+                soup = page_cache.parse(url, html_content).soup
+                self.reached_known = False
+                scholarships = await self.parse_scholarship(soup) or []
+                page_sizes.append(len(scholarships))
+
+                fresh = [scholarship for scholarship in scholarships if not self.is_known(scholarship)]
+                found, processed = await self.process_scholarships(fresh)
+                new_scholarships.extend(found)
+                new_keys.extend(crawl_frontier.item_key(scholarship) for scholarship in fresh)
+                urls.append(url)
+                complete = complete and processed
+
+                if self.reached_known or len(fresh) < len(scholarships):
+                    logger.info(f"Reached already crawled items on page {page} of {source}, stopping")
+                    break
+        finally:
+            self._known = set()
+            self.reached_known = False
+
+        # An unchanged first page ends the next crawl, so pages are only
+        # skipped once every page and item of this crawl went through
+        for url in urls:
+            if complete:
+                http_cache.commit(self.cache_scope, url)
+            else:
+                http_cache.discard(self.cache_scope, url)
+
+        page_size = sum(page_sizes) / len(page_sizes) if page_sizes else 0
+        # Failed items must not be walked past next time
+        crawl_frontier.record(source, new_keys, page_size, advance=complete)
+        return new_scholarships
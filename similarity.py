@@ -0,0 +1,65 @@
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+# Rows of the score matrix computed at once, bounds memory to chunk_size x items floats
+DEFAULT_CHUNK_SIZE = 1024
+
+
+def normalize(vectors) -> np.ndarray:
+    """float32 copy of vectors scaled to unit length, so dot products are cosines"""
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores in each row, best first"""
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.zeros(scores.shape[:-1] + (0,), dtype=np.int64)
+    if k < scores.shape[-1]:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(k), scores.shape[:-1] + (k,))
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+def top_k(
+    queries,
+    items,
+    k: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    normalized: bool = False,
+    adjust: Optional[Callable[[slice, np.ndarray], np.ndarray]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k items for every query with one matrix multiply per chunk of queries
+
+    Args:
+        queries: (n_queries, dim) query vectors
+        items: (n_items, dim) item vectors
+        k: Items kept per query
+        chunk_size: Queries scored per matrix multiply
+        normalized: Whether both matrices already have unit-length rows
+        adjust: Optional fn(query_rows, scores) returning modified scores for a chunk,
+            e.g. to blend in other signals or mask items with -inf
+
+    Returns:
+        (indices, scores), both (n_queries, min(k, n_items)), best first
+    """
+    if not normalized:
+        queries, items = normalize(queries), normalize(items)
+    k = min(k, len(items))
+    indices = np.empty((len(queries), k), dtype=np.int64)
+    scores = np.empty((len(queries), k), dtype=np.float32)
+    for start in range(0, len(queries), chunk_size):
+        rows = slice(start, min(start + chunk_size, len(queries)))
+        chunk = queries[rows] @ items.T
+        if adjust is not None:
+            chunk = adjust(rows, chunk)
+        best = top_k_indices(chunk, k)
+        indices[rows] = best
+        scores[rows] = np.take_along_axis(chunk, best, axis=1)
+    return indices, scores
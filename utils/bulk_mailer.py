@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, Tuple
+
+import aiosmtplib
+from asyncio_throttle import Throttler
+from dotenv import load_dotenv
+
+from log import logger
+from config import state_path
+from utils import email_utils
+from utils.smtp_pool import AsyncSMTPPool, async_smtp_pool
+
+load_dotenv()
+
+EMAIL_LEDGER_PATH = os.getenv("EMAIL_LEDGER_PATH") or state_path("email_ledger.sqlite3")
+EMAIL_SENDS_PER_MINUTE = int(os.getenv("EMAIL_SENDS_PER_MINUTE", "60"))
+# Seconds between retries of the job emails left unsent
+EMAIL_RESUME_INTERVAL = float(os.getenv("EMAIL_RESUME_INTERVAL", "600"))
+
+PENDING, SENT, FAILED, SKIPPED = "pending", "sent", "failed", "skipped"
+
+
+def _permanent(error: Exception) -> bool:
+    """Whether retrying cannot help, e.g. the address was refused"""
+    if isinstance(error, (aiosmtplib.SMTPRecipientRefused, aiosmtplib.SMTPRecipientsRefused)):
+        return True
+    return isinstance(error, aiosmtplib.SMTPResponseException) and error.code >= 500
+
+
+class DeliveryLedger:
+    def __init__(self, path: str = EMAIL_LEDGER_PATH):
+        """
+        Per-recipient delivery status of bulk mail batches, persisted in SQLite
+
+        Unsent entries keep their jobs so a batch can be resumed after a
+        crash or a failed send.
+
+        Args:
+            path: SQLite database file
+        """
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS deliveries (
+                    batch_id TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    jobs TEXT,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (batch_id, recipient)
+                )
+                """
+            )
+        return self._conn
+
+    def register(self, batch_id: str, items: List[Tuple[str, List[Dict]]]) -> List[Tuple[str, List[Dict]]]:
+        """
+        Record a batch and return the items that still have to be sent
+
+        Recipients already sent (or skipped) in this batch are left out.
+        """
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO deliveries (batch_id, recipient, status, jobs, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (batch_id, recipient, PENDING, None if jobs is None else json.dumps(jobs, default=str), now)
+                    for recipient, jobs in items
+                ],
+            )
+            self.conn.commit()
+            done = {
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT recipient FROM deliveries WHERE batch_id = ? AND status IN (?, ?)",
+                    (batch_id, SENT, SKIPPED),
+                )
+            }
+        return [(recipient, jobs) for recipient, jobs in items if recipient not in done]
+
+    def mark(self, batch_id: str, recipient: str, status: str, error: str = None):
+        with self._lock:
+            self.conn.execute(
+                "UPDATE deliveries SET status = ?, error = ?, updated_at = ?, "
+                "attempts = attempts + ?, "
+                # Sent entries no longer need their jobs
+                "jobs = CASE WHEN ? IN (?, ?) THEN NULL ELSE jobs END "
+                "WHERE batch_id = ? AND recipient = ?",
+                (
+                    status,
+                    error,
+                    time.time(),
+                    int(status in (SENT, FAILED)),
+                    status,
+                    SENT,
+                    SKIPPED,
+                    batch_id,
+                    recipient,
+                ),
+            )
+            self.conn.commit()
+
+    def unsent(self, max_attempts: int) -> Dict[str, List[Tuple[str, List[Dict]]]]:
+        """Pending or failed items with attempts left, grouped by batch"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT batch_id, recipient, jobs FROM deliveries "
+                "WHERE status IN (?, ?) AND attempts < ? AND jobs IS NOT NULL "
+                "ORDER BY updated_at",
+                (PENDING, FAILED, max_attempts),
+            ).fetchall()
+        batches = {}
+        for batch_id, recipient, jobs in rows:
+            batches.setdefault(batch_id, []).append((recipient, json.loads(jobs)))
+        return batches
+
+    def summary(self, batch_id: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) FROM deliveries WHERE batch_id = ? GROUP BY status",
+                (batch_id,),
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class BulkMailer:
+    def __init__(
+        self,
+        pool: AsyncSMTPPool = async_smtp_pool,
+        ledger: DeliveryLedger = None,
+        sends_per_minute: int = EMAIL_SENDS_PER_MINUTE,
+        max_attempts: int = 3,
+        retry_delay: float = 2.0,
+        digest_batch_size: int = 50,
+    ):
+        """
+        Send job emails and digests to many recipients concurrently over pooled SMTP sessions
+
+        Args:
+            pool: SMTP pool, whose size bounds the sends in flight
+            ledger: Delivery ledger used to skip recipients already sent and
+                to resume unsent ones
+            sends_per_minute: Provider rate limit
+            max_attempts: Sends tried per recipient before it is given up
+            retry_delay: Seconds before the first digest retry, doubled after each
+            digest_batch_size: Digest recipients sent per batch
+        """
+        self.pool = pool
+        self.ledger = ledger or DeliveryLedger()
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.digest_batch_size = digest_batch_size
+        self.throttler = Throttler(rate_limit=sends_per_minute, period=60)
+
+    @staticmethod
+    def batch_id(items: List[Tuple[str, List[Dict]]]) -> str:
+        """Stable ID of a batch, so re-sending the same batch skips delivered recipients"""
+        digest = hashlib.sha256()
+        for recipient, jobs in sorted(items, key=lambda item: item[0]):
+            digest.update(recipient.encode("utf-8"))
+            for job in jobs:
+                digest.update(str(job.get("job_url") or job.get("job_title")).encode("utf-8"))
+        return digest.hexdigest()[:32]
+
+    async def _send_one(self, batch_id: str, recipient: str, jobs: List[Dict]) -> str:
+        rendered = email_utils.render_job_email(recipient, jobs)
+        if rendered is None:
+            logger.warning(f"No jobs to send to {recipient}")
+            await asyncio.to_thread(self.ledger.mark, batch_id, recipient, SKIPPED)
+            return SKIPPED
+        subject, content, num_jobs = rendered
+        message = email_utils.build_message(recipient, content, subject)
+        try:
+            async with self.throttler:
+                await self.pool.send_message(message)
+        except Exception as e:
+            logger.error(f"Error sending job email to {recipient}: {e}")
+            await asyncio.to_thread(self.ledger.mark, batch_id, recipient, FAILED, str(e))
+            return FAILED
+        await asyncio.to_thread(self.ledger.mark, batch_id, recipient, SENT)
+        logger.info(f"Sent {num_jobs} jobs to {recipient}")
+        return SENT
+
+    async def send_batch(self, items: List[Tuple[str, List[Dict]]], batch_id: str = None) -> Dict[str, str]:
+        """
+        Render and send one email per (recipient, jobs) pair
+
+        A failed recipient does not stop the others; it stays in the ledger
+        and is retried by resume(), which the email queue runs at start and
+        then every EMAIL_RESUME_INTERVAL seconds.
+
+        Args:
+            items: (recipient, jobs) pairs
+            batch_id: Batch ID (default: derived from the recipients and jobs)
+
+        Returns:
+            Status of each recipient sent in this call
+        """
+        batch_id = batch_id or self.batch_id(items)
+        pending = await asyncio.to_thread(self.ledger.register, batch_id, items)
+        if len(pending) < len(items):
+            logger.info(f"Batch {batch_id}: {len(items) - len(pending)} recipients already sent")
+        # The pool's session slots bound the sends in flight
+        statuses = await asyncio.gather(
+            *(self._send_one(batch_id, recipient, jobs) for recipient, jobs in pending)
+        )
+        result = {recipient: status for (recipient, _), status in zip(pending, statuses)}
+        failed = sum(status == FAILED for status in statuses)
+        logger.info(f"Batch {batch_id}: sent {len(pending) - failed} of {len(pending)} emails")
+        return result
+
+    async def _send_digest_one(self, batch_id: str, recipient: str, subject: str, content: str) -> str:
+        message = email_utils.build_message(recipient, content, subject)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                async with self.throttler:
+                    await self.pool.send_message(message)
+            except Exception as e:
+                if attempt == self.max_attempts or _permanent(e):
+                    logger.error(f"Giving up on digest to {recipient} after {attempt} attempts: {e}")
+                    await asyncio.to_thread(self.ledger.mark, batch_id, recipient, FAILED, str(e))
+                    return FAILED
+                logger.warning(f"Digest to {recipient} failed (attempt {attempt}), retrying: {e}")
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+            else:
+                await asyncio.to_thread(self.ledger.mark, batch_id, recipient, SENT)
+                return SENT
+
+    async def send_digest(self, recipients: List[str], subject: str, content: str) -> Dict[str, str]:
+        """
+        Send one rendered digest to every recipient as an individual message
+
+        Recipients are sent in batches of digest_batch_size. A failing address
+        is retried with backoff on its own and never holds up the others.
+        Running the same digest again only sends to recipients not yet sent.
+
+        Args:
+            recipients: Email addresses
+            subject: Subject line shared by all messages
+            content: HTML body, rendered once for all recipients
+
+        Returns:
+            Status of each recipient sent in this call
+        """
+        recipients = list(dict.fromkeys(r.strip() for r in recipients if r and r.strip()))
+        batch_id = "digest-" + hashlib.sha256(content.encode("utf-8")).hexdigest()[:24]
+        pending = await asyncio.to_thread(
+            self.ledger.register, batch_id, [(recipient, None) for recipient in recipients]
+        )
+        result = {}
+        for i in range(0, len(pending), self.digest_batch_size):
+            batch = [recipient for recipient, _ in pending[i : i + self.digest_batch_size]]
+            statuses = await asyncio.gather(
+                *(self._send_digest_one(batch_id, r, subject, content) for r in batch)
+            )
+            result.update(zip(batch, statuses))
+        sent = sum(status == SENT for status in result.values())
+        logger.info(f"Digest {batch_id}: sent to {sent} of {len(pending)} recipients")
+        return result
+
+    async def resume(self) -> Dict[str, Dict[str, str]]:
+        """Retry recipients left pending or failed by earlier batches"""
+        batches = await asyncio.to_thread(self.ledger.unsent, self.max_attempts)
+        results = {}
+        for batch_id, items in batches.items():
+            logger.info(f"Resuming batch {batch_id} with {len(items)} unsent emails")
+            results[batch_id] = await self.send_batch(items, batch_id)
+        return results
+
+
+bulk_mailer = BulkMailer()
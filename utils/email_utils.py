@@ -1,12 +1,13 @@
 import os
 import random
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.utils import formatdate, make_msgid
 from email.mime.application import MIMEApplication
 from dotenv import load_dotenv
 import logging
+from utils.smtp_pool import smtp_pool, async_smtp_pool
+from utils.templates import compile_template
 
 load_dotenv()
 
@@ -14,46 +15,58 @@ from_email = os.getenv("FROM_EMAIL")
 smtp_password = os.getenv("SMTP_PASSWORD")
 from_email = os.environ.get("FROM_EMAIL")
 smtp_password = os.environ.get("SMTP_PASSWORD")
-smtp_server = "smtp.gmail.com"
-smtp_port = 465
+# Also copy stylesheet rules into style attributes, for clients that drop <style>
+INLINE_CSS = os.getenv("EMAIL_INLINE_CSS", "false").lower() == "true"
 
 logger = logging.getLogger(__name__)
 
 
+def render_job_email(to_email, jobs_list):
+    """
+    Subject and HTML body of the email with the 5 best matching jobs
+
+    Args:
+        to_email: Recipient email address
+        jobs_list: List of job dictionaries, with a match_score when ranked
+
+    Returns:
+        (subject, content, number of jobs), or None when there are no jobs
+    """
+    # Handle empty list
+    if not jobs_list:
+        return None
+
+    # Get number of jobs to send (min of 5 or available jobs)
+    num_jobs = min(5, len(jobs_list))
+
+    # Best matches first; unranked jobs keep their order
+    selected_jobs = sorted(
+        jobs_list, key=lambda job: job.get("match_score", 0), reverse=True
+    )[:num_jobs]
+
+    subject = get_email_subject(num_jobs)
+    content = create_job_html_template(selected_jobs, to_email)
+    return subject, content, num_jobs
+
+
 def send_job_email(
     to_email,
     jobs_list,
 ):
     """
-    Send email with up to 5 random job results
+    Send email with the 5 best matching job results
 
     Args:
         to_email: Recipient email address
-        jobs_list: List of job dictionaries
+        jobs_list: List of job dictionaries, with a match_score when ranked
     """
     try:
-        # Handle empty list
-        if not jobs_list:
+        rendered = render_job_email(to_email, jobs_list)
+        if rendered is None:
             logger.warning(f"No jobs to send to {to_email}")
             return
+        subject, content, num_jobs = rendered
 
-        # Get number of jobs to send (min of 5 or available jobs)
-        num_jobs = min(5, len(jobs_list))
-
-        # Randomly select jobs if more than 5 available
-        if len(jobs_list) > 5:
-            selected_jobs = random.sample(jobs_list, 5)
-        else:
-            selected_jobs = jobs_list
-
-        # Get subject first
-        subject = get_email_subject(num_jobs)
-        
-        # Create content
-        content = create_job_html_template(selected_jobs, to_email)
-        
-        # Send email
-        # print(to_email)
         send_email(to_email, content, subject)
 
         logger.info(f"Sent {num_jobs} jobs to {to_email}")
@@ -63,13 +76,14 @@ def send_job_email(
         raise
 
 
-def send_email(
+def build_message(
     to_email,
     content,
     subject=None,
     attachments=None,
     recipients=None,
 ):
+    """Build the MIME message sent by send_email and send_email_async"""
     # Create a MIMEMultipart message
     message = MIMEMultipart("alternative")
     message["To"] = to_email
@@ -109,17 +123,39 @@ def send_email(
                 )
                 message.attach(attachment_mime)
 
-    # Modified SMTP connection and sending with more detailed error handling
+    return message
+
+
+def send_email(
+    to_email,
+    content,
+    subject=None,
+    attachments=None,
+    recipients=None,
+):
+    """Send an HTML email over a pooled, already authenticated SMTP session"""
+    message = build_message(to_email, content, subject, attachments, recipients)
     try:
-        smtp = smtplib.SMTP_SSL(smtp_server, smtp_port)
-        smtp.login(from_email, smtp_password)
-        smtp.send_message(message)
+        smtp_pool.send_message(message)
+    except Exception as e:
+        logger.error(f"Failed to send email: {e}")
+        raise
+
 
+async def send_email_async(
+    to_email,
+    content,
+    subject=None,
+    attachments=None,
+    recipients=None,
+):
+    """send_email for the event loop, over the aiosmtplib pool"""
+    message = build_message(to_email, content, subject, attachments, recipients)
+    try:
+        await async_smtp_pool.send_message(message)
     except Exception as e:
-        print(f"Failed to send email: {e}")
+        logger.error(f"Failed to send email: {e}")
         raise
-    finally:
-        smtp.quit()
 
 
 def get_email_subject(jobs_count):
@@ -163,10 +199,7 @@ def get_email_subject(jobs_count):
     return random.choice(weighted_subjects)
 
 
-def create_job_html_template(jobs_list, to_email):
-    # Add more CSS styles
-    styles = """
-        <style>
+JOB_EMAIL_CSS = """
             /* General styles */
             body {
                 font-family: Arial, sans-serif;
@@ -261,12 +294,9 @@ def create_job_html_template(jobs_list, to_email):
             }
             .unsubscribe:hover {
                 color: white;
-            }
-        </style>
-    """
+            }"""
 
-    # Email template with header and footer
-    html_content = f"""
+JOB_EMAIL_DOCUMENT = """
     <html>
     <head>{styles}</head>
     <body>
@@ -274,7 +304,7 @@ def create_job_html_template(jobs_list, to_email):
             <!-- Header -->
             <div class="header">
                 <h1>Job Match Alert</h1>
-                <p>We've found {len(jobs_list)} job opportunities matching your profile</p>
+                <p>We've found {count} job opportunities matching your profile</p>
             </div>
 
             <!-- Main Content -->
@@ -282,74 +312,73 @@ def create_job_html_template(jobs_list, to_email):
                 <p style="text-align: center; color: #7f8c8d; margin-bottom: 30px;">
                     Hello! Here are the latest job opportunities that match your skills and preferences.
                 </p>
+    {items}
+            </div>
+            <div class="footer">
+                <div style="margin-bottom: 20px;">
+                    <strong>Stay Connected</strong>
+                    <div class="social-links">
+                        <a href="https://linkedin.com/company/your-company">LinkedIn</a> |
+                        <a href="https://twitter.com/your-company">Twitter</a> |
+                        <a href="https://your-company.com">Website</a>
+                    </div>
+                </div>
+                <div class="footer-info">
+                    <p>Solve Byte<br>123 Lagos Nigeria<br>solvebyet@gmail.com</p>
+                    <p>© 2024 Solve Byte. All rights reserved.</p>
+                    <p>This email was sent to {to_email} because you subscribed to job alerts.<br>
+                    <a href="#" class="unsubscribe">Unsubscribe</a> | 
+                    <a href="#" class="unsubscribe">Update Preferences</a></p>
+                </div>
+            </div>
+        </div>
+        <div style="text-align: center; margin-top: 20px; font-size: 12px; color: #7f8c8d;">
+            This email looks better in your preferred email client.
+        </div>
+    </body>
+    </html>
     """
 
-    # Add jobs
-    for job in jobs_list:
-        html_content += f"""
+JOB_EMAIL_ITEM = """
         <div class="job-container">
             <div class="job-title">
-                <h2>{job['job_title']}</h2>
+                <h2>{job_title}</h2>
             </div>
-            <div class="company-info">{job['company_info']}</div>
+            <div class="company-info">{company_info}</div>
             <div class="location-salary">
-                <span>📍 Location: {job['location']}</span>
-                <span>💰 Salary: {job['salary_range']}</span>
+                <span>📍 Location: {location}</span>
+                <span>💰 Salary: {salary_range}</span>
             </div>
             <div class="section">
                 <h3>Job Description</h3>
-                <p>{job['job_description']}</p>
+                <p>{job_description}</p>
             </div>
             <div class="section">
                 <h3>Key Responsibilities</h3>
                 <ul>
-                    {' '.join(f'<li>{resp}</li>' for resp in job['responsibilities'])}
+                    {responsibilities|list}
                 </ul>
             </div>
             <div class="section">
                 <h3>Required Skills</h3>
                 <ul>
-                    {' '.join(f'<li>{skill}</li>' for skill in job['required_skills'])}
+                    {required_skills|list}
                 </ul>
             </div>
             <div class="section">
                 <h3>Qualifications</h3>
                 <ul>
-                    {' '.join(f'<li>{qual}</li>' for qual in job['qualifications'])}
+                    {qualifications|list}
                 </ul>
             </div>
             <div style="text-align: center;">
-                <a href="{job['job_url']}" class="apply-button">Apply Now</a>
+                <a href="{job_url}" class="apply-button">Apply Now</a>
             </div>
         </div>
         """
 
-    # Add footer
-    html_content += f"""
-            </div>
-            <div class="footer">
-                <div style="margin-bottom: 20px;">
-                    <strong>Stay Connected</strong>
-                    <div class="social-links">
-                        <a href="https://linkedin.com/company/your-company">LinkedIn</a> |
-                        <a href="https://twitter.com/your-company">Twitter</a> |
-                        <a href="https://your-company.com">Website</a>
-                    </div>
-                </div>
-                <div class="footer-info">
-                    <p>Solve Byte<br>123 Lagos Nigeria<br>solvebyet@gmail.com</p>
-                    <p>© 2024 Solve Byte. All rights reserved.</p>
-                    <p>This email was sent to {to_email} because you subscribed to job alerts.<br>
-                    <a href="#" class="unsubscribe">Unsubscribe</a> | 
-                    <a href="#" class="unsubscribe">Update Preferences</a></p>
-                </div>
-            </div>
-        </div>
-        <div style="text-align: center; margin-top: 20px; font-size: 12px; color: #7f8c8d;">
-            This email looks better in your preferred email client.
-        </div>
-    </body>
-    </html>
-    """
 
-    return html_content
+def create_job_html_template(jobs_list, to_email):
+    """Render the job digest from the template compiled on first use"""
+    template = compile_template(JOB_EMAIL_DOCUMENT, JOB_EMAIL_ITEM, JOB_EMAIL_CSS, INLINE_CSS)
+    return template.render(jobs_list, count=len(jobs_list), to_email=to_email)
@@ -0,0 +1,120 @@
+import copy
+import hashlib
+import threading
+import importlib.util
+from collections import OrderedDict
+from typing import Iterable, Union
+
+from bs4 import BeautifulSoup, Tag
+from markdownify import MarkdownConverter
+
+# lxml builds the same BeautifulSoup tree several times faster than html.parser
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+_converter = MarkdownConverter()
+
+
+def parse_html(html: Union[str, bytes]) -> BeautifulSoup:
+    """Parse a page with the fastest available backend"""
+    return BeautifulSoup(html, HTML_PARSER)
+
+
+def _convert(element: Tag) -> str:
+    if isinstance(element, BeautifulSoup):
+        return _converter.convert_soup(element)
+    # Convert the tag itself, not only its children. List bullets and numbers
+    # look at the ancestors, so a detached copy renders like md(str(element))
+    return _converter.process_tag(copy.copy(element), convert_as_inline=False)
+
+
+def to_markdown(element: Union[Tag, Iterable[Tag], str]) -> str:
+    """
+    Markdown of an already parsed element, without serialising and re-parsing it
+
+    A list of elements is converted one by one and joined with newlines,
+    a string is parsed first.
+    """
+    if isinstance(element, (str, bytes)):
+        element = parse_html(element)
+    if isinstance(element, Tag):
+        return _convert(element)
+    return "\n".join(_convert(e) for e in element)
+
+
+def page_metadata(soup: BeautifulSoup, url: str) -> dict:
+    """Source, title, description and language of a page"""
+    metadata = {"source": url}
+    if title := soup.find("title"):
+        metadata["title"] = title.get_text()
+    if description := soup.find("meta", attrs={"name": "description"}):
+        metadata["description"] = description.get("content", "No description found.")
+    if html := soup.find("html"):
+        metadata["language"] = html.get("lang", "No language found.")
+    return metadata
+
+
+class ParsedPage:
+    def __init__(self, url: str, html: Union[str, bytes]):
+        """
+        A page parsed once, shared by every extractor that needs it
+
+        Args:
+            url: Page URL
+            html: Page HTML
+        """
+        self.url = url
+        self.soup = parse_html(html)
+        self._metadata = None
+
+    @property
+    def metadata(self) -> dict:
+        if self._metadata is None:
+            self._metadata = page_metadata(self.soup, self.url)
+        return self._metadata
+
+
+class PageCache:
+    def __init__(self, max_pages: int = 256):
+        """
+        Parsed pages by URL, kept for the duration of a scraping run
+
+        Args:
+            max_pages: Pages kept before the least recently used are dropped
+        """
+        self.max_pages = max_pages
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+        # Pages are also parsed from worker threads (asyncio.to_thread)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(html: Union[str, bytes]) -> str:
+        data = html.encode("utf-8", "surrogatepass") if isinstance(html, str) else html
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def parse(self, url: str, html: Union[str, bytes]) -> ParsedPage:
+        """Parsed page for url, re-parsed only if its HTML changed"""
+        digest = self._digest(html)
+        with self._lock:
+            cached = self._pages.get(url)
+            if cached is not None and cached[0] == digest:
+                self._pages.move_to_end(url)
+                self.hits += 1
+                return cached[1]
+        page = ParsedPage(url, html)
+        with self._lock:
+            self.misses += 1
+            self._pages[url] = (digest, page)
+            self._pages.move_to_end(url)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        return page
+
+    def clear(self):
+        """Drop all pages, call at the end of a run"""
+        with self._lock:
+            self._pages.clear()
+
+
+page_cache = PageCache()
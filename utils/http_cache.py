@@ -0,0 +1,132 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+from log import logger
+from config import state_path
+
+load_dotenv()
+
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH") or state_path("http_cache.sqlite3")
+
+
+class HttpCache:
+    def __init__(self, path: str = HTTP_CACHE_PATH):
+        """
+        Validators of fetched pages (ETag, Last-Modified, body hash), persisted in SQLite
+
+        Entries are scoped by consumer, so two scrapers reading the same page
+        each see it change once. New validators are only stored by commit(),
+        after the consumer has processed the page: a run that fails halfway
+        sees the page as changed again next time.
+
+        Args:
+            path: SQLite database file
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._pending: Dict[Tuple[str, str], tuple] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pages (
+                    scope TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    body_hash TEXT NOT NULL,
+                    changed_at REAL NOT NULL,
+                    PRIMARY KEY (scope, url)
+                )
+                """
+            )
+        return self._conn
+
+    def _entry(self, scope: str, url: str):
+        with self._lock:
+            return self.conn.execute(
+                "SELECT etag, last_modified, body_hash FROM pages WHERE scope = ? AND url = ?",
+                (scope, url),
+            ).fetchone()
+
+    def headers(self, scope: str, url: str) -> Dict[str, str]:
+        """Conditional request headers for url, empty if it was never committed"""
+        entry = self._entry(scope, url)
+        headers = {}
+        if entry is not None:
+            etag, last_modified, _ = entry
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def unchanged(self, scope: str, url: str, response: httpx.Response) -> bool:
+        """
+        Whether the response repeats the committed page
+
+        True for a 304, or a body identical to the committed one. Otherwise
+        the new validators are held until commit(scope, url).
+        """
+        if response.status_code == 304:
+            self.hits += 1
+            return True
+        body_hash = hashlib.sha256(response.content).hexdigest()
+        entry = self._entry(scope, url)
+        if entry is not None and entry[2] == body_hash:
+            self.hits += 1
+            return True
+        self.misses += 1
+        with self._lock:
+            self._pending[(scope, url)] = (
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                body_hash,
+            )
+        return False
+
+    def commit(self, scope: str, url: str):
+        """Store the validators of a changed page once it has been processed"""
+        with self._lock:
+            validators = self._pending.pop((scope, url), None)
+            if validators is None:
+                return
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (scope, url, etag, last_modified, body_hash, changed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (scope, url, *validators, time.time()),
+            )
+            self.conn.commit()
+        logger.info(f"Cached validators of {url} for {scope}")
+
+    def discard(self, scope: str, url: str):
+        """Drop the validators held for a page that was not processed"""
+        with self._lock:
+            self._pending.pop((scope, url), None)
+
+    def close(self):
+        with self._lock:
+            self._pending.clear()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+http_cache = HttpCache()
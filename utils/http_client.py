@@ -0,0 +1,118 @@
+import os
+import asyncio
+import importlib.util
+from typing import Dict, Tuple
+from urllib.parse import urlparse
+
+import httpx
+from dotenv import load_dotenv
+
+from log import logger
+
+load_dotenv()
+
+# httpx only speaks HTTP/2 when the h2 extra is installed
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "10"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "5"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# Per-host overrides of the client settings
+HOST_SETTINGS: Dict[str, dict] = {
+    # The Jina reader renders pages before answering
+    "r.jina.ai": {"timeout": 120.0},
+    # Scraped listing sites: keep a handful of warm connections, stay polite
+    "dixcoverhub.com.ng": {"max_connections": 5},
+    "www.scholars4dev.com": {"max_connections": 5},
+}
+
+
+class HttpClientRegistry:
+    def __init__(
+        self,
+        timeout: float = HTTP_TIMEOUT,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections: int = HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        retries: int = 2,
+        http2: bool = HTTP2_AVAILABLE,
+        host_settings: Dict[str, dict] = None,
+    ):
+        """
+        Long-lived pooled httpx clients shared across the process, one per host
+
+        Args:
+            timeout: Request timeout in seconds
+            max_connections: Connections open at once per client
+            max_keepalive_connections: Idle connections kept alive per client
+            keepalive_expiry: Seconds an idle connection is kept
+            retries: Connection attempts retried by the transport
+            http2: Whether to negotiate HTTP/2 (needs the h2 package)
+            host_settings: Overrides of the settings above, by host
+        """
+        self.defaults = {
+            "timeout": timeout,
+            "max_connections": max_connections,
+            "max_keepalive_connections": max_keepalive_connections,
+            "keepalive_expiry": keepalive_expiry,
+            "retries": retries,
+            "http2": http2,
+        }
+        self.host_settings = HOST_SETTINGS if host_settings is None else host_settings
+        self._clients: Dict[Tuple[str, str], Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+
+    @staticmethod
+    def host(url: str = None) -> str:
+        if not url:
+            return ""
+        return urlparse(url).netloc if "://" in url else url
+
+    def _create(self, host: str, proxy: str = None) -> httpx.AsyncClient:
+        settings = {**self.defaults, **self.host_settings.get(host, {})}
+        http2 = settings["http2"] and HTTP2_AVAILABLE
+        logger.info(f"Creating pooled HTTP client for {host or 'default'} (http2={http2})")
+        # Pool limits and HTTP/2 belong to the transport when one is passed
+        return httpx.AsyncClient(
+            timeout=settings["timeout"],
+            follow_redirects=True,
+            transport=httpx.AsyncHTTPTransport(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=settings["max_connections"],
+                    max_keepalive_connections=settings["max_keepalive_connections"],
+                    keepalive_expiry=settings["keepalive_expiry"],
+                ),
+                retries=settings["retries"],
+                proxy=proxy,
+            ),
+        )
+
+    def get(self, url: str = None, proxy: str = None) -> httpx.AsyncClient:
+        """
+        Shared client for the host of url (or the default client)
+
+        Clients belong to the event loop that created them, a new loop gets
+        its own.
+        """
+        key = (self.host(url), proxy or "")
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(key)
+        if entry is None or entry[0] is not loop or entry[1].is_closed:
+            self._clients[key] = entry = (loop, self._create(key[0], proxy))
+        return entry[1]
+
+    async def aclose(self):
+        """Close every client created in the running event loop"""
+        loop = asyncio.get_running_loop()
+        clients, self._clients = self._clients, {}
+        for key, (client_loop, client) in clients.items():
+            if client_loop is loop:
+                await client.aclose()
+            else:
+                # Its loop is gone, the connections died with it
+                logger.warning(f"Dropping HTTP client for {key[0]} from a closed event loop")
+
+
+http_clients = HttpClientRegistry()
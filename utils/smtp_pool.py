@@ -0,0 +1,303 @@
+import os
+import time
+import asyncio
+import smtplib
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from email.message import Message
+
+import aiosmtplib
+from dotenv import load_dotenv
+
+from log import logger
+from metrics import metrics
+
+load_dotenv()
+
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "3"))
+
+# 421: the server is closing the session (e.g. too many messages on one connection)
+_SERVICE_CLOSING = 421
+
+
+def _reconnectable(error: Exception) -> bool:
+    """Whether the session was lost, rather than the message being rejected"""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, aiosmtplib.SMTPServerDisconnected)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == _SERVICE_CLOSING
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return error.code == _SERVICE_CLOSING
+    # smtplib errors subclass OSError, plain socket errors are the connection
+    if isinstance(error, (smtplib.SMTPException, aiosmtplib.SMTPException)):
+        return False
+    return isinstance(error, OSError)
+
+
+class _Session:
+    def __init__(self, client):
+        self.client = client
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    def __init__(
+        self,
+        host: str = SMTP_SERVER,
+        port: int = SMTP_PORT,
+        username: str = None,
+        password: str = None,
+        size: int = SMTP_POOL_SIZE,
+        max_messages: int = 90,
+        max_idle: float = 240,
+        timeout: float = 30,
+    ):
+        """
+        Authenticated SMTP_SSL sessions kept open and reused across messages
+
+        Args:
+            host: SMTP server
+            port: SMTPS port
+            username: Login user (default: FROM_EMAIL)
+            password: Login password (default: SMTP_PASSWORD)
+            size: Sessions open at once, also the number of concurrent sends
+            max_messages: Messages per session before reconnecting, servers
+                such as Gmail close sessions after about 100
+            max_idle: Seconds a session may sit unused before it is checked
+                with NOOP on checkout
+            timeout: Socket timeout in seconds
+        """
+        self.host = host
+        self.port = port
+        self.username = username or os.getenv("FROM_EMAIL")
+        self.password = password or os.getenv("SMTP_PASSWORD")
+        self.size = size
+        self.max_messages = max_messages
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.connects = 0
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> _Session:
+        with metrics.span("smtp", "connect"):
+            client = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+            try:
+                client.login(self.username, self.password)
+            except BaseException:
+                self._discard(_Session(client))
+                raise
+        self.connects += 1
+        return _Session(client)
+
+    @staticmethod
+    def _discard(session: _Session):
+        try:
+            session.client.quit()
+        except Exception:
+            try:
+                session.client.close()
+            except Exception:
+                pass
+
+    def _alive(self, session: _Session) -> bool:
+        if session.sent >= self.max_messages:
+            return False
+        if time.monotonic() - session.last_used < self.max_idle:
+            return True
+        try:
+            return session.client.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self) -> _Session:
+        while True:
+            with self._lock:
+                session = self._idle.pop() if self._idle else None
+            if session is None:
+                return self._connect()
+            if self._alive(session):
+                return session
+            self._discard(session)
+
+    def _checkin(self, session: _Session):
+        session.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(session)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow an authenticated session, discarded instead of returned if it breaks
+
+        A rejected message leaves the session usable (smtplib resets the
+        envelope), so it goes back to the pool.
+        """
+        with self._slots:
+            session = self._checkout()
+            try:
+                yield session
+            except Exception as e:
+                if _reconnectable(e):
+                    self._discard(session)
+                else:
+                    self._checkin(session)
+                raise
+            except BaseException:
+                self._discard(session)
+                raise
+            self._checkin(session)
+
+    def send_message(self, message: Message):
+        """Send a message, reconnecting once if the pooled session was dropped"""
+        for attempt in range(2):
+            try:
+                with self.connection() as session:
+                    with metrics.span("smtp", "send_message"):
+                        session.client.send_message(message)
+                    session.sent += 1
+                return
+            except Exception as e:
+                if attempt or not _reconnectable(e):
+                    raise
+                logger.warning(f"SMTP session dropped, reconnecting: {e}")
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            self._discard(session)
+
+
+class AsyncSMTPPool:
+    def __init__(
+        self,
+        host: str = SMTP_SERVER,
+        port: int = SMTP_PORT,
+        username: str = None,
+        password: str = None,
+        size: int = SMTP_POOL_SIZE,
+        max_messages: int = 90,
+        max_idle: float = 240,
+        timeout: float = 30,
+    ):
+        """
+        aiosmtplib counterpart of SMTPPool, for sending from the event loop
+
+        Args:
+            host: SMTP server
+            port: SMTPS port
+            username: Login user (default: FROM_EMAIL)
+            password: Login password (default: SMTP_PASSWORD)
+            size: Sessions open at once, also the number of concurrent sends
+            max_messages: Messages per session before reconnecting
+            max_idle: Seconds a session may sit unused before it is checked
+                with NOOP on checkout
+            timeout: Socket timeout in seconds
+        """
+        self.host = host
+        self.port = port
+        self.username = username or os.getenv("FROM_EMAIL")
+        self.password = password or os.getenv("SMTP_PASSWORD")
+        self.size = size
+        self.max_messages = max_messages
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.connects = 0
+        self._idle = []
+        self._slots = None
+
+    async def _connect(self) -> _Session:
+        with metrics.span("smtp", "connect"):
+            client = aiosmtplib.SMTP(
+                hostname=self.host, port=self.port, use_tls=True, timeout=self.timeout
+            )
+            await client.connect()
+            try:
+                await client.login(self.username, self.password)
+            except BaseException:
+                await self._discard(_Session(client))
+                raise
+        self.connects += 1
+        return _Session(client)
+
+    @staticmethod
+    async def _discard(session: _Session):
+        try:
+            await session.client.quit()
+        except Exception:
+            session.client.close()
+
+    async def _alive(self, session: _Session) -> bool:
+        if session.sent >= self.max_messages or not session.client.is_connected:
+            return False
+        if time.monotonic() - session.last_used < self.max_idle:
+            return True
+        try:
+            return (await session.client.noop()).code == 250
+        except Exception:
+            return False
+
+    async def _checkout(self) -> _Session:
+        while self._idle:
+            session = self._idle.pop()
+            if await self._alive(session):
+                return session
+            await self._discard(session)
+        return await self._connect()
+
+    def _checkin(self, session: _Session):
+        session.last_used = time.monotonic()
+        self._idle.append(session)
+
+    @asynccontextmanager
+    async def connection(self):
+        """
+        Borrow an authenticated session, discarded instead of returned if it breaks
+
+        A rejected message leaves the session usable (aiosmtplib resets the
+        envelope), so it goes back to the pool.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        async with self._slots:
+            session = await self._checkout()
+            try:
+                yield session
+            except Exception as e:
+                if _reconnectable(e):
+                    await self._discard(session)
+                else:
+                    self._checkin(session)
+                raise
+            except BaseException:
+                await self._discard(session)
+                raise
+            self._checkin(session)
+
+    async def send_message(self, message: Message):
+        """Send a message, reconnecting once if the pooled session was dropped"""
+        for attempt in range(2):
+            try:
+                async with self.connection() as session:
+                    with metrics.span("smtp", "send_message"):
+                        await session.client.send_message(message)
+                    session.sent += 1
+                return
+            except Exception as e:
+                if attempt or not _reconnectable(e):
+                    raise
+                logger.warning(f"SMTP session dropped, reconnecting: {e}")
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for session in idle:
+            await self._discard(session)
+
+
+smtp_pool = SMTPPool()
+async_smtp_pool = AsyncSMTPPool()
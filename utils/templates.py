@@ -0,0 +1,137 @@
+import re
+import urllib.parse
+from functools import lru_cache
+from string import Formatter
+from typing import Callable, Dict, Iterable, List, Tuple
+
+_CLASS_ATTRIBUTE = re.compile(r'(<[a-zA-Z][^<>]*?\sclass="([^"{}]*)")([^<>]*>)')
+_RULE = re.compile(r"([^{}]+)\{([^{}]*)\}")
+_SIMPLE_CLASS = re.compile(r"^\.([\w-]+)$")
+
+
+def class_styles(css: str) -> Dict[str, str]:
+    """
+    Declarations of the single-class rules (e.g. `.footer`) in a stylesheet
+
+    Rules with other selectors (descendants, pseudo-classes, tags) are left to
+    the <style> block, which is kept.
+    """
+    styles = {}
+    for selectors, declarations in _RULE.findall(css):
+        declarations = " ".join(
+            d.strip() + ";" for d in declarations.split(";") if d.strip()
+        )
+        for selector in selectors.split(","):
+            match = _SIMPLE_CLASS.match(selector.strip())
+            if match and declarations:
+                name = match.group(1)
+                styles[name] = f"{styles[name]} {declarations}" if name in styles else declarations
+    return styles
+
+
+def inline_css(html: str, css: str) -> str:
+    """Copy single-class rules into style attributes, for clients that drop <style>"""
+    styles = class_styles(css)
+
+    def add_style(match):
+        opening, classes, rest = match.groups()
+        declarations = " ".join(styles[c] for c in classes.split() if c in styles)
+        if not declarations or "style=" in match.group(0):
+            return match.group(0)
+        return f'{opening} style="{declarations}"{rest}'
+
+    return _CLASS_ATTRIBUTE.sub(add_style, html)
+
+
+def html_list(values: Iterable) -> str:
+    """<li> elements for a list field"""
+    return " ".join(f"<li>{value}</li>" for value in values or ())
+
+
+# Filters available to every template, e.g. {skills|list}
+FILTERS = {"list": html_list, "quote": urllib.parse.quote}
+
+
+class Fragment:
+    def __init__(self, source: str, filters: Dict[str, Callable] = None, **static):
+        """
+        A str.format-style template parsed once, rendered with str.format_map
+
+        Args:
+            source: Template text with {field} or {field|filter} placeholders
+                ({{ and }} for literal braces)
+            filters: Functions applied to filtered fields, by name
+            **static: Field values known up front, baked into the literal text
+        """
+        filters = {**FILTERS, **(filters or {})}
+        # (placeholder, field, filter) of the fields filled on every render
+        self.fields: List[Tuple[str, str, Callable]] = []
+        template = ""
+        for text, field, spec, conversion in Formatter().parse(source):
+            template += text.replace("{", "{{").replace("}", "}}")
+            if field is None:
+                continue
+            if spec or conversion:
+                raise ValueError(f"Format specs are not supported: {{{field}}}")
+            if field in static:
+                template += str(static[field]).replace("{", "{{").replace("}", "}}")
+                continue
+            name, _, filter_name = field.partition("|")
+            template += f"{{{field}}}"
+            if all(field != known for known, _, _ in self.fields):
+                self.fields.append((field, name, filters[filter_name] if filter_name else None))
+        self.template = template
+
+    def render(self, values: Dict) -> str:
+        return self.template.format_map(
+            {
+                field: values[name] if apply is None else apply(values[name])
+                for field, name, apply in self.fields
+            }
+        )
+
+
+class HtmlTemplate:
+    def __init__(
+        self,
+        document: str,
+        item: str,
+        css: str = "",
+        inline: bool = False,
+        **static,
+    ):
+        """
+        An HTML email made of a static document wrapped around repeated items
+
+        The document and item templates are parsed once. The stylesheet and any
+        static values are baked into the literal text, so rendering only fills
+        per-email and per-item fields.
+
+        Args:
+            document: Template with a {styles} and an {items} placeholder,
+                plus fields filled on every render
+            item: Template rendered for each item
+            css: Stylesheet placed in {styles}
+            inline: Also copy single-class rules into style attributes
+            **static: Values of fields that never change between renders
+        """
+        if inline:
+            document, item = inline_css(document, css), inline_css(item, css)
+        head, separator, tail = document.partition("{items}")
+        if not separator:
+            raise ValueError("Document template has no {items} placeholder")
+        static["styles"] = f"<style>{css}</style>" if css else ""
+        self.head = Fragment(head, **static)
+        self.tail = Fragment(tail, **static)
+        self.item = Fragment(item, **static)
+
+    def render(self, items: Iterable[Dict], **values) -> str:
+        render_item = self.item.render
+        parts = [render_item(item) for item in items]
+        return f"{self.head.render(values)}{''.join(parts)}{self.tail.render(values)}"
+
+
+@lru_cache(maxsize=32)
+def compile_template(document: str, item: str, css: str = "", inline: bool = False) -> HtmlTemplate:
+    """Prepared template, built once per distinct source (i.e. per template version)"""
+    return HtmlTemplate(document, item, css, inline)
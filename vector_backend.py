@@ -0,0 +1,447 @@
+import os
+import json
+import threading
+from typing import Dict, List
+
+import numpy as np
+from dotenv import load_dotenv
+
+from log import logger
+from config import state_path
+from metrics import TracedClient
+from similarity import normalize, top_k as top_k_similar
+
+load_dotenv()
+
+# pinecone: managed Pinecone index, local: in-process index persisted to VECTOR_STORE_PATH
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH") or state_path("vector_store")
+PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+
+
+class VectorBackend:
+    """
+    Storage and search used by VectorDatabase
+
+    Methods mirror the Pinecone index API (same arguments, dict-shaped
+    responses) and may block, callers run them in a worker thread.
+    """
+
+    batch_queries = False
+
+    def upsert(self, vectors: List[Dict], namespace: str = None):
+        raise NotImplementedError
+
+    def fetch(self, ids: List[str], namespace: str = None) -> Dict:
+        raise NotImplementedError
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int = 3,
+        namespace: str = None,
+        include_values: bool = False,
+        include_metadata: bool = True,
+        filter: dict = None,
+    ) -> Dict:
+        raise NotImplementedError
+
+    def query_many(
+        self,
+        vectors: List[List[float]],
+        top_k: int = 3,
+        namespace: str = None,
+        include_values: bool = False,
+        include_metadata: bool = True,
+        filter: dict = None,
+    ) -> List[Dict]:
+        """One query response per vector, backends able to batch override this"""
+        return [
+            self.query(vector, top_k, namespace, include_values, include_metadata, filter)
+            for vector in vectors
+        ]
+
+    def delete(
+        self,
+        ids: List[str] = None,
+        namespace: str = None,
+        filter: dict = None,
+        delete_all: bool = False,
+    ):
+        raise NotImplementedError
+
+    def describe_index_stats(self) -> Dict:
+        raise NotImplementedError
+
+    def persist(self):
+        """Make previous writes durable, for backends that buffer them"""
+
+
+class PineconeBackend(VectorBackend):
+    def __init__(self, index_name: str, dimension: int, api_key: str = PINECONE_API_KEY):
+        """
+        Managed Pinecone index, created on first use
+
+        Args:
+            index_name: Name of the Pinecone index
+            dimension: Embedding dimension, used if the index has to be created
+            api_key: Pinecone API key
+        """
+        self.index_name = index_name
+        self.dimension = dimension
+        self.api_key = api_key
+        self._index = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    from pinecone import ServerlessSpec
+                    from pinecone.grpc import PineconeGRPC as Pinecone
+
+                    pc = Pinecone(api_key=self.api_key)
+                    if not pc.has_index(self.index_name):
+                        logger.info(f"Creating Pinecone index {self.index_name}")
+                        pc.create_index(
+                            name=self.index_name,
+                            dimension=self.dimension,
+                            metric="cosine",
+                            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+                        )
+                    self._index = TracedClient(pc.Index(self.index_name), "pinecone")
+        return self._index
+
+    def upsert(self, vectors, namespace=None):
+        return self.index.upsert(vectors=vectors, namespace=namespace)
+
+    def fetch(self, ids, namespace=None):
+        return self.index.fetch(ids=ids, namespace=namespace)
+
+    def query(self, vector, top_k=3, namespace=None, include_values=False, include_metadata=True, filter=None):
+        return self.index.query(
+            vector=vector,
+            top_k=top_k,
+            namespace=namespace,
+            include_values=include_values,
+            include_metadata=include_metadata,
+            filter=filter,
+        )
+
+    def delete(self, ids=None, namespace=None, filter=None, delete_all=False):
+        kwargs = {"namespace": namespace}
+        if delete_all:
+            kwargs["delete_all"] = True
+        elif ids:
+            kwargs["ids"] = ids
+        else:
+            kwargs["filter"] = filter
+        return self.index.delete(**kwargs)
+
+    def describe_index_stats(self):
+        return self.index.describe_index_stats()
+
+
+_COMPARISONS = {
+    "$eq": lambda value, target: value == target,
+    "$ne": lambda value, target: value != target,
+    "$gt": lambda value, target: value is not None and value > target,
+    "$gte": lambda value, target: value is not None and value >= target,
+    "$lt": lambda value, target: value is not None and value < target,
+    "$lte": lambda value, target: value is not None and value <= target,
+    "$in": lambda value, target: value in target,
+    "$nin": lambda value, target: value not in target,
+    "$exists": lambda value, target: (value is not None) == target,
+}
+
+
+def matches_filter(metadata: Dict, filter: Dict) -> bool:
+    """Evaluate a Pinecone metadata filter against one item's metadata"""
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, target in condition.items():
+                if op not in _COMPARISONS:
+                    raise ValueError(f"Unsupported filter operator: {op}")
+                compare = _COMPARISONS[op]
+                if isinstance(value, list) and op != "$exists":
+                    # List fields match if any element does, or if none do for negations
+                    combine = all if op in ("$ne", "$nin") else any
+                    hit = combine(compare(v, target) for v in value)
+                else:
+                    hit = compare(value, target)
+                if not hit:
+                    return False
+    return True
+
+
+class _Namespace:
+    def __init__(self, dimension: int = 0):
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.metadata: List[Dict] = []
+        self.values = np.zeros((0, dimension), dtype=np.float32)
+        # Unit-length copies, so cosine similarity is a dot product
+        self.normalized = np.zeros((0, dimension), dtype=np.float32)
+        self.size = 0
+
+    def _reserve(self, rows: int, dimension: int):
+        if self.values.shape[1] != dimension:
+            if self.size:
+                raise ValueError(
+                    f"Vector dimension {dimension} does not match index dimension {self.values.shape[1]}"
+                )
+            self.values = np.zeros((0, dimension), dtype=np.float32)
+            self.normalized = np.zeros((0, dimension), dtype=np.float32)
+        if self.size + rows > len(self.values):
+            # Grow geometrically so repeated small upserts stay cheap
+            capacity = max(self.size + rows, 2 * len(self.values), 64)
+            for name in ("values", "normalized"):
+                grown = np.zeros((capacity, dimension), dtype=np.float32)
+                grown[: self.size] = getattr(self, name)[: self.size]
+                setattr(self, name, grown)
+
+    def upsert(self, vectors: List[Dict]):
+        if not vectors:
+            return
+        values = np.asarray([v["values"] for v in vectors], dtype=np.float32)
+        normalized = normalize(values)
+        self._reserve(len(vectors), values.shape[1])
+        for i, vector in enumerate(vectors):
+            row = self.rows.get(vector["id"])
+            if row is None:
+                row = self.size
+                self.size += 1
+                self.rows[vector["id"]] = row
+                self.ids.append(vector["id"])
+                self.metadata.append({})
+            self.values[row] = values[i]
+            self.normalized[row] = normalized[i]
+            self.metadata[row] = dict(vector.get("metadata") or {})
+
+    def delete(self, ids: List[str]):
+        for vector_id in ids:
+            row = self.rows.pop(vector_id, None)
+            if row is None:
+                continue
+            # Move the last row into the hole to keep the matrix dense
+            last = self.size - 1
+            if row != last:
+                moved = self.ids[last]
+                self.ids[row] = moved
+                self.metadata[row] = self.metadata[last]
+                self.values[row] = self.values[last]
+                self.normalized[row] = self.normalized[last]
+                self.rows[moved] = row
+            self.ids.pop()
+            self.metadata.pop()
+            self.size -= 1
+
+    def to_dict(self, row: int, include_values: bool = True) -> Dict:
+        vector = {"id": self.ids[row], "metadata": self.metadata[row]}
+        if include_values:
+            vector["values"] = self.values[row].tolist()
+        return vector
+
+
+class LocalBackend(VectorBackend):
+    # query_many scores all queries in one pass
+    batch_queries = True
+
+    def __init__(self, path: str = VECTOR_STORE_PATH):
+        """
+        In-process index doing exact cosine top-k with NumPy
+
+        Args:
+            path: Directory the index is persisted to, None to keep it in memory only
+        """
+        self.path = path
+        self.namespaces: Dict[str, _Namespace] = {}
+        self._dirty = set()
+        self._legacy: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    @staticmethod
+    def _key(namespace: str = None) -> str:
+        return namespace or ""
+
+    @staticmethod
+    def _file_name(namespace: str) -> str:
+        # Hex keeps any namespace a valid file name, and the default ("") distinct from all others
+        return f"ns-{(namespace or '').encode('utf-8').hex()}.npz"
+
+    def _restore(self, namespace: str, values: np.ndarray, items: List[Dict]):
+        store = _Namespace(values.shape[1] if values.ndim == 2 else 0)
+        store.upsert(
+            [
+                {"id": item["id"], "values": row, "metadata": item["metadata"]}
+                for item, row in zip(items, values)
+            ]
+        )
+        self.namespaces[namespace] = store
+
+    def _load_legacy(self, name: str):
+        """Namespace saved as a <name>.npy + <name>.json pair by earlier versions"""
+        namespace = "" if name == "__default__" else name
+        values_path = os.path.join(self.path, f"{name}.npy")
+        meta_path = os.path.join(self.path, f"{name}.json")
+        if not os.path.exists(values_path):
+            logger.warning(f"Skipping vector namespace {name!r}: {values_path} is missing")
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        values = np.load(values_path)
+        if len(items) != len(values):
+            logger.warning(f"Skipping vector namespace {name!r}: {meta_path} and {values_path} don't match")
+            return
+        self._restore(namespace, values, items)
+        # Rewritten in the current format on the next flush
+        self._legacy[namespace] = (values_path, meta_path)
+        self._dirty.add(namespace)
+
+    def _load(self):
+        if not os.path.isdir(self.path):
+            return
+        for filename in sorted(os.listdir(self.path)):
+            stem, extension = os.path.splitext(filename)
+            try:
+                if extension == ".json":
+                    self._load_legacy(stem)
+                elif extension == ".npz" and stem.startswith("ns-"):
+                    namespace = bytes.fromhex(stem[len("ns-") :]).decode("utf-8")
+                    with np.load(os.path.join(self.path, filename)) as data:
+                        values = data["values"]
+                        items = json.loads(str(data["metadata"]))
+                    self._restore(namespace, values, items)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable vector index file {filename}: {e}")
+        logger.info(f"Loaded local vector index from {self.path} ({len(self.namespaces)} namespaces)")
+
+    def _save(self, namespace: str):
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        store = self.namespaces[namespace]
+        path = os.path.join(self.path, self._file_name(namespace))
+        metadata = [{"id": i, "metadata": m} for i, m in zip(store.ids, store.metadata)]
+        # Vectors and metadata share one file, replaced atomically
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, values=store.values[: store.size], metadata=np.array(json.dumps(metadata)))
+        os.replace(path + ".tmp", path)
+        for legacy_path in self._legacy.pop(namespace, ()):
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
+
+    def upsert(self, vectors, namespace=None):
+        key = self._key(namespace)
+        with self._lock:
+            store = self.namespaces.setdefault(key, _Namespace())
+            store.upsert(vectors)
+            self._dirty.add(key)
+        return {"upserted_count": len(vectors)}
+
+    def fetch(self, ids, namespace=None):
+        with self._lock:
+            store = self.namespaces.get(self._key(namespace))
+            if store is None:
+                return {"vectors": {}, "namespace": namespace}
+            return {
+                "vectors": {
+                    vector_id: store.to_dict(store.rows[vector_id])
+                    for vector_id in ids
+                    if vector_id in store.rows
+                },
+                "namespace": namespace,
+            }
+
+    def query(self, vector, top_k=3, namespace=None, include_values=False, include_metadata=True, filter=None):
+        return self.query_many(
+            [vector], top_k, namespace, include_values, include_metadata, filter
+        )[0]
+
+    def query_many(self, vectors, top_k=3, namespace=None, include_values=False, include_metadata=True, filter=None):
+        """Answer several queries with one matrix multiply"""
+        with self._lock:
+            store = self.namespaces.get(self._key(namespace))
+            if store is None or store.size == 0:
+                return [{"matches": [], "namespace": namespace} for _ in vectors]
+
+            adjust = None
+            if filter:
+                mask = np.fromiter(
+                    (matches_filter(m, filter) for m in store.metadata), dtype=bool, count=store.size
+                )
+                adjust = lambda rows, scores: np.where(mask, scores, -np.inf)
+            indices, scores = top_k_similar(
+                normalize(vectors), store.normalized[: store.size], top_k, normalized=True, adjust=adjust
+            )
+
+            results = []
+            for row_indices, row_scores in zip(indices, scores):
+                matches = []
+                for row, score in zip(row_indices, row_scores):
+                    if score == -np.inf:
+                        break
+                    match = {"id": store.ids[row], "score": float(score)}
+                    if include_values:
+                        match["values"] = store.values[row].tolist()
+                    if include_metadata:
+                        match["metadata"] = store.metadata[row]
+                    matches.append(match)
+                results.append({"matches": matches, "namespace": namespace})
+            return results
+
+    def delete(self, ids=None, namespace=None, filter=None, delete_all=False):
+        key = self._key(namespace)
+        with self._lock:
+            store = self.namespaces.get(key)
+            if store is None:
+                return {}
+            if delete_all:
+                ids = list(store.ids)
+            elif not ids and filter:
+                ids = [i for i, m in zip(store.ids, store.metadata) if matches_filter(m, filter)]
+            store.delete(ids or [])
+            self._dirty.add(key)
+        return {}
+
+    def persist(self):
+        with self._lock:
+            for key in self._dirty:
+                self._save(key)
+            self._dirty.clear()
+
+    def describe_index_stats(self):
+        with self._lock:
+            namespaces = {
+                namespace: {"vector_count": store.size}
+                for namespace, store in self.namespaces.items()
+            }
+            dimension = next(
+                (store.values.shape[1] for store in self.namespaces.values() if store.size), 0
+            )
+        return {
+            "namespaces": namespaces,
+            "dimension": dimension,
+            "total_vector_count": sum(n["vector_count"] for n in namespaces.values()),
+        }
+
+
+def get_backend(index_name: str, dimension: int, backend: str = VECTOR_BACKEND) -> VectorBackend:
+    """Build the vector backend selected by VECTOR_BACKEND"""
+    if backend == "local":
+        return LocalBackend(os.path.join(VECTOR_STORE_PATH, index_name))
+    if backend == "pinecone":
+        return PineconeBackend(index_name, dimension)
+    raise ValueError(f"Unknown vector backend: {backend}")
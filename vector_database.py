@@ -1,16 +1,25 @@
 import os
+import time
+import hashlib
 from typing import Dict, List
-from uuid import uuid4
 import asyncio
 
 from dotenv import load_dotenv
-from pinecone.grpc import PineconeGRPC as Pinecone
-from pinecone import ServerlessSpec
 from embed import EmbeddingService, EmbeddingModels
+from vector_backend import VectorBackend, get_backend
+from log import logger
 
 load_dotenv()
 
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+# Metadata fields identifying where an item came from, in order of preference
+SOURCE_KEYS = ("job_url", "url", "link", "source")
+# Seconds buffered items may wait for a full batch before being flushed anyway
+VECTOR_FLUSH_LINGER = float(os.getenv("VECTOR_FLUSH_LINGER", "30"))
+
+
+def _field(obj, name: str):
+    """Read a field from a Pinecone response, which may be a dict or an object"""
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
 
 
 class VectorDatabase:
@@ -18,43 +27,63 @@ class VectorDatabase:
         self,
         index_name: str,
         batch_size: int = 1000,
-        embedding_model: str = EmbeddingModels.COHERE_ENGLISH_V3
+        embedding_model: str = EmbeddingModels.COHERE_ENGLISH_V3,
+        upsert_batch_size: int = 100,
+        max_parallel_upserts: int = 4,
+        max_parallel_queries: int = 8,
+        backend: VectorBackend = None,
+        max_linger: float = VECTOR_FLUSH_LINGER,
     ):
+        """
+        Buffered, embedded upserts and semantic search over a vector index
+
+        Args:
+            index_name: Name of the index
+            batch_size: Buffered items that trigger a flush
+            embedding_model: Embedding model name
+            upsert_batch_size: Vectors per upsert request
+            max_parallel_upserts: Upsert requests in flight at once
+            max_parallel_queries: Search requests in flight at once in query_many
+            backend: Vector backend, defaults to the one selected by VECTOR_BACKEND
+            max_linger: Seconds an item may wait in the buffer before the
+                background flusher writes it
+        """
         self.db = []
         self._current_id = 0
         self.index_name = index_name
         self.batch_size = batch_size
+        # Pinecone recommends at most 100 vectors (and 2MB) per upsert request
+        self.upsert_batch_size = upsert_batch_size
+        self.max_parallel_upserts = max_parallel_upserts
+        self.max_parallel_queries = max_parallel_queries
         self.embedding_service = EmbeddingService(model=embedding_model)
-        self.init_pinecone()
-
-    def init_pinecone(self):
-        self.pc = Pinecone(api_key=PINECONE_API_KEY)
-        if not self.pc.has_index(self.index_name):
-            self.pc.create_index(
-                name=self.index_name,
-                dimension=self.embedding_service.embedding_dimension,
-                metric="cosine",
-                spec=ServerlessSpec(cloud="aws", region="us-east-1"),
-            )
-        self.index = self.pc.Index(self.index_name)
+        # The Pinecone backend only connects (and creates the index) on first use
+        self.index = backend or get_backend(
+            index_name, self.embedding_service.embedding_dimension
+        )
+        self.max_linger = max_linger
+        self._buffered_at = None
+        self._flusher = None
+        self._closed = False
+        self._flush_lock = asyncio.Lock()
 
     async def get_embeddings(self, tx: list[str]):
         try:
             if not tx or any(not isinstance(t, str) for t in tx):
-                print(f"Invalid text input: {tx}")
+                logger.error(f"Invalid text input: {tx}")
                 raise ValueError("Input must be a non-empty list of strings")
 
             embeddings = await self.embedding_service.batch_embed_documents(tx)
 
             if embeddings is None:
-                print("Warning: Embeddings returned None")
+                logger.warning("Embeddings returned None")
                 raise ValueError("Embedding generation failed")
 
             embeddings = [embedding["embedding"] for embedding in embeddings]
             return embeddings
 
         except Exception as e:
-            print(f"Error generating embeddings: {e}")
+            logger.error(f"Error generating embeddings: {e}")
             raise
 
     @property
@@ -76,28 +105,48 @@ class VectorDatabase:
                 sanitized[key] = str(value)
         return sanitized
 
-    async def structure_data(self, data: List[Dict] | tuple[str, dict]):
+    def to_records(self, data: List[Dict] | List[tuple[str, dict]] | tuple[str, dict]) -> List[tuple[str, dict]]:
+        """Normalise buffered data into (text, metadata) records"""
+        if isinstance(data, tuple):
+            data = [data]
+        return [
+            (d["text"], d.get("metadata") or {}) if isinstance(d, dict) else (d[0], d[1] or {})
+            for d in data
+        ]
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def vector_id(self, text: str, metadata: dict, namespace: str = None) -> str:
+        """Stable ID from the item's source URL, or its content when it has none"""
+        source = next(
+            (str(metadata[key]) for key in SOURCE_KEYS if metadata.get(key)),
+            self.content_hash(text),
+        )
+        return hashlib.sha256(f"{namespace or ''}\x1f{source}".encode("utf-8")).hexdigest()[:32]
+
+    def to_vector(self, text: str, metadata: dict, embedding: List[float], namespace: str = None) -> Dict:
+        sanitized = self.sanitize_metadata(metadata)
+        sanitized["content_hash"] = self.content_hash(text)
+        return {
+            "id": self.vector_id(text, metadata, namespace),
+            "values": embedding,
+            "metadata": sanitized,
+        }
+
+    async def structure_data(self, data: List[Dict] | tuple[str, dict], namespace: str = None):
         """Structure data for Pinecone format"""
         try:
-            if isinstance(data, tuple):
-                text = data[0]
-                metadata = self.sanitize_metadata(data[1])
-                embeddings = await self.get_embeddings([text])
-                return [{"id": str(uuid4()), "values": embeddings[0], "metadata": metadata}]
-            else:
-                text = [d["text"] for d in data]
-                embeddings = await self.get_embeddings(text)
-                return [
-                    {
-                        "id": str(uuid4()),
-                        "values": embedding,
-                        "metadata": self.sanitize_metadata(d["metadata"])
-                    }
-                    for embedding, d in zip(embeddings, data)
-                ]
+            records = self.to_records(data)
+            embeddings = await self.get_embeddings([text for text, _ in records])
+            return [
+                self.to_vector(text, metadata, embedding, namespace)
+                for (text, metadata), embedding in zip(records, embeddings)
+            ]
 
         except Exception as e:
-            print(f"Error structuring data: {e}")
+            logger.error(f"Error structuring data: {e}")
             return None
 
     async def upsert(
@@ -118,47 +167,172 @@ class VectorDatabase:
             self.db.append((data, namespace))
         elif isinstance(data, list):
             self.db.extend([(d, namespace) for d in data])
+        if self.db and self._buffered_at is None:
+            self._buffered_at = time.monotonic()
+        if not self._closed:
+            self.start()
 
         if len(self.db) >= self.batch_size or force_flush:
             await self.flush()
 
-    def __del__(self):
-        """Ensure any remaining data is flushed when the object is destroyed"""
-        if self.db:
-            # Create a new event loop for cleanup if necessary
+    def start(self):
+        """Start the background flusher, which must run inside the event loop"""
+        if (
+            self._flusher is None
+            or self._flusher.done()
+            or self._flusher.get_loop() is not asyncio.get_running_loop()
+        ):
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        """Flush items that have waited max_linger seconds without filling a batch"""
+        while True:
+            await asyncio.sleep(self.max_linger / 2)
+            if self._buffered_at is None or time.monotonic() - self._buffered_at < self.max_linger:
+                continue
             try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
-            # Run the flush operation
-            loop.run_until_complete(self.flush())
+                await self.flush()
+            except Exception as e:
+                # The buffer is kept, the next tick retries
+                logger.error(f"Background flush failed: {e}")
+
+    async def close(self):
+        """Stop the background flusher and flush whatever is still buffered"""
+        self._closed = True
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.error(f"{len(self.db)} buffered items could not be flushed on close")
+            raise
+
+    async def __aenter__(self):
+        self._closed = False
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
 
     async def flush(self):
-        """Flush current buffer to Pinecone if there's any data"""
+        """Embed everything buffered in one pass and upsert it to the index"""
+        # One flush at a time, so concurrent callers never upsert the same buffer twice
+        async with self._flush_lock:
+            await self._flush()
+
+    async def _flush(self):
         if not self.db:
             return
 
+        # Take the buffer so items upserted meanwhile wait for the next flush
+        buffered, self.db = self.db, []
+        buffered_at, self._buffered_at = self._buffered_at, None
         try:
+            # Same ID means same item: the latest version in the buffer wins
+            entries = {}
+            for data, namespace in buffered:
+                for text, metadata in self.to_records(data):
+                    entries[(namespace, self.vector_id(text, metadata, namespace))] = (text, metadata)
+
+            unchanged = await self.find_unchanged(entries)
+            pending = [(key, value) for key, value in entries.items() if key not in unchanged]
+            if unchanged:
+                logger.info(f"Skipping {len(unchanged)} unchanged vectors")
+            if not pending:
+                return
+
+            # A single embedding pass packs texts from every namespace into full batches
+            embeddings = await self.get_embeddings([text for _, (text, _) in pending])
             namespace_groups = {}
-            for data, namespace in self.db:
-                if namespace not in namespace_groups:
-                    namespace_groups[namespace] = []
-                structured_data = await self.structure_data(data)
-                if structured_data:
-                    namespace_groups[namespace].extend(structured_data)
-
-            for namespace, vectors in namespace_groups.items():
-                if vectors:
-                    self.index.upsert(vectors=vectors, namespace=namespace)
-
-            self.db = []
-        except Exception as e:
-            print(f"Error flushing to Pinecone: {e}")
+            for ((namespace, _), (text, metadata)), embedding in zip(pending, embeddings):
+                namespace_groups.setdefault(namespace, []).append(
+                    self.to_vector(text, metadata, embedding, namespace)
+                )
+
+            await self.upsert_vectors(namespace_groups)
+            await asyncio.to_thread(self.index.persist)
+        except BaseException as e:
+            # Keep the data for the next flush, also when cancelled on shutdown
+            self.db = buffered + self.db
+            self._buffered_at = buffered_at
+            if not isinstance(e, asyncio.CancelledError):
+                logger.error(f"Error flushing to vector index: {e}")
             raise
 
-    async def query_embeddings(self, query: str):
+    async def find_unchanged(self, entries: Dict[tuple, tuple[str, dict]]) -> set:
+        """Keys of entries already stored with the same content hash"""
+        by_namespace = {}
+        for namespace, vector_id in entries:
+            by_namespace.setdefault(namespace, []).append(vector_id)
+
+        async def fetch_chunk(ids, namespace):
+            try:
+                response = await asyncio.to_thread(self.index.fetch, ids=ids, namespace=namespace)
+            except Exception as e:
+                # Re-embedding is safe, just more expensive
+                logger.warning(f"Could not fetch existing vectors from {namespace}: {e}")
+                return set()
+            unchanged = set()
+            for vector_id, vector in (_field(response, "vectors") or {}).items():
+                metadata = _field(vector, "metadata") or {}
+                text, _ = entries.get((namespace, vector_id), (None, None))
+                if text is not None and metadata.get("content_hash") == self.content_hash(text):
+                    unchanged.add((namespace, vector_id))
+            return unchanged
+
+        semaphore = asyncio.Semaphore(self.max_parallel_upserts)
+
+        async def limited(ids, namespace):
+            async with semaphore:
+                return await fetch_chunk(ids, namespace)
+
+        results = await asyncio.gather(
+            *(
+                limited(ids[i : i + self.upsert_batch_size], namespace)
+                for namespace, ids in by_namespace.items()
+                for i in range(0, len(ids), self.upsert_batch_size)
+            )
+        )
+        return set().union(*results)
+
+    async def upsert_vectors(self, namespace_groups: Dict[str, List[Dict]]):
+        """Upsert vectors in size-bounded chunks, several requests in flight at once"""
+        semaphore = asyncio.Semaphore(self.max_parallel_upserts)
+
+        async def upsert_chunk(vectors, namespace):
+            async with semaphore:
+                # The gRPC client blocks, so run it off the event loop
+                await asyncio.to_thread(self.index.upsert, vectors=vectors, namespace=namespace)
+
+        await asyncio.gather(
+            *(
+                upsert_chunk(vectors[i : i + self.upsert_batch_size], namespace)
+                for namespace, vectors in namespace_groups.items()
+                for i in range(0, len(vectors), self.upsert_batch_size)
+            )
+        )
+
+    async def delete(
+        self,
+        ids: List[str] = None,
+        namespace: str = None,
+        filter: dict = None,
+        delete_all: bool = False,
+    ):
+        """Delete vectors by ID, by metadata filter, or all vectors of a namespace"""
+        await asyncio.to_thread(
+            self.index.delete,
+            ids=ids,
+            namespace=namespace,
+            filter=filter,
+            delete_all=delete_all,
+        )
+        await asyncio.to_thread(self.index.persist)
+
+    async def query_embeddings(self, query: str | List[str]):
         return await self.embedding_service.query_embeddings(query)
 
     async def query(
@@ -170,8 +344,9 @@ class VectorDatabase:
         include_metadata: bool = True,
         filter: dict = None,
     ):
-        query_vector = self.query_embeddings(query)[0]
-        return self.index.query(
+        query_vector = await self.query_embeddings(query)
+        return await asyncio.to_thread(
+            self.index.query,
             vector=query_vector,
             top_k=top_k,
             namespace=namespace,
@@ -180,6 +355,45 @@ class VectorDatabase:
             filter=filter,
         )
 
+    async def query_many(
+        self,
+        queries: List[str],
+        top_k: int = 3,
+        filter: dict = None,
+        namespace: str = None,
+        include_values: bool = False,
+        include_metadata: bool = True,
+    ) -> List:
+        """
+        Search for several queries at once
+
+        All queries are embedded in one call, then searched concurrently (or in
+        a single pass when the backend batches queries).
+
+        Returns:
+            One query response per query, aligned with queries
+        """
+        if not queries:
+            return []
+        query_vectors = await self.query_embeddings(list(queries))
+        options = dict(
+            top_k=top_k,
+            namespace=namespace,
+            include_values=include_values,
+            include_metadata=include_metadata,
+            filter=filter,
+        )
+        if self.index.batch_queries:
+            return await asyncio.to_thread(self.index.query_many, query_vectors, **options)
+
+        semaphore = asyncio.Semaphore(self.max_parallel_queries)
+
+        async def search(vector):
+            async with semaphore:
+                return await asyncio.to_thread(self.index.query, vector=vector, **options)
+
+        return await asyncio.gather(*(search(vector) for vector in query_vectors))
+
 
 vector_db = VectorDatabase("joblm-index", batch_size=5)
 # job_vector_db = VectorDatabase("job-index", batch_size=5)